@@ -1,29 +1,57 @@
-from flask import Flask, flash, render_template, request, redirect, url_for, session, make_response
-from datetime import datetime
+from flask import Blueprint, Flask, current_app, flash, render_template, request, redirect, url_for, session, make_response, jsonify, stream_with_context
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from collections import Counter, namedtuple
+import base64
+import click
+import csv
+import hashlib
+import io
+import json
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+import re
+import time
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from functools import wraps
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.pool import NullPool
+from assets import init_assets
+from cache import TTLCache
+from events import list_events, queue_list_event
+from fragments import fragment_cache
+from hashing import HashingBusy, passwords
+from jsonprovider import init_json
+from metrics import TimedNullPool, TimedQueuePool, init_metrics
+from pooling import init_pools, no_prepared_statements, pool_mode
+from ranks import RANK_REBALANCE_LENGTH, rank_between, rank_rebalancer, rank_sequence
+from reminders import reminder_service
+from replicas import RoutingSession, init_replicas, primary, replica_reads, replica_urls
+from schema import init_schema_check
 
 # load variables from .env
 load_dotenv()
 
-app = Flask(__name__)
-# if key doesnt exist from .env, use dev_secret_key instead
-app.secret_key = os.getenv("SECRET_KEY") or "dev_secret_key"
+# Nothing here touches the database: extensions are bound to the app in
+# create_app() and the engine only connects when a request first needs it.
+# RoutingSession sends the reads of @replica_reads views to a replica, when there are any
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+migrate = Migrate()
+# cli_group=None: the blueprint's CLI commands sit at the top level (flask compact-tasks)
+main = Blueprint("main", __name__, cli_group=None)
 
-# generate and verify secure tokens 
-# use the secret key to cryptographically sign my tokens so nobody can forge them
-serializer = URLSafeTimedSerializer(app.secret_key)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def get_serializer():
+    # generate and verify secure tokens 
+    # use the secret key to cryptographically sign my tokens so nobody can forge them
+    return URLSafeTimedSerializer(current_app.secret_key)
 
 
 def _ensure_sslmode(db_url: str) -> str:
     """Ensure sslmode=require is present for Supabase/Render Postgres."""
-    if not db_url:
+    if not db_url or not db_url.startswith("postgres"):
         return db_url
     # If query already present
     if "?" in db_url:
@@ -47,50 +75,50 @@ def _build_db_url_from_parts() -> str | None:
     return None
 
 
-# Prefer a full DATABASE_URL (as on Render), but if it's the legacy
-# 'db.supabase.co' host and we have valid parts, prefer the parts-based URL.
-raw_env_url = os.getenv("DATABASE_URL")
-parts_url = _build_db_url_from_parts()
+def database_url() -> str:
+    # Prefer a full DATABASE_URL (as on Render), but if it's the legacy
+    # 'db.supabase.co' host and we have valid parts, prefer the parts-based URL.
+    raw_env_url = os.getenv("DATABASE_URL")
+    parts_url = _build_db_url_from_parts()
 
-chosen_url = None
-if raw_env_url:
-    if "db.supabase.co" in raw_env_url and parts_url:
+    chosen_url = None
+    if raw_env_url:
+        if "db.supabase.co" in raw_env_url and parts_url:
+            chosen_url = parts_url
+        else:
+            chosen_url = raw_env_url
+    elif parts_url:
         chosen_url = parts_url
-    else:
-        chosen_url = raw_env_url
-elif parts_url:
-    chosen_url = parts_url
 
-DATABASE_URL = _ensure_sslmode(chosen_url) if chosen_url else None
+    if not chosen_url:
+        raise RuntimeError(
+            "Database configuration missing: set DATABASE_URL or DB_USER/DB_PASSWORD/DB_HOST/DB_PORT/DB_NAME (or lowercase equivalents)."
+        )
+    return _ensure_sslmode(chosen_url)
+
+
+def engine_options(url="") -> dict:
+    """Engine options for SQLALCHEMY_POOL_MODE (see pooling.py); url picks driver-specific connect_args."""
+    mode = pool_mode()
+    options = {"pool_pre_ping": True}
+    if mode == "null":
+        options["poolclass"] = TimedNullPool
+    else:
+        # QueuePool that records how long each request waits for a connection
+        options["poolclass"] = TimedQueuePool
+        # Keep a small pool to respect Supabase limits when not disabling pooling
+        options["pool_size"] = int(os.getenv("SQLALCHEMY_POOL_SIZE", "5"))
+        options["max_overflow"] = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", "0"))
+        options["pool_recycle"] = int(os.getenv("SQLALCHEMY_POOL_RECYCLE", "300"))
+    if mode == "transaction":
+        # idle connections are pinged in the background instead (pooling.PoolMaintenance)
+        options["pool_pre_ping"] = False
+        connect_args = no_prepared_statements(url)
+        if connect_args:
+            options["connect_args"] = connect_args
+    return options
 
-if not DATABASE_URL:
-    raise RuntimeError(
-        "Database configuration missing: set DATABASE_URL or DB_USER/DB_PASSWORD/DB_HOST/DB_PORT/DB_NAME (or lowercase equivalents)."
-    )
 
-app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-engine_options = {"pool_pre_ping": True}
-if (os.getenv("SQLALCHEMY_DISABLE_POOL", "0").lower() in ("1", "true", "yes")):
-    engine_options["poolclass"] = NullPool
-else:
-    # Keep a small pool to respect Supabase limits when not disabling pooling
-    engine_options["pool_size"] = int(os.getenv("SQLALCHEMY_POOL_SIZE", "5"))
-    engine_options["max_overflow"] = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", "0"))
-    engine_options["pool_recycle"] = int(os.getenv("SQLALCHEMY_POOL_RECYCLE", "300"))
-
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
-db = SQLAlchemy(app)
-
-# Safe log of DB host to help diagnose env precedence (no credentials)
-try:
-    at_idx = DATABASE_URL.rfind("@")
-    host_part = DATABASE_URL[at_idx + 1 :].split("/")[0] if at_idx != -1 else DATABASE_URL.split("//", 1)[-1].split("/")[0]
-    print(f"Using database host: {host_part}")
-except Exception:
-    pass
-
-# creating the table
 # ================= DATABASE MODELS =================
 
 class User(db.Model):
@@ -105,6 +133,27 @@ class List(db.Model):
     list_id = db.Column(db.Integer, primary_key=True)
     list_name = db.Column(db.Text, nullable=False)
     owner_id = db.Column(db.Integer, db.ForeignKey("users.user_id"))
+    # bumped by every task or collaborator change; drives ETags on / and /collaboration
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+# integer rank stored next to the text priority so the priority sort can use an index
+PRIORITY_RANKS = {"high": 1, "medium": 2, "low": 3}
+
+
+def priority_rank(priority):
+    return PRIORITY_RANKS.get(priority, 3)
+
+
+# partial indexes only cover live rows. The predicate is spelled per dialect
+# the same way SQLAlchemy renders `Task.is_deleted == db.false()`, otherwise
+# the planner can't prove the index applies.
+_LIVE_TASKS_PG = db.text("is_deleted = false")
+_LIVE_TASKS_SQLITE = db.text("is_deleted = 0")
+_DELETED_TASKS_PG = db.text("is_deleted = true")
+_DELETED_TASKS_SQLITE = db.text("is_deleted = 1")
+_OPEN_TASKS_PG = db.text('is_deleted = false AND "isChecked" = false')
+_OPEN_TASKS_SQLITE = db.text('is_deleted = 0 AND "isChecked" = 0')
+
 
 class Task(db.Model):
     __tablename__ = "tasks"
@@ -112,26 +161,114 @@ class Task(db.Model):
     task_name = db.Column(db.Text, nullable=False)
     isChecked = db.Column(db.Boolean, default=False)
     priority = db.Column(db.Text, nullable=False)
+    priority_rank = db.Column(db.SmallInteger, nullable=False, default=3, server_default="3")
     deadline = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     list_id = db.Column(db.Integer, db.ForeignKey("lists.list_id"))
     is_deleted = db.Column(db.Boolean, default=False)
+    # set on delete; compaction archives rows once this is older than the undo window
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    # manual order (see ranks.py); byte-wise collation so Postgres sorts ranks the way Python does
+    rank = db.Column(db.Text().with_variant(db.Text(collation="C"), "postgresql"), nullable=False)
+    # bumped by every change to the row; edits made from an older version get merged (update_task_fields)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        db.Index("ix_tasks_list_created_at", "list_id", "created_at", "task_id",
+                 postgresql_where=_LIVE_TASKS_PG, sqlite_where=_LIVE_TASKS_SQLITE),
+        db.Index("ix_tasks_list_deadline", "list_id", "deadline", "task_id",
+                 postgresql_where=_LIVE_TASKS_PG, sqlite_where=_LIVE_TASKS_SQLITE),
+        db.Index("ix_tasks_list_priority_rank", "list_id", "priority_rank", "task_id",
+                 postgresql_where=_LIVE_TASKS_PG, sqlite_where=_LIVE_TASKS_SQLITE),
+        # every row, deleted ones included, so a new rank is never one a deleted task still holds
+        db.Index("ix_tasks_list_rank", "list_id", "rank", "task_id"),
+        db.Index("ix_tasks_deleted_at", "deleted_at",
+                 postgresql_where=_DELETED_TASKS_PG, sqlite_where=_DELETED_TASKS_SQLITE),
+        # upcoming deadlines across all lists, for the reminder scheduler's window scans
+        db.Index("ix_tasks_open_deadline", "deadline", "task_id",
+                 postgresql_where=_OPEN_TASKS_PG, sqlite_where=_OPEN_TASKS_SQLITE),
+    )
+
+# soft-deleted tasks past the undo window, moved out of the hot table by `flask compact-tasks`
+class TaskArchive(db.Model):
+    __tablename__ = "tasks_archive"
+    task_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    task_name = db.Column(db.Text, nullable=False)
+    isChecked = db.Column(db.Boolean)
+    priority = db.Column(db.Text, nullable=False)
+    priority_rank = db.Column(db.SmallInteger, nullable=False, default=3, server_default="3")
+    deadline = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime)
+    list_id = db.Column(db.Integer, db.ForeignKey("lists.list_id"))
+    deleted_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    archived_at = db.Column(db.DateTime, nullable=False)
 
 class ListCollaborator(db.Model):
     __tablename__ = "list_collaborators"
     list_id = db.Column(db.Integer, db.ForeignKey("lists.list_id"), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), primary_key=True)
 
-with app.app_context():
-    db.create_all()
+# task counters per list, updated by every task mutation in its own transaction.
+# overdue counts open live tasks due before overdue_as_of, which `flask refresh-overdue` moves forward.
+class ListStats(db.Model):
+    __tablename__ = "list_stats"
+    list_id = db.Column(db.Integer, db.ForeignKey("lists.list_id"), primary_key=True)
+    open_tasks = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    completed_tasks = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    deleted_tasks = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    overdue_tasks = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    overdue_as_of = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# static files: versioned URLs (?v=<hash>) never change, so browsers may keep them for a year
+STATIC_VERSIONED_CACHE = 'public, max-age=31536000, immutable'
+STATIC_UNVERSIONED_CACHE = 'public, max-age=86400'
+_static_versions = {}
+
+
+@main.app_url_defaults
+def add_static_version(endpoint, values):
+    # append a short fingerprint of the file so a changed file gets a new URL
+    if endpoint != 'static' or 'filename' not in values or 'v' in values:
+        return
+    filename = values['filename']
+    version = _static_versions.get(filename)
+    if version is None:
+        try:
+            stat = os.stat(os.path.join(current_app.static_folder, filename))
+        except OSError:
+            return
+        version = hashlib.sha1(f"{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:10]
+        _static_versions[filename] = version
+    values['v'] = version
+
 
-# prevent caching for ALL responses
-@app.after_request
+# prevent caching for dynamic responses
+@main.after_app_request
 def add_header(response):
     # This ensures that the response is treated as a proper Response object 
     # before we try to set headers
     response = make_response(response) 
-    
+
+    # a 404 or error must not be kept for a year; a 304 refreshes the stored 200, so it keeps the header
+    cacheable = response.status_code in (200, 304)
+
+    if request.endpoint == 'asset' and cacheable:
+        # built assets carry a content hash in their name
+        response.headers['Cache-Control'] = STATIC_VERSIONED_CACHE
+        return response
+
+    if request.endpoint == 'static' and cacheable:
+        response.headers['Cache-Control'] = (
+            STATIC_VERSIONED_CACHE if 'v' in request.args else STATIC_UNVERSIONED_CACHE
+        )
+        return response
+
+    if response.get_etag()[0]:
+        # pages with an ETag may be stored privately but must be revalidated every time
+        response.headers['Cache-Control'] = 'private, no-cache, must-revalidate'
+        return response
+
     # Set headers to prevent caching by the browser
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
     response.headers['Pragma'] = 'no-cache'
@@ -139,19 +276,56 @@ def add_header(response):
     
     return response
 
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def not_modified(etag):
+    """304 response if the browser already holds this ETag, else None.
+
+    Never answers 304 while flashed messages are waiting, otherwise the
+    toast would not be shown.
+    """
+    if session.get('_flashes') or etag not in request.if_none_match:
+        return None
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
+
+
+def render_with_etag(etag, template, **context):
+    # a page that shows flashed messages must not be reused on a later visit
+    showing_flashes = bool(session.get('_flashes'))
+    response = make_response(render_template(template, **context))
+    if etag and not showing_flashes:
+        response.set_etag(etag)
+    return response
+
+
+# the password hashing pool is saturated: ask the user to retry instead of queueing forever
+@main.app_errorhandler(HashingBusy)
+def hashing_busy(e):
+    flash("The server is busy right now. Please try again in a moment.", "error")
+    return redirect(request.path), 303
+
 # helper functions
 
 def signup_user(name, password, email):
     user = User(
         name=name,
         email=email,
-        password=generate_password_hash(password)
+        password=passwords.hash(password)
     )
     db.session.add(user)
-    db.session.commit()
+    # flush sends the INSERT (which returns user_id) inside the same transaction,
+    # so the user and the default list are committed together
+    db.session.flush()
 
     default_list = List(list_name="My Dooby List", owner_id=user.user_id)
     db.session.add(default_list)
+    db.session.flush()
+    db.session.add(ListStats(list_id=default_list.list_id))
     db.session.commit()
     return user.user_id
 
@@ -173,88 +347,1252 @@ def get_default_list_id(user_id):
     return lst.list_id if lst else None
 
 
+# (user_id, list_id) -> bool. Per worker, so a revoked collaborator may keep
+# access in other workers for up to ACCESS_CACHE_TTL seconds.
+list_access_cache = TTLCache(
+    maxsize=int(os.getenv("ACCESS_CACHE_SIZE", "10000")),
+    ttl=int(os.getenv("ACCESS_CACHE_TTL", "60")),
+)
+
+
+def _list_access_exists(user_id, list_id_column):
+    """Owner-or-collaborator test for list_id_column as one boolean SQL expression.
+
+    Both EXISTS clauses sit directly in the enclosing statement so they
+    correlate with it when list_id_column is a column such as Task.list_id.
+    """
+    owned = db.exists().where(List.list_id == list_id_column, List.owner_id == user_id)
+    shared = db.exists().where(
+        ListCollaborator.list_id == list_id_column, ListCollaborator.user_id == user_id
+    )
+    return db.or_(owned, shared)
+
+
+def user_can_access_list(user_id, list_id):
+    key = (user_id, int(list_id))
+    allowed = list_access_cache.get(key)
+    if allowed is None:
+        # cached answers come from the primary, or a lagging replica could pin a stale one for the TTL
+        with primary():
+            allowed = bool(db.session.scalar(db.select(_list_access_exists(user_id, int(list_id)))))
+        list_access_cache.set(key, allowed)
+    return allowed
+
+
+def bump_list_versions(list_ids):
+    """Mark lists as changed; list_ids may be a collection or a SELECT of list ids.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    db.session.execute(
+        db.update(List).where(List.list_id.in_(list_ids)).values(version=List.version + 1),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def get_list_versions(list_ids):
+    if not list_ids:
+        return {}
+    return dict(db.session.execute(
+        db.select(List.list_id, List.version).where(List.list_id.in_(list_ids))
+    ).all())
+
+
+# ================= LIST STATS =================
+
+# what the list_stats counters depend on
+TaskState = namedtuple("TaskState", "isChecked is_deleted deadline")
+
+LIST_STATS_COLUMNS = ("open_tasks", "completed_tasks", "deleted_tasks", "overdue_tasks")
+LIST_STATS_BATCH_SIZE = 500
+
+
+def task_state(isChecked, is_deleted, deadline):
+    return TaskState(bool(isChecked), bool(is_deleted), deadline)
+
+
+def update_list_stats(list_id, removed=(), added=()):
+    """Move a list's counters from the `removed` task states to the `added` ones.
+
+    Runs in the caller's transaction, like bump_list_versions. Whether an open
+    task counts as overdue depends on the row's overdue_as_of, so that test is
+    part of the UPDATE instead of a read beforehand.
+    """
+    changes = Counter(added)
+    changes.subtract(removed)
+    deltas = {}
+    overdue = []
+    for state, n in changes.items():
+        if not n:
+            continue
+        if state.is_deleted:
+            column = "deleted_tasks"
+        elif state.isChecked:
+            column = "completed_tasks"
+        else:
+            column = "open_tasks"
+            overdue.append(n * db.case((ListStats.overdue_as_of > state.deadline, 1), else_=0))
+        deltas[column] = deltas.get(column, 0) + n
+
+    values = {column: getattr(ListStats, column) + n for column, n in deltas.items() if n}
+    if overdue:
+        values["overdue_tasks"] = ListStats.overdue_tasks + sum(overdue[1:], overdue[0])
+    if not values:
+        # e.g. a rename: nothing counted changed
+        return
+    db.session.execute(
+        db.update(ListStats).where(ListStats.list_id == list_id).values(**values),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def get_list_stats(list_ids):
+    """list_id -> ListStats row; one primary key lookup per list, whatever the task count."""
+    if not list_ids:
+        return {}
+    rows = db.session.execute(db.select(ListStats).where(ListStats.list_id.in_(list_ids))).scalars()
+    return {row.list_id: row for row in rows}
+
+
+def count_list_stats(list_ids, as_of=None):
+    """Counters of list_ids recomputed from tasks, as list_id -> dict.
+
+    Overdue is counted as of `as_of`, or as of each list's stored
+    overdue_as_of to check the stored counters.
+    """
+    live = Task.is_deleted == db.false()
+    is_open = db.and_(live, Task.isChecked.is_not(db.true()))
+    due_before = ListStats.overdue_as_of if as_of is None else as_of
+    rows = db.session.execute(
+        db.select(
+            List.list_id,
+            db.func.count(Task.task_id).filter(is_open).label("open_tasks"),
+            db.func.count(Task.task_id).filter(live, Task.isChecked == db.true()).label("completed_tasks"),
+            db.func.count(Task.task_id).filter(Task.is_deleted == db.true()).label("deleted_tasks"),
+            db.func.count(Task.task_id).filter(is_open, Task.deadline < due_before).label("overdue_tasks"),
+        )
+        .outerjoin(ListStats, ListStats.list_id == List.list_id)
+        .outerjoin(Task, Task.list_id == List.list_id)
+        .where(List.list_id.in_(list_ids))
+        .group_by(List.list_id)
+    ).all()
+    return {row.list_id: {column: getattr(row, column) for column in LIST_STATS_COLUMNS} for row in rows}
+
+
+def _list_id_batches(batch_size):
+    last_id = 0
+    while True:
+        list_ids = db.session.scalars(
+            db.select(List.list_id).where(List.list_id > last_id).order_by(List.list_id).limit(batch_size)
+        ).all()
+        if not list_ids:
+            return
+        yield list_ids
+        last_id = list_ids[-1]
+
+
+def rebuild_list_stats(batch_size=LIST_STATS_BATCH_SIZE):
+    """Recount every list from tasks and overwrite its counters. Returns the number of lists.
+
+    Each batch locks its list_stats rows before counting, so a task change
+    that races the recount waits and then applies its delta on top.
+    """
+    rebuilt = 0
+    for list_ids in _list_id_batches(batch_size):
+        existing = set(db.session.scalars(
+            db.select(ListStats.list_id).where(ListStats.list_id.in_(list_ids)).with_for_update()
+        ))
+        now = datetime.utcnow()
+        counts = count_list_stats(list_ids, as_of=now)
+        rows = [{"list_id": list_id, **values, "overdue_as_of": now} for list_id, values in counts.items()]
+        updates = [row for row in rows if row["list_id"] in existing]
+        inserts = [row for row in rows if row["list_id"] not in existing]
+        if updates:
+            # executemany UPDATE by primary key
+            db.session.execute(db.update(ListStats), updates)
+        if inserts:
+            db.session.execute(db.insert(ListStats), inserts)
+        bump_list_versions(list_ids)
+        db.session.commit()
+        rebuilt += len(list_ids)
+    return rebuilt
+
+
+def verify_list_stats(batch_size=LIST_STATS_BATCH_SIZE):
+    """Compare stored counters with a recount. Returns [(list_id, stored, counted)] that differ."""
+    drift = []
+    for list_ids in _list_id_batches(batch_size):
+        stored = {
+            list_id: {column: getattr(row, column) for column in LIST_STATS_COLUMNS}
+            for list_id, row in get_list_stats(list_ids).items()
+        }
+        for list_id, counted in count_list_stats(list_ids).items():
+            if stored.get(list_id) != counted:
+                drift.append((list_id, stored.get(list_id), counted))
+        db.session.commit()
+    return drift
+
+
+def refresh_overdue(now=None):
+    """Move overdue_as_of to now, adding the open tasks that fell due in between.
+
+    Walks ix_tasks_list_deadline from each list's previous overdue_as_of, so
+    the cost is the number of newly overdue tasks, not the size of the lists.
+    Returns the number of lists whose overdue count grew.
+    """
+    now = now or datetime.utcnow()
+    fell_due = (
+        Task.list_id == ListStats.list_id,
+        Task.is_deleted == db.false(),
+        Task.isChecked.is_not(db.true()),
+        Task.deadline >= ListStats.overdue_as_of,
+        Task.deadline < now,
+    )
+    grew = db.session.scalars(db.select(ListStats.list_id).where(db.exists().where(*fell_due))).all()
+    if grew:
+        bump_list_versions(grew)
+    db.session.execute(
+        db.update(ListStats).where(ListStats.overdue_as_of < now)
+        .values(overdue_tasks=ListStats.overdue_tasks + db.select(db.func.count()).where(*fell_due).scalar_subquery(),
+                overdue_as_of=now),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+    return len(grew)
+
+
+@main.cli.command("reconcile-list-stats")
+@click.option("--check", is_flag=True, help="Only report drift; exit with status 1 if there is any.")
+@click.option("--batch-size", type=int, default=LIST_STATS_BATCH_SIZE, show_default=True)
+def reconcile_list_stats_command(check, batch_size):
+    """Rebuild list_stats from tasks, then verify it against a recount."""
+    if not check:
+        click.echo(f"Rebuilt counters of {rebuild_list_stats(batch_size)} lists.")
+    drift = verify_list_stats(batch_size)
+    for list_id, stored, counted in drift:
+        click.echo(f"list {list_id}: stored {stored}, counted {counted}")
+    click.echo(f"{len(drift)} lists with drifted counters.")
+    if check and drift:
+        raise SystemExit(1)
+
+
+@main.cli.command("refresh-overdue")
+def refresh_overdue_command():
+    """Bring every list's overdue count up to now."""
+    click.echo(f"Overdue count grew on {refresh_overdue()} lists.")
+
+
+# columns sent to clients whenever a task changes
+TASK_COLUMNS = (Task.task_id, Task.task_name, Task.isChecked, Task.priority, Task.deadline, Task.created_at, Task.rank,
+                Task.version)
+
+
+def task_payload(row):
+    """JSON-ready dict of a task row (a Task or a row of TASK_COLUMNS)."""
+    return {
+        "task_id": row.task_id,
+        "task_name": row.task_name,
+        "isChecked": 1 if row.isChecked else 0,
+        "priority": row.priority,
+        "deadline": row.deadline.isoformat() if isinstance(row.deadline, datetime) else row.deadline,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "rank": row.rank,
+        "version": row.version,
+    }
+
+
+def load_task_payloads(task_ids):
+    """{task_id: task_payload} of the given tasks that still exist; for events that only carry ids."""
+    rows = db.session.execute(db.select(*TASK_COLUMNS).where(Task.task_id.in_(task_ids)))
+    return {row.task_id: task_payload(row) for row in rows}
+
+
+# largest UTC offset in use anywhere, in minutes
+MAX_UTC_OFFSET = 14 * 60
+
+
+def to_utc(value, utc_offset=None):
+    """value as the naive UTC datetime the database stores, like created_at and the reminder clock.
+
+    Aware values are converted. A naive value is the client's wall-clock time
+    if utc_offset (minutes east of UTC, as the page sends it) is given, and
+    already UTC if not. Raises ValueError for a bad offset.
+    """
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    if utc_offset in (None, ""):
+        return value
+    try:
+        minutes = int(utc_offset)
+    except (TypeError, ValueError):
+        minutes = None
+    if minutes is None or abs(minutes) > MAX_UTC_OFFSET:
+        raise ValueError("utc_offset must be minutes east of UTC")
+    return value - timedelta(minutes=minutes)
+
+
+def parse_task_fields(data, partial=False):
+    """Validate task_name/priority/deadline from a JSON object into column values.
+
+    With partial=True missing fields are left out instead of rejected.
+    Deadlines come back in UTC (see to_utc; the form sends a utc_offset).
+    Raises ValueError with a message fit for the client.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    values = {}
+    if not partial or "task_name" in data:
+        if not isinstance(data.get("task_name"), str) or not data["task_name"].strip():
+            raise ValueError("task_name cannot be empty")
+        values["task_name"] = data["task_name"]
+    if not partial or "priority" in data:
+        if data.get("priority") not in PRIORITY_RANKS:
+            raise ValueError("priority must be high, medium or low")
+        values["priority"] = data["priority"]
+        values["priority_rank"] = priority_rank(data["priority"])
+    if not partial or "deadline" in data:
+        try:
+            deadline = datetime.fromisoformat(data["deadline"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("deadline must be an ISO date and time")
+        values["deadline"] = to_utc(deadline, data.get("utc_offset"))
+    return values
+
+
 def add_task(task_name, priority, deadline, list_id):
-    task = Task(task_name=task_name, priority=priority, deadline=deadline, list_id=list_id)
+    """Insert a task at the end of the manual order and return it as a task_payload dict."""
+    # the version bump locks the list row before the last rank is read, so two adds can't pick the same one
+    bump_list_versions([list_id])
+    task = Task(task_name=task_name, priority=priority, priority_rank=priority_rank(priority),
+                deadline=deadline, list_id=list_id, rank=rank_between(last_rank(list_id), None))
     db.session.add(task)
+    update_list_stats(list_id, added=[task_state(False, False, deadline)])
+    # the INSERT runs here so the event can carry the new task_id
+    db.session.flush()
+    payload = task_payload(task)
+    queue_list_event(db.session, list_id, "task_added", **payload)
     db.session.commit()
+    return payload
+
+
+# Task mutations are a single UPDATE ... RETURNING each on Postgres (SQLite
+# reads the row first, see _update_task). The access check
+# rides along in the WHERE clause, so a task that doesn't exist and a task on
+# someone else's list both come back as None. So does a task that is no longer
+# at expected_version, when one is given. Otherwise the updated row
+# (list_id plus TASK_COLUMNS) is returned. Every update bumps the row's version.
+
+def _update_task(user_id, task_id, event_type, list_id=None, expected_version=None, **values):
+    # list_stats needs the row's state before the update as well as after
+    before = db.select(Task.task_id, Task.isChecked, Task.is_deleted, Task.deadline)\
+        .where(Task.task_id == task_id, _list_access_exists(user_id, Task.list_id))
+    if list_id is not None:
+        # the JSON API addresses tasks through their list
+        before = before.where(Task.list_id == list_id)
+    query = db.update(Task).values(**values, version=Task.version + 1)
+    if expected_version is not None:
+        # the version check sits in the UPDATE itself: no lock is held between the client's read and this write
+        before = before.where(Task.version == expected_version)
+        query = query.where(Task.version == expected_version)
+    before = before.with_for_update()
+    returning = (Task.list_id, *TASK_COLUMNS, Task.is_deleted)
+    if db.engine.dialect.name == "postgresql":
+        # lock and read the row in a CTE, so RETURNING carries the old state too: still one round trip
+        before = before.cte("before")
+        row = db.session.execute(
+            query.where(Task.task_id == before.c.task_id)
+            .returning(*returning, before.c.isChecked.label("was_checked"),
+                       before.c.is_deleted.label("was_deleted"), before.c.deadline.label("was_due")),
+            execution_options={"synchronize_session": False},
+        ).first()
+        old = row and task_state(row.was_checked, row.was_deleted, row.was_due)
+    else:
+        # SQLite's RETURNING can't see the other tables of an UPDATE ... FROM; read first
+        old = db.session.execute(before).first()
+        row = old and db.session.execute(
+            query.where(Task.task_id == task_id).returning(*returning),
+            execution_options={"synchronize_session": False},
+        ).first()
+        old = old and task_state(old.isChecked, old.is_deleted, old.deadline)
+    if row is None:
+        db.session.commit()
+        return None
+    bump_list_versions([row.list_id])
+    update_list_stats(row.list_id, removed=[old], added=[task_state(row.isChecked, row.is_deleted, row.deadline)])
+    queue_list_event(db.session, row.list_id, event_type, **task_payload(row))
+    db.session.commit()
+    return row
 
 
-def edit_task(task_id, task_name, priority, deadline):
-    t = Task.query.get(task_id)
-    t.task_name = task_name
-    t.priority = priority
-    t.deadline = deadline
-    db.session.commit()
+def edit_task(user_id, task_id, task_name, priority, deadline, list_id=None):
+    return _update_task(user_id, task_id, "task_edited", list_id, task_name=task_name, priority=priority,
+                        priority_rank=priority_rank(priority), deadline=deadline)
 
 
-def delete_task(task_id):
-    Task.query.get(task_id).is_deleted = True
-    db.session.commit()
+def delete_task(user_id, task_id, list_id=None):
+    return _update_task(user_id, task_id, "task_deleted", list_id, is_deleted=True, deleted_at=datetime.utcnow())
 
 
-def toggle_task(task_id, isChecked):
-    Task.query.get(task_id).isChecked = bool(isChecked)
-    db.session.commit()
+def toggle_task(user_id, task_id, isChecked, list_id=None):
+    return _update_task(user_id, task_id, "task_toggled", list_id, isChecked=bool(isChecked))
+
+
+def undo_task_delete(user_id, task_id, list_id=None):
+    task = _update_task(user_id, task_id, "task_undone", list_id, is_deleted=False, deleted_at=None)
+    if task is None:
+        # past the undo window the row may already sit in the archive
+        task = restore_archived_task(user_id, task_id, list_id)
+    return task
+
+
+# ================= CONCURRENT EDITS =================
+
+# what an edit can change; priority_rank follows priority
+MERGE_FIELDS = ("task_name", "priority", "deadline", "isChecked")
+# conditional UPDATEs tried before giving a task that keeps changing back to the client
+MERGE_ATTEMPTS = 3
+
+
+class EditConflict(Exception):
+    """An edit made from an older version changed a field someone else changed too.
+
+    current is the task as it is now (a row like _update_task returns) and
+    fields the names of the fields both changed; empty if the task kept
+    changing while the edit was merged.
+    """
+
+    def __init__(self, current, fields):
+        super().__init__(f"changed meanwhile: {', '.join(fields) or 'everything'}")
+        self.current = current
+        self.fields = fields
+
 
+def get_task_row(user_id, task_id, list_id=None):
+    """A task as _update_task returns it, without changing it; None like _update_task."""
+    query = db.select(Task.list_id, *TASK_COLUMNS, Task.is_deleted)\
+        .where(Task.task_id == task_id, _list_access_exists(user_id, Task.list_id))
+    if list_id is not None:
+        query = query.where(Task.list_id == list_id)
+    return db.session.execute(query).first()
 
-def undo_task_delete(task_id):
-    Task.query.get(task_id).is_deleted = False
+
+def _field(row, field):
+    value = getattr(row, field)
+    return bool(value) if field == "isChecked" else value
+
+
+def merge_task_changes(current, values, base):
+    """The part of values still to write onto current; raises EditConflict if changes overlap.
+
+    base holds the values the client started from. Fields the client left at
+    their base value aren't part of its change and keep whatever they hold
+    now. A changed field that still has its base value takes the client's
+    value, and one that already holds the client's value needs no write. Any
+    other changed field was changed to something else by someone else.
+    """
+    changed = [field for field in MERGE_FIELDS
+               if field in values and (field not in base or values[field] != base[field])]
+    conflicts = [field for field in changed
+                 if _field(current, field) != values[field] and (field not in base or _field(current, field) != base[field])]
+    if conflicts:
+        raise EditConflict(current, conflicts)
+    merged = {field: values[field] for field in changed if _field(current, field) != values[field]}
+    if "priority" in merged:
+        merged["priority_rank"] = values["priority_rank"]
+    return merged
+
+
+def parse_edit_base(base):
+    """The values an edit started from, as parse_task_fields parses them (isChecked too)."""
+    values = parse_task_fields(base, partial=True)
+    if "isChecked" in base:
+        try:
+            values["isChecked"] = bool(int(base["isChecked"]))
+        except (TypeError, ValueError):
+            raise ValueError("isChecked must be 0 or 1")
+    return values
+
+
+def update_task_fields(user_id, task_id, values, list_id=None, version=None, base=None):
+    """Write an edit (parse_task_fields values, and/or isChecked) made from version of a task.
+
+    Without a version, the last write wins. With one, the edit is written in a
+    single conditional UPDATE that only applies while the task is still at
+    that version. If it moved on, the edit is merged field by field against
+    base, the values the client started from (merge_task_changes), and
+    written at the newer version. Returns the row like _update_task, or None
+    if the task isn't there. Raises EditConflict if both sides changed the
+    same field.
+    """
+    event_type = "task_toggled" if list(values) == ["isChecked"] else "task_edited"
+    current = None
+    for _ in range(MERGE_ATTEMPTS):
+        row = _update_task(user_id, task_id, event_type, list_id, version, **values)
+        if row is not None or version is None:
+            return row
+        current = get_task_row(user_id, task_id, list_id)
+        if current is None:
+            return None
+        values = merge_task_changes(current, values, base or {})
+        if not values:
+            # someone else already made the same change
+            return current
+        version = current.version
+    raise EditConflict(current, [])
+
+
+# ================= MANUAL ORDER =================
+
+def last_rank(list_id):
+    """Highest rank in list_id, deleted tasks included; None for an empty list."""
+    return db.session.scalar(
+        db.select(Task.rank).where(Task.list_id == list_id).order_by(Task.rank.desc()).limit(1)
+    )
+
+
+def move_task(user_id, list_id, task_id, anchor_id=None, before=False):
+    """Put a task right after anchor_id in the manual order (right before it with before=True).
+
+    anchor_id None moves the task to the top, or with before=True to the
+    bottom. Only the moved task's rank is written. Returns the row like
+    _update_task, or None when the task isn't a live task of a list the user
+    can access, or the anchor isn't in that list.
+    """
+    # check before writing anything, so a rejected move neither locks the list nor bumps its version
+    movable = db.select(Task.task_id).where(
+        Task.task_id == task_id, Task.list_id == list_id, Task.is_deleted == db.false(),
+        _list_access_exists(user_id, Task.list_id))
+    anchor_query = db.select(Task.rank).where(Task.task_id == anchor_id, Task.list_id == list_id)
+    if db.session.scalar(movable) is None or (anchor_id is not None and db.session.scalar(anchor_query) is None):
+        db.session.rollback()
+        return None
+    # the version bump locks the list row, so moves into the same gap and rebalances take turns
+    bump_list_versions([list_id])
+    anchor = None
+    if anchor_id is not None:
+        # read again under the lock: a rebalance may have renumbered the list meanwhile
+        anchor = db.session.scalar(anchor_query)
+        if anchor is None:
+            db.session.rollback()
+            return None
+    # the nearest rank on the anchor's other side; deleted tasks count, so an undo never lands on a taken rank
+    neighbour = db.select(Task.rank).where(Task.list_id == list_id, Task.task_id != task_id).limit(1)
+    if before:
+        if anchor is not None:
+            neighbour = neighbour.where(Task.rank < anchor)
+        low, high = db.session.scalar(neighbour.order_by(Task.rank.desc())), anchor
+    else:
+        if anchor is not None:
+            neighbour = neighbour.where(Task.rank > anchor)
+        low, high = anchor, db.session.scalar(neighbour.order_by(Task.rank.asc()))
+    rank = rank_between(low, high)
+
+    row = db.session.execute(
+        db.update(Task)
+        .where(Task.task_id == task_id, Task.list_id == list_id, Task.is_deleted == db.false(),
+               _list_access_exists(user_id, Task.list_id))
+        .values(rank=rank, version=Task.version + 1)
+        .returning(Task.list_id, *TASK_COLUMNS, Task.is_deleted),
+        execution_options={"synchronize_session": False},
+    ).first()
+    if row is None:
+        db.session.rollback()
+        return None
+    queue_list_event(db.session, list_id, "task_moved", **task_payload(row))
+    db.session.commit()
+    if len(rank) > RANK_REBALANCE_LENGTH:
+        rank_rebalancer.request(list_id)
+    return row
+
+
+def rebalance_ranks(list_id):
+    """Give every task of list_id a fresh short rank, keeping the order. Returns how many changed.
+
+    Rewrites the list in one transaction, so it only runs for lists whose
+    ranks grew long: from RankRebalancer after such a move, or from
+    `flask rebalance-ranks`.
+    """
+    bump_list_versions([list_id])
+    rows = db.session.execute(
+        db.select(Task.task_id, Task.rank).where(Task.list_id == list_id).order_by(Task.rank, Task.task_id)
+    ).all()
+    changes = [{"task_id": row.task_id, "rank": rank}
+               for row, rank in zip(rows, rank_sequence()) if row.rank != rank]
+    if not changes:
+        db.session.rollback()
+        return 0
+    # executemany UPDATE by primary key. Versions stay: a renumbering changes nothing anyone edits
+    db.session.execute(db.update(Task), changes)
+    # open pages hold the old ranks; they load the list again
+    queue_list_event(db.session, list_id, "tasks_reranked")
+    db.session.commit()
+    return len(changes)
+
+
+@main.cli.command("rebalance-ranks")
+@click.option("--max-length", type=int, default=RANK_REBALANCE_LENGTH, show_default=True,
+              help="Renumber lists holding a rank longer than this.")
+def rebalance_ranks_command(max_length):
+    """Renumber the manual order of lists whose ranks grew too long."""
+    list_ids = db.session.scalars(
+        db.select(Task.list_id).where(db.func.length(Task.rank) > max_length).distinct()
+    ).all()
+    for list_id in list_ids:
+        click.echo(f"list {list_id}: {rebalance_ranks(list_id)} ranks renumbered")
+    click.echo(f"Rebalanced {len(list_ids)} lists.")
+
+
+# ================= ARCHIVE =================
+
+# deleted tasks stay in tasks (and undoable in place) for this long
+TASK_UNDO_WINDOW = timedelta(seconds=int(os.getenv("TASK_UNDO_WINDOW_SECONDS", str(7 * 24 * 3600))))
+COMPACT_BATCH_SIZE = int(os.getenv("COMPACT_BATCH_SIZE", "1000"))
+
+# columns copied between tasks and tasks_archive
+ARCHIVED_COLUMNS = ("task_id", "task_name", "isChecked", "priority", "priority_rank",
+                    "deadline", "created_at", "list_id", "deleted_at", "version")
+
+
+def restore_archived_task(user_id, task_id, list_id=None):
+    """Move an archived task back into tasks as a live row.
+
+    Undo keeps working after compaction, it just takes a DELETE and an INSERT
+    instead of one UPDATE. Returns the row like _update_task, or None.
+    """
+    query = db.delete(TaskArchive).where(TaskArchive.task_id == task_id,
+                                         _list_access_exists(user_id, TaskArchive.list_id))
+    if list_id is not None:
+        query = query.where(TaskArchive.list_id == list_id)
+    row = db.session.execute(
+        query.returning(*(getattr(TaskArchive, c) for c in ARCHIVED_COLUMNS)),
+        execution_options={"synchronize_session": False},
+    ).first()
+    if row is None:
+        db.session.commit()
+        return None
+    bump_list_versions([row.list_id])
+    # the archive keeps no rank (the list may have been renumbered since): it comes back at the end
+    task = db.session.execute(
+        db.insert(Task)
+        .values(**dict(row._mapping, is_deleted=False, deleted_at=None, rank=rank_between(last_rank(row.list_id), None),
+                       version=row.version + 1))
+        .returning(Task.list_id, *TASK_COLUMNS, Task.is_deleted)
+    ).first()
+    update_list_stats(row.list_id, added=[task_state(row.isChecked, False, row.deadline)])
+    queue_list_event(db.session, row.list_id, "task_undone", **task_payload(task))
+    db.session.commit()
+    return task
+
+
+def compact_deleted_tasks(older_than=TASK_UNDO_WINDOW, batch_size=COMPACT_BATCH_SIZE, max_batches=None, pause=0.0):
+    """Move soft-deleted tasks older than `older_than` into tasks_archive.
+
+    Works in batches of batch_size rows, one short transaction each, so it can
+    run next to live traffic. Each batch is a DELETE ... RETURNING that
+    re-checks is_deleted, so a task undone mid-run stays put. Returns the
+    number of rows moved.
+    """
+    cutoff = datetime.utcnow() - older_than
+    conditions = [Task.is_deleted == db.true(), Task.deleted_at < cutoff]
+    if db.engine.dialect.name == "sqlite":
+        # SQLite hands out max(rowid) + 1 as the next id; keeping the newest row in tasks
+        # stops it from reusing archived ids, which would collide on undo
+        conditions.append(Task.task_id < db.select(db.func.max(Task.task_id)).scalar_subquery())
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        # oldest first through ix_tasks_deleted_at; SKIP LOCKED lets two runs share the work on Postgres
+        batch = (
+            db.select(Task.task_id)
+            .where(*conditions)
+            .order_by(Task.deleted_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        rows = db.session.execute(
+            db.delete(Task)
+            .where(Task.task_id.in_(batch.scalar_subquery()), Task.is_deleted == db.true())
+            .returning(*(getattr(Task, c) for c in ARCHIVED_COLUMNS)),
+            execution_options={"synchronize_session": False},
+        ).all()
+        if rows:
+            archived_at = datetime.utcnow()
+            db.session.execute(db.insert(TaskArchive),
+                               [dict(row._mapping, archived_at=archived_at) for row in rows])
+            removed = {}
+            for row in rows:
+                removed.setdefault(row.list_id, []).append(task_state(row.isChecked, True, row.deadline))
+            for list_id, states in removed.items():
+                update_list_stats(list_id, removed=states)
+        db.session.commit()
+        moved += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+        if pause:
+            # let autovacuum and live traffic breathe between batches
+            time.sleep(pause)
+    return moved
+
+
+def task_table_report():
+    """Row counts and on-disk size of tasks and tasks_archive, for before/after compaction."""
+    counts = db.session.execute(db.select(
+        db.select(db.func.count()).where(Task.is_deleted == db.false()).scalar_subquery(),
+        db.select(db.func.count()).where(Task.is_deleted == db.true()).scalar_subquery(),
+        db.select(db.func.count()).select_from(TaskArchive).scalar_subquery(),
+    )).one()
+    report = {
+        "tasks": {"live_rows": counts[0], "deleted_rows": counts[1]},
+        "tasks_archive": {"rows": counts[2]},
+    }
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        # dead tuples are what deleted/updated rows leave behind until VACUUM
+        stats = db.session.execute(db.text(
+            "SELECT relname, n_live_tup, n_dead_tup, pg_total_relation_size(relid) "
+            "FROM pg_stat_user_tables WHERE relname IN ('tasks', 'tasks_archive')"
+        )).all()
+        for relname, live, dead, size in stats:
+            report[relname].update(bytes=size, dead_tuples=dead)
+    elif dialect == "sqlite":
+        page_size = db.session.execute(db.text("PRAGMA page_size")).scalar()
+        free_pages = db.session.execute(db.text("PRAGMA freelist_count")).scalar()
+        report["database"] = {"free_bytes": free_pages * page_size}
+        try:
+            # dbstat is only there when SQLite was built with it
+            sizes = db.session.execute(db.text(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN ('tasks', 'tasks_archive') GROUP BY name"
+            )).all()
+        except Exception:
+            db.session.rollback()
+            sizes = []
+        for name, size in sizes:
+            report[name]["bytes"] = size
+    db.session.commit()
+    return report
+
+
+def vacuum_tasks():
+    """Reclaim space left by compaction; VACUUM can't run inside a transaction."""
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("VACUUM (ANALYZE) tasks")
+        elif conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("VACUUM")
+
+
+@main.cli.command("compact-tasks")
+@click.option("--older-than", type=int, default=int(TASK_UNDO_WINDOW.total_seconds()), show_default=True,
+              help="Archive tasks deleted more than this many seconds ago.")
+@click.option("--batch-size", type=int, default=COMPACT_BATCH_SIZE, show_default=True)
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+@click.option("--pause", type=float, default=0.0, help="Seconds to sleep between batches.")
+@click.option("--vacuum/--no-vacuum", default=False, help="VACUUM afterwards to reclaim space.")
+def compact_tasks_command(older_than, batch_size, max_batches, pause, vacuum):
+    """Move old soft-deleted tasks into tasks_archive and report table bloat."""
+    before = task_table_report()
+    moved = compact_deleted_tasks(timedelta(seconds=older_than), batch_size, max_batches, pause)
+    if vacuum:
+        vacuum_tasks()
+    after = task_table_report()
+    click.echo(f"Archived {moved} tasks.")
+    click.echo(json.dumps({"before": before, "after": after}, indent=2))
+
+
+# operations accepted by the batch endpoint
+BATCH_OPS = ("toggle", "delete", "undo", "edit")
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+
+
+def apply_task_batch(user_id, operations):
+    """Apply a list of task operations in one transaction with set-based UPDATEs.
+
+    Operations are folded in order into a final state per task, so toggling
+    the same box on and off in one batch costs nothing. Raises ValueError for a
+    malformed batch, LookupError for unknown tasks and PermissionError if any
+    task is on a list the user can't access; nothing is written in those cases.
+    Returns the number of tasks changed.
+    """
+    if not isinstance(operations, list) or len(operations) > MAX_BATCH_SIZE:
+        raise ValueError(f"expected a list of at most {MAX_BATCH_SIZE} operations")
+
+    checked = {}   # task_id -> bool
+    deleted = {}   # task_id -> bool
+    edits = {}     # task_id -> {column: value}
+    for op in operations:
+        if not isinstance(op, dict) or op.get("op") not in BATCH_OPS:
+            raise ValueError(f"each operation needs an 'op' of {', '.join(BATCH_OPS)}")
+        try:
+            task_id = int(op["task_id"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("each operation needs an integer 'task_id'")
+
+        if op["op"] == "toggle":
+            # True and False compare equal to 1 and 0
+            if op.get("isChecked", 0) not in (0, 1, "0", "1"):
+                raise ValueError("isChecked must be 0 or 1")
+            checked[task_id] = bool(int(op.get("isChecked", 0)))
+        elif op["op"] == "delete":
+            deleted[task_id] = True
+        elif op["op"] == "undo":
+            deleted[task_id] = False
+        else:
+            edits[task_id] = parse_task_fields(op)
+
+    task_ids = set(checked) | set(deleted) | set(edits)
+    if not task_ids:
+        return 0
+
+    # access check for the whole batch in one query; it also locks the rows
+    # and reads the state list_stats is counted from
+    rows = db.session.execute(
+        db.select(Task.task_id, Task.list_id, _list_access_exists(user_id, Task.list_id).label("allowed"),
+                  Task.isChecked, Task.is_deleted, Task.deadline)
+        .where(Task.task_id.in_(task_ids))
+        .with_for_update(of=Task)
+    ).all()
+    if len(rows) != len(task_ids):
+        raise LookupError()
+    if not all(row.allowed for row in rows):
+        raise PermissionError()
+
+    def update_where_in(ids, event_type, **values):
+        if ids:
+            changed = db.session.execute(
+                db.update(Task).where(Task.task_id.in_(ids)).values(**values, version=Task.version + 1)
+                .returning(Task.list_id, *TASK_COLUMNS),
+                execution_options={"synchronize_session": False},
+            )
+            for row in changed:
+                queue_list_event(db.session, row.list_id, event_type, **task_payload(row))
+
+    for value in (True, False):
+        update_where_in([t for t, v in checked.items() if v is value], "task_toggled", isChecked=value)
+        update_where_in([t for t, v in deleted.items() if v is value],
+                        "task_deleted" if value else "task_undone", is_deleted=value,
+                        deleted_at=datetime.utcnow() if value else None)
+    if edits:
+        # executemany UPDATE by primary key; on the table, as the ORM's bulk form can't bump the version
+        tasks = Task.__table__
+        db.session.execute(
+            tasks.update().where(tasks.c.task_id == db.bindparam("edited_id")).values(version=tasks.c.version + 1),
+            [{"edited_id": task_id, **values} for task_id, values in edits.items()],
+        )
+        # an executemany UPDATE can't return rows: read the edited ones back, for the same events as single edits
+        for row in db.session.execute(db.select(Task.list_id, *TASK_COLUMNS).where(Task.task_id.in_(edits))):
+            queue_list_event(db.session, row.list_id, "task_edited", **task_payload(row))
+    bump_list_versions({row.list_id for row in rows})
+    removed, added = {}, {}
+    for row in rows:
+        removed.setdefault(row.list_id, []).append(task_state(row.isChecked, row.is_deleted, row.deadline))
+        added.setdefault(row.list_id, []).append(task_state(
+            checked.get(row.task_id, row.isChecked),
+            deleted.get(row.task_id, row.is_deleted),
+            edits.get(row.task_id, {}).get("deadline", row.deadline),
+        ))
+    for list_id in removed:
+        update_list_stats(list_id, removed=removed[list_id], added=added[list_id])
     db.session.commit()
+    return len(task_ids)
+
+
+# number of tasks rendered per page of the list view
+TASK_PAGE_SIZE = int(os.getenv("TASK_PAGE_SIZE", "50"))
+
+# sort modes accepted from the query string -> (column, fixed direction or None)
+TASK_SORTS = {
+    "created_at": (Task.created_at, None),
+    "deadline": (Task.deadline, None),
+    "priority": (Task.priority_rank, "asc"),
+    # drag and drop order, top to bottom
+    "manual": (Task.rank, "asc"),
+}
+
 
+def encode_cursor(value, task_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, task_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-def get_tasks(list_id, sort="created_at", order="desc"):
-    user_id = session["user_id"]
 
-    owns = List.query.filter_by(list_id=list_id, owner_id=user_id).first()
-    collab = ListCollaborator.query.filter_by(list_id=list_id, user_id=user_id).first()
-    if not owns and not collab:
+def decode_cursor(cursor, column):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    value, task_id = json.loads(base64.urlsafe_b64decode(padded))
+    if column.type.python_type is datetime:
+        value = datetime.fromisoformat(value)
+    return value, int(task_id)
+
+
+def get_tasks(list_id, sort="created_at", order="desc", cursor=None, limit=TASK_PAGE_SIZE):
+    """Return one page of tasks and the cursor for the next page (None on the last page).
+
+    Pages are keyset based: the cursor holds the sort value and task_id of the
+    last row shown, so each page is an index range scan no matter how deep it is.
+    """
+    if not user_can_access_list(session["user_id"], list_id):
         raise PermissionError()
 
-    q = Task.query.filter_by(list_id=list_id, is_deleted=False)
+    column, direction = TASK_SORTS.get(sort, TASK_SORTS["created_at"])
+    direction = direction or ("asc" if order == "asc" else "desc")
 
-    if sort == "priority":
-        q = q.order_by(db.case(
-            (Task.priority == "high", 1),
-            (Task.priority == "medium", 2),
-            else_=3
-        ))
+    # plain rows, not ORM objects: they index like the old tuples and carry task_payload's attributes
+    q = db.select(*TASK_COLUMNS, column.label("sort_key"))
+    # literal false (not a bound parameter) so the partial indexes match
+    q = q.where(Task.list_id == list_id, Task.is_deleted == db.false())
+
+    # task_id breaks ties so rows with equal sort values never repeat or go missing
+    if cursor:
+        try:
+            last_value, last_id = decode_cursor(cursor, column)
+        except (ValueError, TypeError):
+            last_value = last_id = None
+        if last_id is not None:
+            key = db.tuple_(column, Task.task_id)
+            if direction == "asc":
+                q = q.where(key > db.tuple_(last_value, last_id))
+            else:
+                q = q.where(key < db.tuple_(last_value, last_id))
+
+    if direction == "asc":
+        q = q.order_by(column.asc(), Task.task_id.asc())
     else:
-        q = q.order_by(getattr(getattr(Task, sort), order)())
-
-    results = q.all()
-    return [
-        (
-            t.task_id,
-            t.task_name,
-            1 if t.isChecked else 0,
-            t.priority,
-            t.deadline,
-            t.created_at,
-        )
-        for t in results
-    ]
+        q = q.order_by(column.desc(), Task.task_id.desc())
+
+    # one extra row tells us whether there is a next page
+    tasks = db.session.execute(q.limit(limit + 1)).all()
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        last = tasks[-1]
+        next_cursor = encode_cursor(last.sort_key, last.task_id)
+
+    return tasks, next_cursor
+
+
+# user_id -> [(list_id, list_name, owner_name)] for the lists sidebar. Per
+# worker like the access cache; other workers catch up within SIDEBAR_CACHE_TTL.
+sidebar_cache = TTLCache(
+    maxsize=int(os.getenv("SIDEBAR_CACHE_SIZE", "5000")),
+    ttl=int(os.getenv("SIDEBAR_CACHE_TTL", "60")),
+)
+
+
+def get_user_lists(user_id):
+    """Owned and collaborated lists of a user, served from the sidebar cache."""
+    lists = sidebar_cache.get(user_id)
+    if lists is None:
+        # two index lookups unioned, instead of an outer join + OR + GROUP BY
+        owned = db.select(List.list_id, List.list_name, User.name.label("owner_name"))\
+            .join(User, List.owner_id == User.user_id)\
+            .where(List.owner_id == user_id)
+        shared = db.select(List.list_id, List.list_name, User.name.label("owner_name"))\
+            .join(User, List.owner_id == User.user_id)\
+            .join(ListCollaborator, List.list_id == ListCollaborator.list_id)\
+            .where(ListCollaborator.user_id == user_id)
+        # from the primary, like the access cache
+        with primary():
+            rows = db.session.execute(db.union(owned, shared).order_by("list_id")).all()
+        lists = [tuple(row) for row in rows]
+        sidebar_cache.set(user_id, lists)
+    return lists
+
+
+def invalidate_owner_sidebars(owner_id):
+    """Drop cached sidebars that show owner_id's name: their own and their collaborators'."""
+    sidebar_cache.invalidate(owner_id)
+    collaborator_ids = db.session.scalars(
+        db.select(ListCollaborator.user_id).distinct()
+        .join(List, ListCollaborator.list_id == List.list_id)
+        .where(List.owner_id == owner_id)
+    )
+    for collaborator_id in collaborator_ids:
+        sidebar_cache.invalidate(collaborator_id)
 
 
-def get_collaborators(list_id):
-    return db.session.query(User.user_id, User.name, User.email)\
-        .join(ListCollaborator, ListCollaborator.user_id == User.user_id)\
-        .filter(ListCollaborator.list_id == list_id)\
+def get_collaborators_by_list(owner_id):
+    """Map list_id -> [(user_id, name, email)] for every list the owner has, in one query."""
+    rows = db.session.query(ListCollaborator.list_id, User.user_id, User.name, User.email)\
+        .join(User, ListCollaborator.user_id == User.user_id)\
+        .join(List, ListCollaborator.list_id == List.list_id)\
+        .filter(List.owner_id == owner_id)\
+        .order_by(ListCollaborator.list_id, User.name)\
         .all()
 
+    collaborators = {}
+    for list_id, user_id, name, email in rows:
+        collaborators.setdefault(list_id, []).append((user_id, name, email))
+    return collaborators
+
+
+# ================= SEARCH =================
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+# deep pages of a ranked search are never read; cap the OFFSET work
+SEARCH_MAX_PAGE = 50
+SEARCH_MAX_TERMS = 8
+
+
+def search_terms(query):
+    """Words of a user query; everything else (quotes, operators) is dropped."""
+    return re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+
+
+def _accessible_list_ids(user_id):
+    owned = db.select(List.list_id).where(List.owner_id == user_id)
+    shared = db.select(ListCollaborator.list_id).where(ListCollaborator.user_id == user_id)
+    return owned.union(shared)
+
+
+def search_tasks(user_id, query, page=1, limit=SEARCH_PAGE_SIZE):
+    """Ranked page of live tasks matching every word of query (as a prefix) on the user's lists.
+
+    Returns (rows, has_next). Rows carry TASK_COLUMNS plus list_id and
+    list_name. Matching, ranking and the access check are one statement: a
+    tsvector/GIN match on Postgres, FTS5 on SQLite, LIKE anywhere else.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+
+    dialect = db.engine.dialect.name
+    q = (
+        db.select(*TASK_COLUMNS, Task.list_id, List.list_name)
+        .join(List, Task.list_id == List.list_id)
+        # literal false so the partial GIN index applies
+        .where(Task.is_deleted == db.false(), Task.list_id.in_(_accessible_list_ids(user_id)))
+    )
+    if dialect == "postgresql":
+        tsquery = db.func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        search_vector = db.literal_column("tasks.search_vector")
+        rank = db.func.ts_rank(search_vector, tsquery)
+        q = q.where(search_vector.op("@@")(tsquery)).order_by(rank.desc(), Task.task_id.desc())
+    elif dialect == "sqlite":
+        # quoted terms can't be read as FTS5 operators; * makes each a prefix match
+        match = " ".join('"{}"*'.format(term) for term in terms)
+        q = (
+            q.join(db.table("tasks_fts", db.column("rowid")), db.text("tasks_fts.rowid = tasks.task_id"))
+            .where(db.text("tasks_fts MATCH :match").bindparams(match=match))
+            # bm25 is lower for better matches
+            .order_by(db.text("bm25(tasks_fts)"), Task.task_id.desc())
+        )
+    else:
+        for term in terms:
+            q = q.where(Task.task_name.ilike(f"%{term}%"))
+        q = q.order_by(Task.task_id.desc())
+
+    page = min(max(page, 1), SEARCH_MAX_PAGE)
+    rows = db.session.execute(q.limit(limit + 1).offset((page - 1) * limit)).all()
+    return rows[:limit], len(rows) > limit
+
+# ================= REMINDERS =================
+
+def load_upcoming_deadlines(start, end, list_id=None):
+    """(task_id, list_id, task_name, deadline) of open tasks due in [start, end), by deadline.
+
+    A range scan of ix_tasks_open_deadline (or of the list's deadline index
+    with list_id); the literal booleans keep the partial index usable.
+    """
+    q = db.select(Task.task_id, Task.list_id, Task.task_name, Task.deadline)\
+        .where(Task.deadline >= start, Task.deadline < end,
+               Task.is_deleted == db.false(), Task.isChecked == db.false())\
+        .order_by(Task.deadline, Task.task_id)
+    if list_id is not None:
+        q = q.where(Task.list_id == list_id)
+    return [tuple(row) for row in db.session.execute(q)]
+
+
+def verify_reminders(reminders):
+    """task_ids of the reminders whose task is still open and due when the reminder says."""
+    due = {r.task_id: r.deadline for r in reminders}
+    rows = db.session.execute(
+        db.select(Task.task_id, Task.deadline)
+        .where(Task.task_id.in_(due), Task.is_deleted == db.false(), Task.isChecked == db.false())
+    )
+    return {row.task_id for row in rows if row.deadline == due[row.task_id]}
+
+
+# ================= IMPORT / EXPORT =================
+
+# columns of an exported task, in file order; an import reads the same ones
+TRANSFER_COLUMNS = ("task_name", "priority", "deadline", "isChecked", "created_at")
+TRANSFER_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# rows per server-side cursor fetch and per yielded chunk of an export
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "2000"))
+# rows per COPY / executemany of an import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+# row errors listed in the import response; the rest are only counted
+IMPORT_MAX_ERRORS = 100
+# columns an import writes, in COPY order
+_IMPORT_COLUMNS = ("task_name", "isChecked", "priority", "priority_rank", "deadline", "created_at", "list_id", "is_deleted",
+                   "rank")
+
+
+def export_tasks(list_id, fmt):
+    """Yield a list's live tasks as chunks of CSV or NDJSON text, oldest first.
+
+    Rows come through a server-side cursor EXPORT_CHUNK_ROWS at a time, so
+    memory stays flat however long the list is. Needs the app context for the
+    whole iteration; wrap it in stream_with_context.
+    """
+    result = db.session.execute(
+        db.select(*(getattr(Task, c) for c in TRANSFER_COLUMNS))
+        .where(Task.list_id == list_id, Task.is_deleted == db.false())
+        # the order of ix_tasks_list_created_at, so Postgres streams straight off the index
+        .order_by(Task.created_at, Task.task_id),
+        execution_options={"yield_per": EXPORT_CHUNK_ROWS},
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    dumps = current_app.json.dumps
+    if fmt == "csv":
+        writer.writerow(TRANSFER_COLUMNS)
+    for rows in result.partitions():
+        for row in rows:
+            record = {
+                "task_name": row.task_name,
+                "priority": row.priority,
+                "deadline": row.deadline.isoformat(),
+                "isChecked": 1 if row.isChecked else 0,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            if fmt == "csv":
+                writer.writerow(record.values())
+            else:
+                buffer.write(dumps(record))
+                buffer.write("\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _read_records(stream, fmt):
+    """Yield (line number, record dict or None if unreadable) from an upload, one line at a time."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+def parse_import_record(record, list_id):
+    """Column values of one uploaded task. Raises ValueError like parse_task_fields."""
+    if record is None:
+        raise ValueError("not a valid JSON object")
+    values = parse_task_fields(record)
+    checked = record.get("isChecked")
+    if checked in (None, ""):
+        checked = False
+    elif str(checked).lower() in ("1", "true"):
+        checked = True
+    elif str(checked).lower() in ("0", "false"):
+        checked = False
+    else:
+        raise ValueError("isChecked must be 0 or 1")
+    created_at = record.get("created_at")
+    try:
+        created_at = to_utc(datetime.fromisoformat(created_at)) if created_at else datetime.utcnow()
+    except (TypeError, ValueError):
+        raise ValueError("created_at must be an ISO date and time")
+    return dict(values, isChecked=checked, created_at=created_at, list_id=list_id, is_deleted=False)
+
+
+def _insert_task_batch(rows):
+    if db.engine.dialect.name == "postgresql":
+        # COPY skips per-row statement overhead entirely; it runs on the session's connection and transaction
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([row[c] for c in _IMPORT_COLUMNS] for row in rows)
+        buffer.seek(0)
+        columns = ", ".join(f'"{c}"' for c in _IMPORT_COLUMNS)
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY tasks ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+    else:
+        # executemany INSERT
+        db.session.execute(db.insert(Task), rows)
+
+
+def import_tasks(list_id, stream, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """Insert the tasks of an uploaded CSV or NDJSON file into list_id.
+
+    The upload is read a line at a time and written IMPORT_BATCH_SIZE rows at
+    a time, all in one transaction. Rows that don't validate are skipped; the
+    rest go to the end of the manual order, in file order.
+    Returns (imported count, rejected count, first IMPORT_MAX_ERRORS errors
+    as {"line", "error"} dicts).
+    """
+    # the list row first, like every task change, so the last rank stays the last while we append
+    bump_list_versions([list_id])
+    ranks = rank_sequence(last_rank(list_id))
+    # locking the counters row up front keeps overdue_as_of fixed while rows are counted against it
+    overdue_as_of = db.session.scalar(
+        db.select(ListStats.overdue_as_of).where(ListStats.list_id == list_id).with_for_update()
+    )
+    counts = dict.fromkeys(LIST_STATS_COLUMNS, 0)
+    imported = rejected = 0
+    errors = []
+    batch = []
+    for line_number, record in _read_records(stream, fmt):
+        try:
+            row = parse_import_record(record, list_id)
+        except ValueError as e:
+            rejected += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"line": line_number, "error": str(e)})
+            continue
+        if row["isChecked"]:
+            counts["completed_tasks"] += 1
+        else:
+            counts["open_tasks"] += 1
+            if overdue_as_of is not None and row["deadline"] < overdue_as_of:
+                counts["overdue_tasks"] += 1
+        row["rank"] = next(ranks)
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _insert_task_batch(batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        _insert_task_batch(batch)
+        imported += len(batch)
+
+    if imported:
+        db.session.execute(
+            db.update(ListStats).where(ListStats.list_id == list_id)
+            .values(**{column: getattr(ListStats, column) + n for column, n in counts.items() if n}),
+            execution_options={"synchronize_session": False},
+        )
+        queue_list_event(db.session, list_id, "tasks_imported", count=imported)
+    db.session.commit()
+    return imported, rejected, errors
+
+
 # flask connections
 
 # home page
-@app.route('/')
+@main.route('/')
+@replica_reads
 def index():
     # check if session contains user id
     if 'user_id' not in session:
         flash("Please login to add tasks.")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     user_id = session['user_id']
 
     sort = request.args.get("sort", "created_at")
     order = request.args.get("order", "desc")
+    cursor = request.args.get("cursor")
 
     # get list id from url query string /?list_id=7
     list_id = request.args.get("list_id")
@@ -264,7 +1602,7 @@ def index():
             list_id = int(list_id)
         except ValueError:
             flash("Invalid list selected.")
-            return redirect(url_for('index'))  # safer to redirect to a create list page
+            return redirect(url_for('main.index'))  # safer to redirect to a create list page
     else:
         list_id = get_default_list_id(user_id)
 
@@ -272,44 +1610,52 @@ def index():
     if not list_id:
         flash("No list available. Please create a list first.")
         # send the other variables to index.html
-        return render_template("index.html", tasks=[], lists=[], current_list_id=None, name=session['name'], email=session['email'])
-
-    # fetch tasks of that list
-    try:
-        tasks = get_tasks(list_id, sort, order)
-    except PermissionError:
+        task_list = render_template("_task_list.html", tasks=[], current_list_id=None, cursor=None, next_cursor=None)
+        return render_template("index.html", task_list=task_list, lists=[], current_list_id=None, name=session['name'], email=session['email'])
+
+    # fetch all owned and collaborated lists
+    lists = get_user_lists(user_id)
+
+    # answer with 304 if nothing on this page changed since the browser's copy
+    etag = None
+    if user_can_access_list(user_id, list_id):
+        version = get_list_versions([list_id]).get(list_id)
+        etag = make_etag('index', user_id, session['name'], session['email'], list_id, version,
+                         sort, order, cursor, lists)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        # one page of tasks, rendered once per list version and shared by everyone who sees the list
+        def task_page():
+            tasks, next_cursor = get_tasks(list_id, sort, order, cursor)
+            return dict(tasks=tasks, current_list_id=list_id, sort=sort, order=order, cursor=cursor,
+                        next_cursor=next_cursor)
+        task_list = fragment_cache.render("_task_list.html", (list_id, version, sort, order, cursor), task_page)
+    else:
         flash("You do not have access to this list.")
-        tasks = []  # show empty tasks instead of redirecting
-
-
-    # fetch all owned and collaborated lists via SQLAlchemy
-    lists = (
-        db.session.query(
-            List.list_id, List.list_name, User.name.label("owner_name")
-        )
-        .join(User, List.owner_id == User.user_id)
-        .outerjoin(ListCollaborator, List.list_id == ListCollaborator.list_id)
-        .filter((List.owner_id == user_id) | (ListCollaborator.user_id == user_id))
-        .group_by(List.list_id, List.list_name, User.name)
-        .order_by(List.list_id.asc())
-        .all()
-    )
+        # show empty tasks instead of redirecting
+        task_list = render_template("_task_list.html", tasks=[], current_list_id=list_id, cursor=cursor, next_cursor=None)
 
     # pass the session values explicitly from login details
-    return render_template("index.html", tasks=tasks, lists=lists, current_list_id=int(list_id), name=session['name'], email=session['email'])
+    return render_with_etag(etag, "index.html", task_list=task_list, lists=lists, current_list_id=list_id, name=session['name'], email=session['email'],
+                            sort=sort, order=order, cursor=cursor)
 
 # adding tasks
-@app.route('/add_task', methods=['POST'])
+@main.route('/add_task', methods=['POST'])
 def add_task_route():
     # check if session contains user id
     if 'user_id' not in session:
         flash("Please login to add tasks.")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     user_id = session['user_id']
-    task_name = request.form['task_name']
-    priority = request.form['priority']
-    deadline = request.form['deadline']
+    # same validation as the JSON API; also turns the deadline into a datetime
+    try:
+        fields = parse_task_fields(request.form)
+    except ValueError as e:
+        flash(f"Could not add the task: {e}.", "error")
+        return redirect(url_for('main.index', list_id=request.form.get('list_id')))
 
     # get list_id from form
     list_id = request.form.get('list_id')
@@ -321,88 +1667,337 @@ def add_task_route():
     # if get default list returns None
     if not list_id:
         flash("No list available to add the task.")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
-    # access check via SQLAlchemy: owner or collaborator
-    owns = List.query.filter_by(list_id=list_id, owner_id=user_id).first()
-    collab = ListCollaborator.query.filter_by(list_id=list_id, user_id=user_id).first()
-    if not owns and not collab:
+    # access check: owner or collaborator
+    if not user_can_access_list(user_id, list_id):
         flash("You do not have access to this list.")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     # add the task
-    add_task(task_name, priority, deadline, list_id)
+    add_task(fields["task_name"], fields["priority"], fields["deadline"], list_id)
     flash("Task addded successfully!")
     # remain in the same list page
-    return redirect(url_for('index', list_id=list_id)) 
+    return redirect(url_for('main.index', list_id=list_id)) 
 
 # edit tasks
-@app.route('/update_task/<int:task_id>', methods=['POST'])
+@main.route('/update_task/<int:task_id>', methods=['POST'])
 def edit_task_route(task_id):
-    user_id = session['user_id']
-    task_name = request.form['task_name']
-    priority = request.form['priority']
-    deadline = request.form['deadline']
+    if 'user_id' not in session:
+        flash("Please login to edit tasks.")
+        return redirect(url_for('main.login'))
 
-    # get hidden list_id from form
-    list_id = request.form.get('list_id')
-    if list_id:
-        list_id = int(list_id)
-    else:
-        # fallback: fetch list_id from the task itself via SQLAlchemy
-        t = Task.query.get(task_id)
-        if t:
-            list_id = t.list_id
-        else:
-            list_id = get_default_list_id(user_id)
+    user_id = session['user_id']
+    try:
+        fields = parse_task_fields(request.form)
+        # the version and values the form was opened with, so a concurrent edit gets merged
+        version = int(request.form["version"]) if request.form.get("version") else None
+        base = parse_edit_base({k.removeprefix("base_"): v for k, v in request.form.items() if k.startswith("base_")})
+    except ValueError as e:
+        flash(f"Could not update the task: {e}.", "error")
+        return redirect(url_for('main.index', list_id=request.form.get('list_id')))
+
+    # the task's own list decides access, not the hidden list_id in the form
+    try:
+        task = update_task_fields(user_id, task_id, fields, version=version, base=base)
+    except EditConflict as e:
+        flash(f"Someone else changed this task's {', '.join(e.fields) or 'details'} meanwhile, "
+              "so your edit was not saved. Edit it again to change their version.", "error")
+        return redirect(url_for('main.index', list_id=e.current.list_id))
+    if task is None:
+        flash("Task not found.", "error")
+        return redirect(url_for('main.index'))
 
-    edit_task(task_id, task_name, priority, deadline)
-    return redirect(url_for('index', list_id=list_id))
+    return redirect(url_for('main.index', list_id=task.list_id))
 
 # delete tasks
-@app.route('/delete_task/<int:task_id>', methods=['GET']) 
+@main.route('/delete_task/<int:task_id>', methods=['GET']) 
 def delete_task_route(task_id):
-    # fetch the list_id of this task via SQLAlchemy
-    t = Task.query.get(task_id)
-    if not t:
+    if 'user_id' not in session:
+        flash("Please login to delete tasks.")
+        return redirect(url_for('main.login'))
+
+    # access check, update and list_id lookup in one statement
+    task = delete_task(session['user_id'], task_id)
+    if task is None:
         flash("Task not found.", "error")
-        return redirect(url_for('index')) # fall back to default
-    
-    list_id = t.list_id
+        return redirect(url_for('main.index')) # fall back to default
 
-    delete_task(task_id)
-    flash(f"Task deleted! <a href='{url_for('undo_task_delete_route', task_id=task_id)}' class='btn undo-btn'>Undo</a>", "undo")
+    flash(f"Task deleted! <a href='{url_for('main.undo_task_delete_route', task_id=task_id)}' class='btn undo-btn'>Undo</a>", "undo")
 
-    return redirect(url_for('index', list_id=list_id)) 
+    return redirect(url_for('main.index', list_id=task.list_id)) 
 
 # toggle tasks
-@app.route('/toggle_task/<int:task_id>', methods=['POST'])
+@main.route('/toggle_task/<int:task_id>', methods=['POST'])
 def toggle_task_route(task_id):
+    if 'user_id' not in session:
+        return '', 401
+
     isChecked = int(request.form['isChecked'])
-    toggle_task(task_id, isChecked)
+    if toggle_task(session['user_id'], task_id, isChecked) is None:
+        return '', 404
     return '', 204 # no content
 
 # undo task delete
-@app.route('/undo_task_delete/<int:task_id>', methods=['GET', 'POST'])
+@main.route('/undo_task_delete/<int:task_id>', methods=['GET', 'POST'])
 def undo_task_delete_route(task_id):
-    # fetch the list_id of this task via SQLAlchemy
-    t = Task.query.get(task_id)
-    if not t:
+    if 'user_id' not in session:
+        flash("Please login to restore tasks.")
+        return redirect(url_for('main.login'))
+
+    # access check, update and list_id lookup in one statement
+    task = undo_task_delete(session['user_id'], task_id)
+    if task is None:
         flash("Task not found.", "error")
-        return redirect(url_for('index')) # fall back to default
-    
-    list_id = t.list_id
-    
-    undo_task_delete(task_id)
+        return redirect(url_for('main.index')) # fall back to default
+
+    return redirect(url_for('main.index', list_id=task.list_id)) 
+
+# batch task changes: JSON array of {"op": "toggle"|"delete"|"undo"|"edit", "task_id": ...}
+@main.route('/tasks/batch', methods=['POST'])
+def task_batch_route():
+    if 'user_id' not in session:
+        return jsonify(error="Please login first."), 401
+
+    try:
+        changed = apply_task_batch(session['user_id'], request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except LookupError:
+        return jsonify(error="Task not found."), 404
+    except PermissionError:
+        return jsonify(error="You do not have access to this list."), 403
+    return jsonify(changed=changed)
+
+# ================= JSON TASK API =================
+# Same helpers as the HTML routes, but each call answers with just the affected
+# task so the page can patch one row instead of following a redirect.
+
+TASK_API_MAX_LIMIT = 200
+
+
+def api_error(message, status):
+    return jsonify(error=message), status
+
+
+def _api_task(task):
+    if task is None:
+        return api_error("Task not found.", 404)
+    return jsonify(task=task_payload(task))
+
+
+@main.route('/api/lists/<int:list_id>/tasks', methods=['GET'])
+@replica_reads
+def api_list_tasks(list_id):
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+
+    try:
+        limit = min(max(int(request.args.get("limit", TASK_PAGE_SIZE)), 1), TASK_API_MAX_LIMIT)
+    except ValueError:
+        return api_error("limit must be an integer", 400)
+    try:
+        tasks, next_cursor = get_tasks(list_id, request.args.get("sort", "created_at"),
+                                       request.args.get("order", "desc"), request.args.get("cursor"), limit)
+    except PermissionError:
+        return api_error("You do not have access to this list.", 403)
+    return jsonify(tasks=[task_payload(t) for t in tasks], next_cursor=next_cursor)
+
+
+@main.route('/api/lists/<int:list_id>/tasks', methods=['POST'])
+def api_create_task(list_id):
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+    if not user_can_access_list(session['user_id'], list_id):
+        return api_error("You do not have access to this list.", 403)
 
-    return redirect(url_for('index', list_id=list_id)) 
+    try:
+        values = parse_task_fields(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return api_error(str(e), 400)
+    task = add_task(values["task_name"], values["priority"], values["deadline"], list_id)
+    return jsonify(task=task), 201
+
+
+@main.route('/api/lists/<int:list_id>/tasks/<int:task_id>', methods=['PATCH'])
+def api_update_task(list_id, task_id):
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+
+    data = request.get_json(silent=True) or {}
+    try:
+        values = parse_task_fields(data, partial=True)
+    except ValueError as e:
+        return api_error(str(e), 400)
+    if "isChecked" in data:
+        if data["isChecked"] not in (0, 1, True, False):
+            return api_error("isChecked must be 0 or 1", 400)
+        values["isChecked"] = bool(data["isChecked"])
+    if not values:
+        return api_error("nothing to update", 400)
+
+    # optional: the version the client edited and the values it saw then (see update_task_fields)
+    version = data.get("version")
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+        return api_error("version must be an integer", 400)
+    try:
+        base = parse_edit_base(data.get("base") or {})
+    except ValueError as e:
+        return api_error(f"base: {e}", 400)
+    try:
+        task = update_task_fields(session['user_id'], task_id, values, list_id, version, base)
+    except EditConflict as e:
+        return jsonify(error="Someone else changed this task meanwhile.", conflicts=e.fields,
+                       task=task_payload(e.current)), 409
+    return _api_task(task)
+
+
+@main.route('/api/lists/<int:list_id>/tasks/<int:task_id>', methods=['DELETE'])
+def api_delete_task(list_id, task_id):
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+    return _api_task(delete_task(session['user_id'], task_id, list_id))
+
+
+@main.route('/api/lists/<int:list_id>/tasks/<int:task_id>/undo', methods=['POST'])
+def api_undo_task_delete(list_id, task_id):
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+    return _api_task(undo_task_delete(session['user_id'], task_id, list_id))
+
+
+@main.route('/api/lists/<int:list_id>/tasks/<int:task_id>/move', methods=['POST'])
+def api_move_task(list_id, task_id):
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+
+    # {"after_id": id} puts the task right below that task and {"before_id": id} right above it;
+    # null moves it to the top (after_id) or the bottom (before_id)
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict) or ("after_id" in data) == ("before_id" in data):
+        return api_error("give either after_id or before_id", 400)
+    before = "before_id" in data
+    anchor_id = data["before_id" if before else "after_id"]
+    if anchor_id is not None and (not isinstance(anchor_id, int) or isinstance(anchor_id, bool)):
+        return api_error("after_id and before_id must be task ids or null", 400)
+    if not user_can_access_list(session['user_id'], list_id):
+        return api_error("You do not have access to this list.", 403)
+    return _api_task(move_task(session['user_id'], list_id, task_id, anchor_id, before))
+
+
+def _transfer_format():
+    fmt = request.args.get("format")
+    if fmt is None:
+        # an upload's filename or content type, else CSV
+        upload = request.files.get("file")
+        name = upload.filename if upload else ""
+        mimetype = upload.mimetype if upload else request.mimetype
+        fmt = "ndjson" if name.endswith((".ndjson", ".jsonl")) or "json" in (mimetype or "") else "csv"
+    return fmt if fmt in TRANSFER_FORMATS else None
+
+
+@main.route('/api/lists/<int:list_id>/export')
+@replica_reads
+def api_export_tasks(list_id):
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+    if not user_can_access_list(session['user_id'], list_id):
+        return api_error("You do not have access to this list.", 403)
+    fmt = _transfer_format()
+    if fmt is None:
+        return api_error("format must be csv or ndjson", 400)
+
+    return current_app.response_class(
+        stream_with_context(export_tasks(list_id, fmt)),
+        mimetype=TRANSFER_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="list-{list_id}.{fmt}"'},
+    )
+
+
+@main.route('/api/lists/<int:list_id>/import', methods=['POST'])
+def api_import_tasks(list_id):
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+    if not user_can_access_list(session['user_id'], list_id):
+        return api_error("You do not have access to this list.", 403)
+    fmt = _transfer_format()
+    if fmt is None:
+        return api_error("format must be csv or ndjson", 400)
+
+    # a multipart "file" field, or the file as the raw request body
+    upload = request.files.get("file")
+    stream = upload.stream if upload else request.stream
+    imported, rejected, errors = import_tasks(list_id, stream, fmt)
+    return jsonify(imported=imported, rejected=rejected, errors=errors)
+
+@main.route('/api/search')
+@replica_reads
+def api_search():
+    if 'user_id' not in session:
+        return api_error("Please login first.", 401)
+
+    page = request.args.get("page", 1, type=int)
+    rows, has_next = search_tasks(session['user_id'], request.args.get("q", ""), page)
+    return jsonify(
+        tasks=[dict(task_payload(row), list_id=row.list_id, list_name=row.list_name) for row in rows],
+        page=page,
+        next_page=page + 1 if has_next else None,
+    )
+
+# live updates for one list as Server-Sent Events
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@main.route('/lists/<int:list_id>/events')
+def list_events_route(list_id):
+    if 'user_id' not in session:
+        return '', 401
+    user_id = session['user_id']
+    if not user_can_access_list(user_id, list_id):
+        return '', 403
+
+    subscription = list_events.subscribe(list_id)
+    # this worker now has someone to remind
+    reminder_service.start()
+
+    # no request or DB state is used below, so the connection goes back to the pool right away
+    dumps = current_app.json.dumps
+
+    def stream():
+        with subscription:
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event['type'] == 'collaborator_removed' and event['data']['user_id'] == user_id:
+                    yield "event: access_revoked\ndata: {}\n\n"
+                    return
+                yield f"event: {event['type']}\ndata: {dumps(event['data'])}\n\n"
+
+    return current_app.response_class(stream(), mimetype='text/event-stream',
+                              headers={'X-Accel-Buffering': 'no'})
+
+# search tasks across every list the user can see
+@main.route('/search')
+@replica_reads
+def search():
+    if 'user_id' not in session:
+        flash("Please login to search tasks.")
+        return redirect(url_for('main.login'))
+
+    query = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+    rows, has_next = search_tasks(session['user_id'], query, page) if query else ([], False)
+    return render_template("search.html", query=query, results=rows, page=page, has_next=has_next)
 
 # sign up page
-@app.route('/signup', methods=['POST', 'GET'])
+@main.route('/signup', methods=['POST', 'GET'])
 def signup():
     # If user already logged in, don't allow access to signup page (prevents Back showing signup)
     if 'user_id' in session:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     if request.method == 'POST':
         # Request the following from the form to add to database
         email = request.form['email']
@@ -412,21 +2007,21 @@ def signup():
         # If user is already taken, signup again
         if user_exists(name, email):
             flash("Username or email already taken. Please try again.")
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
         else: 
 
             signup_user(name, password, email)
             flash("Account created successfully!")
             # Proceed to login page after signup
-            return redirect(url_for('login')) 
+            return redirect(url_for('main.login')) 
     # Load signup page first before processing form 
     return render_template("signup.html")
 
 # login page
-@app.route('/login', methods=['POST', 'GET'])
+@main.route('/login', methods=['POST', 'GET'])
 def login():
     if 'user_id' in session:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     if request.method == 'POST':
         # user submitted the form
         name = request.form['name']
@@ -436,54 +2031,59 @@ def login():
         # if user doesnt exist in the db, login again
         if user is None:
             flash('Username not found.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         
         # if user exists, retrieve hashed pw from db
         stored_pwd = user.password
 
         # verify password
         # rehash entered password and compare to the stored password
-        if check_password_hash(stored_pwd, password):
+        matches, needs_rehash = passwords.verify(stored_pwd, password)
+        if matches:
+            if needs_rehash:
+                # transparently move legacy or outdated hashes to current argon2 parameters
+                user.password = passwords.hash(password)
+                db.session.commit()
             # store session details from get_user(name) signed by secret key
             session['user_id'] = user.user_id
             session['name'] = user.name
             session['email'] = user.email
             flash('Login successful!')
-            return redirect(url_for('index')) 
+            return redirect(url_for('main.index')) 
         else:
             flash('Incorrect password.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
     # visit login page first
     return render_template("login.html")
 
 # forgot password
-@app.route('/forgot_password', methods = ['GET', 'POST'])
+@main.route('/forgot_password', methods = ['GET', 'POST'])
 def forgot_password():
     # If user already logged in, redirect to index (no need to recover password)
     if 'user_id' in session:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     if request.method == 'POST':
         email = request.form['email']
         user = get_user_email(email)
 
         if user:
             # generate token from user email
-            token = serializer.dumps(email, salt='password-recovery')
+            token = get_serializer().dumps(email, salt='password-recovery')
             # generate link with token
             # reset_password will handle the request
-            reset_link = url_for('reset_password', token=token, _external=True)
+            reset_link = url_for('main.reset_password', token=token, _external=True)
 
             # show link on page instead of sending email
-            return redirect(url_for('show_reset_link', link=reset_link))
+            return redirect(url_for('main.show_reset_link', link=reset_link))
         else:
             # ask for password again
             flash("Email not found.")
-            return redirect(url_for('forgot_password'))
+            return redirect(url_for('main.forgot_password'))
     # load forgotpwd page first
     return render_template('forgotpwd.html')
 
 # reset link
-@app.route('/show_reset_link')
+@main.route('/show_reset_link')
 def show_reset_link():
     # retrieve reset_link from /forgot_password
     link = request.args.get('link')
@@ -491,42 +2091,43 @@ def show_reset_link():
     return render_template('resetlink.html', link=link)
 
 # reset password
-@app.route('/reset_password/<token>', methods=['GET', 'POST'])
+@main.route('/reset_password/<token>', methods=['GET', 'POST'])
 # token comes from the reset link
 def reset_password(token):
     # step 1
     try:
         # decode token back to original email
         # salt to ensure it only works for password recovery tokens
-        email = serializer.loads(token, salt='password-recovery', max_age=3600)
+        email = get_serializer().loads(token, salt='password-recovery', max_age=3600)
     except (SignatureExpired, BadSignature):
         '''
         SignatureExpired - token is valid but expired
         BadSignature - token was tampered with or invalid
         '''
         flash("Invalid or expired reset link.", "error")
-        return redirect(url_for('forgot_password'))
+        return redirect(url_for('main.forgot_password'))
 
     if request.method == 'POST':
         # once the user has submitted their new password
         new_password = request.form['new_password']
-        hashed = generate_password_hash(new_password)
+        hashed = passwords.hash(new_password)
         u = User.query.filter_by(email=email).first()
         if u:
             u.password = hashed
             db.session.commit()
         flash("Password reset successful!", "success")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     return render_template('resetpass.html', email=email)
     
 # profile
-@app.route('/profile', methods=['GET', 'POST'])
+@main.route('/profile', methods=['GET', 'POST'])
+@replica_reads
 def profile():
     user_id = session.get('user_id')
     if not user_id:
         flash("You need to log in to access your profile.", "error")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     if request.method == 'POST':
         name = request.form.get('name')
@@ -542,7 +2143,7 @@ def profile():
             session['email'] = new_email
         if password and password.strip():
             updates.append('password')
-            hashed = generate_password_hash(password)
+            hashed = passwords.hash(password)
         else:
             hashed = None
 
@@ -555,11 +2156,17 @@ def profile():
                     u.email = new_email
                 if 'password' in updates and hashed:
                     u.password = hashed
+                if 'name' in updates or 'email' in updates:
+                    # collaborator names and emails are shown on the owners' collaboration pages
+                    bump_list_versions(db.select(ListCollaborator.list_id).where(ListCollaborator.user_id == user_id))
                 db.session.commit()
+                if 'name' in updates:
+                    # owner names are shown in collaborators' sidebars too
+                    invalidate_owner_sidebars(user_id)
             flash("Profile updated successfully!", "success")
         else:
             flash("No changes detected.", "info")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     # GET: prefill form
     u = User.query.get(user_id)
@@ -570,33 +2177,38 @@ def profile():
 # === COLLABORATION ===
 
 # create list
-@app.route('/create_list', methods=['POST'])
+@main.route('/create_list', methods=['POST'])
 def create_list():
     if 'user_id' not in session:
         flash("Please login first.", "error")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     # '' - default value if list name not found
     list_name = request.form.get('list_name', '').strip()
     if not list_name:
         flash("List name cannot be empty.", "error")
-        return redirect(url_for('collaboration'))
+        return redirect(url_for('main.collaboration'))
 
     user_id = session['user_id']
 
     new_list = List(list_name=list_name, owner_id=user_id)
     db.session.add(new_list)
+    db.session.flush()
+    db.session.add(ListStats(list_id=new_list.list_id))
     db.session.commit()
+    list_access_cache.invalidate((user_id, new_list.list_id))
+    sidebar_cache.invalidate(user_id)
 
     flash(f"List '{list_name}' created successfully!", "success")
-    return redirect(url_for('collaboration'))
+    return redirect(url_for('main.collaboration'))
 
 # collaboration
-@app.route('/collaboration')
+@main.route('/collaboration')
+@replica_reads
 def collaboration():
     if 'user_id' not in session:
         flash("Please login to view your lists.")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     user_id = session['user_id']
 
@@ -608,27 +2220,33 @@ def collaboration():
         except ValueError:
             current_list_id = None
 
-    # fetch all owned and collaborated lists via SQLAlchemy
-    lists = (
-        db.session.query(
-            List.list_id, List.list_name, User.name.label('owner_name')
-        )
-        .join(User, List.owner_id == User.user_id)
-        .outerjoin(ListCollaborator, List.list_id == ListCollaborator.list_id)
-        .filter((List.owner_id == user_id) | (ListCollaborator.user_id == user_id))
-        .group_by(List.list_id, List.list_name, User.name)
-        .order_by(List.list_id.asc())
-        .all()
-    )
+    # fetch all owned and collaborated lists
+    lists = get_user_lists(user_id)
 
-    return render_template('collaboration.html', lists=lists, current_list_id=current_list_id, get_collaborators=get_collaborators)
+    # every list's version covers its collaborators, so 304 if none changed
+    versions = get_list_versions([lst[0] for lst in lists])
+    etag = make_etag('collaboration', user_id, session.get('name'), current_list_id, lists, sorted(versions.items()))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
 
+    def summaries():
+        # collaborators of all owned lists at once instead of one query per list in the template
+        collaborators = get_collaborators_by_list(user_id)
+        # task counters bump the list version whenever they change, so the ETag covers them
+        list_stats = get_list_stats([lst[0] for lst in lists])
+        return dict(lists=lists, current_list_id=current_list_id, collaborators=collaborators, list_stats=list_stats)
 
-@app.route('/add_collaborator', methods=['POST'])
+    # same inputs as the ETag, so other devices and tabs reuse the rendered lists too
+    list_summaries = fragment_cache.render("_lists.html", etag, summaries)
+    return render_with_etag(etag, 'collaboration.html', list_summaries=list_summaries)
+
+
+@main.route('/add_collaborator', methods=['POST'])
 def add_collaborator():
     if 'user_id' not in session:
         flash("Please login first.", "error")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     user_id = session['user_id']
     list_id = int(request.form['list_id'])
@@ -638,13 +2256,13 @@ def add_collaborator():
     owner_list = List.query.get(list_id)
     if not owner_list or owner_list.owner_id != user_id:
         flash("You do not have permission to add collaborators.", "error")
-        return redirect(url_for('index', list_id=list_id))
+        return redirect(url_for('main.index', list_id=list_id))
 
     # find the collaborator user_id by email
     collaborator = User.query.filter_by(email=collaborator_email).first()
     if not collaborator:
         flash("User not found.", "error")
-        return redirect(url_for('index', list_id=list_id))
+        return redirect(url_for('main.index', list_id=list_id))
 
     collaborator_id = collaborator.user_id
 
@@ -652,23 +2270,28 @@ def add_collaborator():
     if collaborator_id == user_id:
         flash("You cannot add yourself as collaborator.", "info")
         conn.close()
-        return redirect(url_for('index', list_id=list_id))
+        return redirect(url_for('main.index', list_id=list_id))
 
     # add collaborator if not already exists
     try:
         db.session.add(ListCollaborator(list_id=list_id, user_id=collaborator_id))
+        bump_list_versions([list_id])
+        queue_list_event(db.session, list_id, "collaborator_added", user_id=collaborator_id,
+                         name=collaborator.name, email=collaborator.email)
         db.session.commit()
+        list_access_cache.invalidate((collaborator_id, list_id))
+        sidebar_cache.invalidate(collaborator_id)
         flash(f"Added collaborator: {collaborator_email}", "success")
     except IntegrityError:
         db.session.rollback()
         flash("User is already a collaborator.", "info")
-    return redirect(url_for('index', list_id=list_id))
+    return redirect(url_for('main.index', list_id=list_id))
 
-@app.route('/remove_collaborator', methods=['POST'])
+@main.route('/remove_collaborator', methods=['POST'])
 def remove_collaborator():
     if 'user_id' not in session:
         flash("Please login first.", "error")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     user_id = session['user_id']
     list_id = int(request.form['list_id'])
@@ -678,25 +2301,63 @@ def remove_collaborator():
     lst = List.query.get(list_id)
     if not lst or lst.owner_id != user_id:
         flash("You do not have permission to remove collaborators.", "error")
-        return redirect(url_for('index', list_id=list_id))
+        return redirect(url_for('main.index', list_id=list_id))
 
     # remove collaborator
     ListCollaborator.query.filter_by(list_id=list_id, user_id=collaborator_id).delete()
+    bump_list_versions([list_id])
+    queue_list_event(db.session, list_id, "collaborator_removed", user_id=collaborator_id)
     db.session.commit()
+    list_access_cache.invalidate((collaborator_id, list_id))
+    sidebar_cache.invalidate(collaborator_id)
     flash("Collaborator removed successfully.", "success")
-    return redirect(url_for('index', list_id=list_id))
+    return redirect(url_for('main.index', list_id=list_id))
 
 # logout
-@app.route('/logout')
+@main.route('/logout')
 def logout():
     session.clear()  # removes user_id, username, etc.
     flash("You have been logged out.", "info")
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
+
+def create_app(config=None):
+    """Build the app. Cheap: no database connection is opened until a request needs one."""
+    app = Flask(__name__)
+    # if key doesnt exist from .env, use dev_secret_key instead
+    app.secret_key = os.getenv("SECRET_KEY") or "dev_secret_key"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["DATABASE_REPLICA_URLS"] = os.getenv("DATABASE_REPLICA_URLS", "")
+    app.config["FRAGMENT_CACHE_URL"] = os.getenv("FRAGMENT_CACHE_URL", "")
+    app.config["FRAGMENT_CACHE_BYTES"] = int(os.getenv("FRAGMENT_CACHE_BYTES", str(32 * 2**20)))
+    app.config["FRAGMENT_CACHE_TTL"] = int(os.getenv("FRAGMENT_CACHE_TTL", str(24 * 3600)))
+    if config:
+        app.config.update(config)
+    if not app.config.get("SQLALCHEMY_DATABASE_URI"):
+        app.config["SQLALCHEMY_DATABASE_URI"] = database_url()
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"]))
+
+    # each replica becomes a bind, so this goes before db.init_app
+    init_replicas(app, db, [_ensure_sslmode(url) for url in replica_urls(app.config["DATABASE_REPLICA_URLS"])])
+    db.init_app(app)
+    # first, so its before_request hook times everything after it
+    init_metrics(app)
+    init_pools(app, db)
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR)
+    init_assets(app)
+    init_json(app)
+    list_events.init_app(app, db, load_task_payloads)
+    fragment_cache.init_app(app)
+    reminder_service.init_app(app, db, load_upcoming_deadlines, verify_reminders)
+    rank_rebalancer.init_app(app, db, rebalance_ranks)
+    init_schema_check(app, db, MIGRATIONS_DIR)
+    app.register_blueprint(main)
+    return app
+
 
 # run
 if __name__ == "__main__":
-    # app.run(debug=True, host='0.0.0.0')
-    app.run(debug=True)
+    # create_app().run(debug=True, host='0.0.0.0')
+    create_app().run(debug=True)
    
 
 
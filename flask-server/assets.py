@@ -0,0 +1,225 @@
+"""Static asset pipeline.
+
+`flask build-assets` bundles and minifies the stylesheets of each page,
+copies every asset under a content-hashed name into static/dist and writes
+precompressed .gz/.br siblings plus .webp versions of the images. The
+`asset` route serves those files, picking the smallest variant the browser
+accepts, and the `asset_url` / `stylesheet_bundle` template helpers resolve
+hashed names from dist/manifest.json. Without a build everything falls back
+to the plain files in static/.
+"""
+from flask import current_app, request, send_file, url_for, abort
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+import click
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # optional: no .br variants without it
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # optional: no .webp variants without it
+    Image = None
+
+
+# page name -> stylesheets concatenated into that page's single bundle
+BUNDLES = {
+    "base": ["style.css"],
+    "login": ["style.css", "login.css"],
+    "signup": ["style.css", "accounts.css"],
+    "forgotpwd": ["style.css", "forgotpass.css"],
+    "resetlink": ["style.css", "resetlink.css"],
+    "resetpass": ["style.css", "resetpass.css"],
+    "profile": ["style.css", "editprofile.css"],
+    "collaboration": ["style.css", "collaboration.css"],
+}
+
+# files copied under hashed names; CSS url() references are rewritten to them
+HASHED_DIRS = ("images", "fonts")
+HASHED_FILES = ("script.js",)
+
+IMAGE_EXTENSIONS = (".png", ".gif", ".jpg", ".jpeg")
+# already-compressed formats gain nothing from gzip/brotli
+COMPRESS_EXTENSIONS = (".css", ".js", ".otf", ".ttf", ".svg", ".json")
+WEBP_QUALITY = 90
+
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+
+_manifest_cache = {}
+
+
+# ================= BUILD =================
+
+def _hashed_name(relpath, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = os.path.splitext(relpath)
+    return f"{root}.{digest}{ext}"
+
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    # spaces around these never matter; ':' only after it (".a :hover" differs from ".a:hover")
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+def _rewrite_urls(css, files):
+    def replace(match):
+        target = match.group(2)
+        hashed = files.get(target)
+        if hashed is None:
+            return match.group(0)
+        # bundles live in dist/css/, hashed assets in dist/<dir>/
+        return f'url("../{hashed}")'
+
+    return re.sub(r"""url\((['"]?)([^'")]+)\1\)""", replace, css)
+
+
+def _write_variants(path, content):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in COMPRESS_EXTENSIONS:
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + ".br", "wb") as f:
+                f.write(brotli.compress(content, quality=11))
+    if ext in IMAGE_EXTENSIONS and Image is not None:
+        best = None
+        with Image.open(path) as img:
+            animated = getattr(img, "is_animated", False)
+            # pixel art stays lossless; large photographic backgrounds may go lossy
+            options = [dict(lossless=True)] if animated else [dict(lossless=True), dict(quality=WEBP_QUALITY)]
+            for option in options:
+                buffer = io.BytesIO()
+                img.save(buffer, "WEBP", method=6, save_all=animated, **option)
+                if best is None or buffer.tell() < len(best):
+                    best = buffer.getvalue()
+        # keep the webp only when it actually saves bytes
+        if best is not None and len(best) < len(content):
+            with open(path + ".webp", "wb") as f:
+                f.write(best)
+
+
+def _emit(dist, relpath, content):
+    out = os.path.join(dist, relpath)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "wb") as f:
+        f.write(content)
+    _write_variants(out, content)
+
+
+def build_assets(static_folder):
+    """Build static/dist and its manifest; returns the manifest dict."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    files = {}
+
+    sources = list(HASHED_FILES)
+    for directory in HASHED_DIRS:
+        for name in sorted(os.listdir(os.path.join(static_folder, directory))):
+            sources.append(f"{directory}/{name}")
+
+    for relpath in sources:
+        with open(os.path.join(static_folder, relpath), "rb") as f:
+            content = f.read()
+        files[relpath] = _hashed_name(relpath, content)
+        _emit(dist, files[relpath], content)
+
+    bundles = {}
+    for page, stylesheets in BUNDLES.items():
+        css = []
+        for stylesheet in stylesheets:
+            with open(os.path.join(static_folder, stylesheet), encoding="utf-8") as f:
+                css.append(_rewrite_urls(f.read(), files))
+        content = minify_css("\n".join(css)).encode()
+        bundles[page] = _hashed_name(f"css/{page}.css", content)
+        _emit(dist, bundles[page], content)
+
+    manifest = {"files": files, "bundles": bundles}
+    with open(os.path.join(dist, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    _manifest_cache.clear()
+    return manifest
+
+
+# ================= SERVING =================
+
+def load_manifest():
+    static_folder = current_app.static_folder
+    if static_folder not in _manifest_cache:
+        try:
+            with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+                _manifest_cache[static_folder] = json.load(f)
+        except (OSError, ValueError):
+            _manifest_cache[static_folder] = None
+    return _manifest_cache[static_folder]
+
+
+def asset_url(filename):
+    manifest = load_manifest()
+    if manifest and filename in manifest["files"]:
+        return url_for("asset", filename=manifest["files"][filename])
+    return url_for("static", filename=filename)
+
+
+def stylesheet_bundle(page):
+    """<link> tags for a page: the built bundle, or its source stylesheets before a build."""
+    manifest = load_manifest()
+    if manifest and page in manifest["bundles"]:
+        hrefs = [url_for("asset", filename=manifest["bundles"][page])]
+    else:
+        hrefs = [url_for("static", filename=name) for name in BUNDLES.get(page, BUNDLES["base"])]
+    return Markup("\n").join(
+        Markup('<link rel="stylesheet" href="{}">').format(escape(href)) for href in hrefs
+    )
+
+
+def send_asset(filename):
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    path = safe_join(dist, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    chosen, encoding, vary = path, None, "Accept-Encoding"
+
+    if mimetype.startswith("image/"):
+        vary = "Accept"
+        # only an explicit image/webp counts; old browsers also send */*
+        accepts_webp = any(value == "image/webp" and quality > 0 for value, quality in request.accept_mimetypes)
+        if accepts_webp and os.path.isfile(path + ".webp"):
+            chosen, mimetype = path + ".webp", "image/webp"
+    else:
+        for coding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if request.accept_encodings.quality(coding) > 0 and os.path.isfile(path + suffix):
+                chosen, encoding = path + suffix, coding
+                break
+
+    response = send_file(chosen, mimetype=mimetype, conditional=True, etag=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = vary
+    return response
+
+
+def init_assets(app):
+    app.add_url_rule("/static/dist/<path:filename>", "asset", send_asset)
+    app.jinja_env.globals.update(asset_url=asset_url, stylesheet_bundle=stylesheet_bundle)
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """Bundle, hash and precompress static assets into static/dist."""
+        manifest = build_assets(app.static_folder)
+        click.echo(f"Built {len(manifest['bundles'])} bundles and {len(manifest['files'])} files.")
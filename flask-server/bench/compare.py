@@ -0,0 +1,68 @@
+"""Compare two bench/run.py result files.
+
+    python bench/compare.py before.json after.json --threshold 10
+
+Prints the change of each metric per route and mode. With --threshold, exits
+with status 1 if any p50/p95 latency or SQL count grew by more than that many
+percent, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+# metric -> True if larger is worse
+METRICS = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "throughput_rps": False,
+    "sql_per_request": True,
+}
+GATED = ("p50_ms", "p95_ms", "sql_per_request")
+
+
+def change(before, after):
+    if before == 0:
+        return 0.0 if after == 0 else float("inf")
+    return (after - before) / before * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, help="fail on regressions above this percentage")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before {before['meta'].get('commit')}  after {after['meta'].get('commit')}")
+    regressions = []
+    for route, modes in after["routes"].items():
+        if route not in before["routes"]:
+            continue
+        for mode, new in modes.items():
+            old = before["routes"][route].get(mode)
+            if old is None:
+                continue
+            cells = []
+            for metric, larger_is_worse in METRICS.items():
+                delta = change(old[metric], new[metric])
+                cells.append(f"{metric} {old[metric]:g} -> {new[metric]:g} ({delta:+.1f}%)")
+                worse = delta if larger_is_worse else -delta
+                if args.threshold is not None and metric in GATED and worse > args.threshold:
+                    regressions.append(f"{route} {mode} {metric} {delta:+.1f}%")
+            print(f"{route:<20}{mode:<12}" + "  ".join(cells))
+
+    if regressions:
+        print("\nregressions over threshold:")
+        for line in regressions:
+            print("  " + line)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Concurrent edit benchmark: optimistic versions against row locks and blind writes.
+
+--threads simulated users edit the same few --hot tasks over and over. Each
+edit reads the task, "thinks" for --think-ms as a person filling in the edit
+form would, then saves the whole form with one field changed. Worker n
+changes field n % 3 (name, priority or deadline), so most overlapping edits
+touch different fields, as they do on a shared list. Every mode goes through
+the App's own functions:
+
+- blind: the save overwrites the row, last write wins (no version sent);
+- locking: the read takes the row lock (SELECT ... FOR UPDATE) and holds it
+  through the think time. On SQLite, which has no row locks, a lock per task
+  in this process stands in for it;
+- optimistic: the save carries the version it read and the values it
+  started from (update_task_fields). Edits to other fields are merged; a
+  conflict on the same field is saved again from the current row, as a
+  user would after the 409.
+
+Reported per mode: saves per second, p50/p99 latency of a whole edit (read,
+think and save), conflicts, merges, and lost updates. A lost update is a
+field whose final value isn't the one its latest save wrote (latest by
+version), because a save from an older read put a stale value back. Only
+blind writes may lose any; the run fails if the other modes do.
+
+    python bench/concurrency.py --threads 16 --hot 4 --think-ms 5
+    python bench/concurrency.py --database-url postgresql://... --modes locking,optimistic
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from run import percentile
+from seed import SeedConfig, create_seeded_app
+
+MODES = ("blind", "locking", "optimistic")
+FIELDS = ("task_name", "priority", "deadline")
+PRIORITIES = ("high", "medium", "low")
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.conflicts = 0
+        self.merges = 0
+        self.saves = []  # (task_id, field, value, version the save produced)
+
+    def record(self, latency, conflicts, merged, task_id, field, value, version):
+        with self.lock:
+            self.latencies.append(latency)
+            self.conflicts += conflicts
+            self.merges += merged
+            self.saves.append((task_id, field, value, version))
+
+
+def new_value(field, worker, n):
+    if field == "task_name":
+        return f"worker {worker} edit {n}"
+    if field == "priority":
+        return PRIORITIES[(worker + n) % len(PRIORITIES)]
+    return datetime(2030, 1, 1) + timedelta(minutes=worker * 100_000 + n)
+
+
+def form_values(row, field, value):
+    """The whole edit form as read from row, with one field changed; parsed like the routes do."""
+    from App import priority_rank
+
+    values = {"task_name": row.task_name, "priority": row.priority, "deadline": row.deadline, field: value}
+    values["priority_rank"] = priority_rank(values["priority"])
+    return values
+
+
+def edit_once(app, mode, user_id, task_id, field, value, think, task_locks, stats):
+    from App import EditConflict, Task, db, get_task_row, update_task_fields
+
+    began = time.perf_counter()
+    conflicts = merged = 0
+    with app.app_context():
+        try:
+            if mode == "locking":
+                if db.engine.dialect.name == "postgresql":
+                    db.session.execute(db.select(Task.task_id).where(Task.task_id == task_id).with_for_update())
+                    lock = None
+                else:
+                    lock = task_locks[task_id]
+                    lock.acquire()
+                try:
+                    row = get_task_row(user_id, task_id)
+                    time.sleep(think)
+                    # the lock is held until the save commits
+                    saved = update_task_fields(user_id, task_id, form_values(row, field, value))
+                finally:
+                    if lock is not None:
+                        lock.release()
+            else:
+                row = get_task_row(user_id, task_id)
+                # nothing is held while the user thinks
+                db.session.close()
+                time.sleep(think)
+                while True:
+                    values = form_values(row, field, value)
+                    if mode == "blind":
+                        saved = update_task_fields(user_id, task_id, values)
+                        break
+                    base = {name: getattr(row, name) for name in FIELDS}
+                    try:
+                        saved = update_task_fields(user_id, task_id, values, version=row.version, base=base)
+                        merged += saved.version != row.version + 1
+                        break
+                    except EditConflict as e:
+                        # the user sees the current task and saves again
+                        conflicts += 1
+                        row = e.current
+        finally:
+            db.session.remove()
+    stats.record(time.perf_counter() - began, conflicts, merged, task_id, field, value, saved.version)
+
+
+def bench_mode(app, mode, task_ids, args):
+    rng = random.Random(args.seed)
+    stats = Stats()
+    task_locks = {task_id: threading.Lock() for task_id in task_ids}
+    plans = [[rng.choice(task_ids) for _ in range(args.edits)] for _ in range(args.threads)]
+
+    def worker(n):
+        field = FIELDS[n % len(FIELDS)]
+        for i, task_id in enumerate(plans[n]):
+            edit_once(app, mode, 1, task_id, field, new_value(field, n, i), args.think_ms / 1000, task_locks, stats)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        for future in [pool.submit(worker, n) for n in range(args.threads)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    from App import Task, db
+
+    latest = {}
+    for task_id, field, value, version in stats.saves:
+        if version >= latest.get((task_id, field), (-1, None))[0]:
+            latest[(task_id, field)] = (version, value)
+    with app.app_context():
+        rows = {row.task_id: row for row in db.session.execute(
+            db.select(Task.task_id, *[getattr(Task, field) for field in FIELDS]).where(Task.task_id.in_(task_ids)))}
+        db.session.remove()
+    lost = sum(getattr(rows[task_id], field) != value for (task_id, field), (_, value) in latest.items())
+
+    samples = sorted(stats.latencies)
+    return {"mode": mode, "saves": len(samples), "saves_per_s": len(samples) / wall,
+            "p50_ms": percentile(samples, 50) * 1000, "p99_ms": percentile(samples, 99) * 1000,
+            "conflicts": stats.conflicts, "merges": stats.merges, "lost": lost}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="an empty database (default: temporary SQLite file)")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--threads", type=int, default=12)
+    parser.add_argument("--edits", type=int, default=100, help="edits per thread and mode")
+    parser.add_argument("--hot", type=int, default=4, help="tasks everyone edits")
+    parser.add_argument("--think-ms", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=128)
+    args = parser.parse_args()
+
+    # a connection per thread, so waits are for the rows and not the pool
+    os.environ.setdefault("SQLALCHEMY_POOL_SIZE", str(args.threads))
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    app, summary = create_seeded_app(database_url, SeedConfig(
+        users=1, lists_per_user=1, collaborators_per_list=0, tasks_per_list=max(args.hot, 10), seed=args.seed))
+    task_ids = list(range(1, args.hot + 1))
+
+    print(f"{args.threads} threads x {args.edits} edits on {args.hot} tasks, {args.think_ms:g} ms think time")
+    print(f"{'mode':<11}{'saves/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'conflicts':>11}{'merges':>8}{'lost':>6}")
+    failed = False
+    for mode in args.modes.split(","):
+        r = bench_mode(app, mode, task_ids, args)
+        print(f"{mode:<11}{r['saves_per_s']:>9.0f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['conflicts']:>11}{r['merges']:>8}{r['lost']:>6}")
+        failed |= mode != "blind" and r["lost"] > 0
+    if failed:
+        print("updates were lost without blind writes", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
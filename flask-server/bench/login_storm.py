@@ -0,0 +1,159 @@
+"""Login storm benchmark: latency of other routes while many users log in at once.
+
+Starts the app under gunicorn (one worker, gevent like production) once per
+--hash-workers value, and drives it over HTTP:
+
+- --probes logged-in clients load the home page one request after another,
+  first alone and then during the storm;
+- --storm clients log in as fast as the server lets them.
+
+With PASSWORD_HASH_WORKERS=0 each argon2 hash runs inline on the worker's
+event loop, and every other request on the worker waits for it. With a pool
+the worker keeps serving while the hashes run. Reported per setting: home page
+p50/p99 without and with the storm, successful logins per second, and logins
+turned away as busy (PASSWORD_HASH_MAX_PENDING).
+
+    python bench/login_storm.py --hash-workers 0,2 --storm 16 --seconds 10
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from run import percentile
+from seed import BENCH_PASSWORD, SERVER_DIR, SeedConfig, create_seeded_app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Client:
+    """One HTTP connection with its session cookie; redirects are not followed."""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, path, form=None):
+        headers = {"Cookie": self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        cookie = response.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return response
+
+    def login(self, user_id):
+        """True if the login went through, False if the server was too busy to check it."""
+        self.cookie = None
+        response = self.request("POST", "/login", {"name": f"user{user_id}", "password": BENCH_PASSWORD})
+        return urllib.parse.urlparse(response.getheader("Location", "")).path == "/"
+
+
+def start_server(database_url, port, hash_workers, worker_class):
+    env = dict(os.environ, DATABASE_URL=database_url, PASSWORD_HASH_WORKERS=str(hash_workers),
+               SECRET_KEY="bench-secret", SQLALCHEMY_POOL_SIZE="20")
+    # the bench's own settings rather than gunicorn.conf.py, whose hooks need Postgres-only packages
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "App:create_app()", "--config", os.devnull,
+         "--worker-class", worker_class, "--workers", "1", "--bind", f"127.0.0.1:{port}"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if Client(port).request("GET", "/login").status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def probe(port, user_id, stop):
+    """Home page latencies in ms until stop is set."""
+    client = Client(port)
+    while not client.login(user_id):
+        pass
+    samples = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = client.request("GET", "/")
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status == 200, response.status
+    return samples
+
+
+def storm(port, user_id, stop, counts, lock):
+    client = Client(port)
+    while not stop.is_set():
+        ok = client.login(user_id)
+        with lock:
+            counts["ok" if ok else "busy"] += 1
+
+
+def run_phase(port, users, args, with_storm):
+    stop = threading.Event()
+    counts, lock = {"ok": 0, "busy": 0}, threading.Lock()
+    with ThreadPoolExecutor(args.probes + args.storm) as pool:
+        probes = [pool.submit(probe, port, users[i % len(users)], stop) for i in range(args.probes)]
+        if with_storm:
+            for i in range(args.storm):
+                pool.submit(storm, port, users[(args.probes + i) % len(users)], stop, counts, lock)
+        time.sleep(args.seconds)
+        stop.set()
+        samples = sorted(s for future in probes for s in future.result())
+    return samples, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="an empty database (default: temporary SQLite file)")
+    parser.add_argument("--hash-workers", default="0,2", help="PASSWORD_HASH_WORKERS values to compare")
+    parser.add_argument("--worker-class", default="gevent")
+    parser.add_argument("--probes", type=int, default=4, help="clients loading the home page")
+    parser.add_argument("--storm", type=int, default=16, help="clients logging in")
+    parser.add_argument("--seconds", type=float, default=10, help="per phase")
+    parser.add_argument("--users", type=int, default=40)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    _, summary = create_seeded_app(database_url, SeedConfig(
+        users=args.users, lists_per_user=1, collaborators_per_list=0, tasks_per_list=50))
+    users = [user_id for user_id, lists in summary["access"].items() if lists]
+
+    print(f"{args.probes} clients on / with and without {args.storm} clients logging in, "
+          f"{args.seconds:g} s each, {args.worker_class} worker")
+    print(f"{'hash workers':<14}{'p50 alone':>11}{'p99 alone':>11}{'p50 storm':>11}{'p99 storm':>11}"
+          f"{'logins/s':>10}{'busy':>7}")
+    for hash_workers in [int(n) for n in args.hash_workers.split(",")]:
+        port = free_port()
+        server = start_server(database_url, port, hash_workers, args.worker_class)
+        try:
+            alone, _ = run_phase(port, users, args, with_storm=False)
+            during, counts = run_phase(port, users, args, with_storm=True)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{hash_workers:<14}{percentile(alone, 50):>11.1f}{percentile(alone, 99):>11.1f}"
+              f"{percentile(during, 50):>11.1f}{percentile(during, 99):>11.1f}"
+              f"{counts['ok'] / args.seconds:>10.1f}{counts['busy']:>7}")
+
+
+if __name__ == "__main__":
+    main()
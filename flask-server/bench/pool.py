@@ -0,0 +1,110 @@
+"""Pool mode benchmark: the same routes under each SQLALCHEMY_POOL_MODE.
+
+Seeds one database, then builds an app per mode and drives the routes through
+bench/run.py's scenarios, reporting latency, throughput and how many
+connections each mode opened. Pooled modes are warmed first, as the gunicorn
+workers are.
+
+Against a local SQLite file a connection costs nothing, so the differences
+between modes vanish; --connect-ms and --rtt-ms add a simulated handshake per
+new connection and a round trip per statement and per ping. Against a real
+Postgres (behind pgbouncer, say) leave them at 0:
+
+    python bench/pool.py --connect-ms 30 --rtt-ms 1
+    python bench/pool.py --database-url postgresql://... --connect-ms 0 --rtt-ms 0
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from run import SCENARIOS, SQLCounter, bench_route
+from seed import add_arguments, config_from_args, create_seeded_app
+
+
+def add_latency(engine, connect_ms, rtt_ms):
+    from sqlalchemy import event
+
+    if connect_ms:
+        event.listen(engine, "connect", lambda *args: time.sleep(connect_ms / 1000))
+    if rtt_ms:
+        event.listen(engine, "before_cursor_execute", lambda *args: time.sleep(rtt_ms / 1000))
+        # pings skip the cursor events; an instance attribute shadows the dialect's method
+        do_ping = engine.dialect.do_ping
+        engine.dialect.do_ping = lambda dbapi_connection: time.sleep(rtt_ms / 1000) or do_ping(dbapi_connection)
+
+
+def connects():
+    from metrics import POOL_CONNECTS
+    return POOL_CONNECTS._values.get("primary", 0)
+
+
+def bench_mode(mode, database_url, summary, routes, args):
+    os.environ["SQLALCHEMY_POOL_MODE"] = mode
+    from App import create_app, db
+    from pooling import warm_pool
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": database_url})
+    with app.app_context():
+        engine = db.engine
+    add_latency(engine, args.connect_ms, args.rtt_ms)
+    counter = SQLCounter(engine)
+
+    start = time.perf_counter()
+    warmed = warm_pool(engine)
+    warm_ms = (time.perf_counter() - start) * 1000
+    print(f"{mode}: warmed {warmed} connections in {warm_ms:.0f} ms")
+
+    results = {}
+    for name in routes:
+        opened = connects()
+        results[name] = bench_route(app, summary, counter, name, args)
+        results[name]["connects"] = connects() - opened
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="an empty database (default: temporary SQLite file)")
+    parser.add_argument("--modes", default="queue,null,transaction")
+    parser.add_argument("--routes", default="index,toggle_task")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route and mode")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--connect-ms", type=float, default=30, help="simulated cost of opening a connection")
+    parser.add_argument("--rtt-ms", type=float, default=1, help="simulated round trip per statement and ping")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from pooling import POOL_MODES
+    modes = [m for m in args.modes.split(",") if m]
+    routes = [r for r in args.routes.split(",") if r]
+    if set(modes) - set(POOL_MODES):
+        parser.error(f"modes are {', '.join(POOL_MODES)}")
+    if set(routes) - set(SCENARIOS):
+        parser.error(f"routes are {', '.join(SCENARIOS)}")
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.pop("SQLALCHEMY_DISABLE_POOL", None)
+    os.environ["SQLALCHEMY_POOL_MODE"] = "queue"
+    _, summary = create_seeded_app(database_url, config_from_args(args))
+
+    header = (f"{'pool mode':<13}{'route':<14}{'clients':<12}{'p50 ms':>9}{'p95 ms':>9}{'req/s':>9}"
+              f"{'connects':>10}{'errors':>8}")
+    rows = []
+    for mode in modes:
+        results = bench_mode(mode, database_url, summary, routes, args)
+        for route, result in results.items():
+            for clients, r in (("sequential", result["sequential"]), ("concurrent", result["concurrent"])):
+                rows.append(f"{mode:<13}{route:<14}{clients:<12}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                            f"{r['throughput_rps']:>9.1f}{result['connects'] if clients == 'sequential' else '':>10}"
+                            f"{r['errors']:>8}")
+    print()
+    print(header)
+    print("-" * len(header))
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
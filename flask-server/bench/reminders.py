@@ -0,0 +1,131 @@
+"""Reminder scheduler benchmark: window scans, ticks and incremental updates.
+
+Seeds --tasks tasks (millions by default), starts a ReminderScheduler on a
+FakeClock in the middle of their deadlines and reports:
+
+- the window scan: how long start() takes and how many reminders it holds
+  out of all the tasks;
+- --edits random edits, deletes, undos and toggles through the App's task
+  functions, which reach the scheduler as list events, and what each costs;
+- a simulated --hours of ticks every --tick seconds: tick latency and how
+  many reminders go out in how many batches.
+
+At the end, every open task whose reminder fell inside the simulated hours is
+looked up with a plain SQL query. The run fails unless exactly those went out.
+
+    python bench/reminders.py --tasks 2000000 --hours 24
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from run import percentile
+from seed import SeedConfig, create_seeded_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="an empty database (default: temporary SQLite file)")
+    parser.add_argument("--tasks", type=int, default=2_000_000)
+    parser.add_argument("--hours", type=float, default=24, help="simulated time")
+    parser.add_argument("--tick", type=int, default=60, help="seconds between ticks")
+    parser.add_argument("--edits", type=int, default=2000)
+    parser.add_argument("--lead", type=int, default=900, help="REMINDER_LEAD_SECONDS")
+    parser.add_argument("--window", type=int, default=3600, help="REMINDER_WINDOW_SECONDS")
+    parser.add_argument("--seed", type=int, default=128)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    lists = max(1, args.tasks // 1000)
+    start = time.perf_counter()
+    app, summary = create_seeded_app(database_url, SeedConfig(
+        users=lists, lists_per_user=1, collaborators_per_list=0, tasks_per_list=args.tasks // lists, seed=args.seed))
+    print(f"seeded {summary['tasks']} tasks in {lists} lists in {time.perf_counter() - start:.0f} s")
+
+    from App import (Task, db, delete_task, edit_task, list_events, load_upcoming_deadlines, toggle_task,
+                     undo_task_delete, verify_reminders)
+    from reminders import FakeClock, ReminderScheduler
+    from sqlalchemy import event
+
+    rng = random.Random(args.seed)
+    # seeded deadlines cluster around the start of 2025
+    clock = FakeClock(datetime(2025, 1, 1))
+    t0 = clock()
+    with app.app_context():
+        queries = [0]
+        event.listen(db.engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+        scheduler = ReminderScheduler(load_upcoming_deadlines, verify_reminders, clock=clock,
+                                      lead=args.lead, window=args.window)
+        start = time.perf_counter()
+        scheduler.start()
+        print(f"window scan: {len(scheduler)} reminders of {summary['tasks']} tasks "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # changes go through the app, and reach the scheduler the way a worker sees them
+        list_events.watch(scheduler.on_event)
+        soon = db.session.execute(
+            db.select(Task.task_id, Task.list_id)
+            .where(Task.deadline >= t0, Task.deadline < t0 + timedelta(hours=args.hours))
+            .order_by(Task.deadline).limit(args.edits * 4)
+        ).all()
+        samples = []
+        for row in rng.sample(soon, min(args.edits, len(soon))):
+            # one list per user, seeded with the same ids
+            user_id = row.list_id
+            action = rng.choice(("edit", "delete", "undo", "toggle"))
+            began = time.perf_counter()
+            if action == "edit":
+                # due soon after the start, so the reminder is still ahead
+                deadline = t0 + timedelta(seconds=args.lead + rng.randrange(1, int(args.hours * 3600)))
+                edit_task(user_id, row.task_id, "edited", "high", deadline)
+            elif action == "delete":
+                delete_task(user_id, row.task_id)
+            elif action == "undo":
+                delete_task(user_id, row.task_id)
+                undo_task_delete(user_id, row.task_id)
+            else:
+                toggle_task(user_id, row.task_id, rng.randrange(2))
+            samples.append(time.perf_counter() - began)
+        samples.sort()
+        print(f"{len(samples)} task changes: p50 {percentile(samples, 50) * 1000:.2f} ms, "
+              f"p99 {percentile(samples, 99) * 1000:.2f} ms each (commit included)")
+
+        sent, batches, ticks = set(), 0, []
+        duplicates = 0
+        before = queries[0]
+        for _ in range(int(args.hours * 3600 / args.tick)):
+            clock.advance(args.tick)
+            began = time.perf_counter()
+            due = scheduler.due()
+            ticks.append(time.perf_counter() - began)
+            batches += len(due)
+            for reminders in due.values():
+                for reminder in reminders:
+                    duplicates += reminder.task_id in sent
+                    sent.add(reminder.task_id)
+            db.session.remove()
+        ticks.sort()
+        print(f"{len(ticks)} ticks over {args.hours:g} h: p50 {percentile(ticks, 50) * 1000:.2f} ms, "
+              f"p99 {percentile(ticks, 99) * 1000:.2f} ms, max {ticks[-1] * 1000:.2f} ms, "
+              f"{queries[0] - before} queries")
+        print(f"sent {len(sent)} reminders in {batches} batches; holding {len(scheduler)}; "
+              f"peak rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+        lead = timedelta(seconds=args.lead)
+        expected = {task_id for (task_id,) in db.session.execute(
+            db.select(Task.task_id).where(Task.deadline >= t0 + lead, Task.deadline <= clock() + lead,
+                                          Task.is_deleted == db.false(), Task.isChecked == db.false()))}
+    missing, extra = expected - sent, sent - expected
+    if missing or extra or duplicates:
+        print(f"{len(missing)} reminders missing, {len(extra)} unexpected, {duplicates} sent twice", file=sys.stderr)
+        sys.exit(1)
+    print("every due task was reminded exactly once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Route benchmark: latency percentiles, throughput and SQL count per route.
+
+Seeds a fresh database (a temporary SQLite file unless --database-url points
+at an empty one), then drives each route through the Flask test client, first
+one request at a time and then from --threads concurrent clients. Results go
+to stdout as a table and, with --output, to a JSON file that bench/compare.py
+can diff against a run from another commit.
+
+    python bench/run.py --requests 300 --threads 8 --output results.json
+    python bench/run.py --routes index,toggle_task --tasks-per-list 2000
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from seed import BENCH_PASSWORD, SERVER_DIR, add_arguments, config_from_args, create_seeded_app
+
+
+class Context:
+    """One simulated user: a logged-in test client plus the lists it may use."""
+
+    def __init__(self, app, summary, rng):
+        self.app = app
+        self.summary = summary
+        self.rng = rng
+        users = [u for u, lists in summary["access"].items() if lists]
+        self.user_id = rng.choice(users)
+        self.list_ids = summary["access"][self.user_id]
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session["user_id"] = self.user_id
+            session["name"] = f"user{self.user_id}"
+            session["email"] = f"user{self.user_id}@bench.local"
+
+    def list_id(self):
+        return self.rng.choice(self.list_ids)
+
+    def task_id(self, list_id=None):
+        # seeded task ids are contiguous per list
+        per_list = self.summary["tasks_per_list"]
+        return ((list_id or self.list_id()) - 1) * per_list + self.rng.randrange(per_list) + 1
+
+
+def _index(ctx):
+    return ctx.client.get("/", query_string={"list_id": ctx.list_id()})
+
+
+def _index_by_priority(ctx):
+    return ctx.client.get("/", query_string={"list_id": ctx.list_id(), "sort": "priority"})
+
+
+def _index_manual(ctx):
+    return ctx.client.get("/", query_string={"list_id": ctx.list_id(), "sort": "manual"})
+
+
+def _move_task(ctx):
+    # drop a task right after another one of the same list
+    list_id = ctx.list_id()
+    return ctx.client.post(f"/api/lists/{list_id}/tasks/{ctx.task_id(list_id)}/move",
+                           json={"after_id": ctx.task_id(list_id)})
+
+
+def _collaboration(ctx):
+    return ctx.client.get("/collaboration")
+
+
+def _add_task(ctx):
+    return ctx.client.post("/add_task", data={
+        "task_name": "bench task", "priority": ctx.rng.choice(("high", "medium", "low")),
+        "deadline": "2030-01-01T12:00", "list_id": ctx.list_id(),
+    })
+
+
+def _toggle_task(ctx):
+    return ctx.client.post(f"/toggle_task/{ctx.task_id()}", data={"isChecked": ctx.rng.randrange(2)})
+
+
+def _login(ctx):
+    # a fresh client each time: logged-in clients are redirected away from /login
+    client = ctx.app.test_client()
+    return client.post("/login", data={"name": f"user{ctx.user_id}", "password": BENCH_PASSWORD})
+
+
+# name -> (request function, statuses that count as success)
+SCENARIOS = {
+    "index": (_index, {200}),
+    "index_by_priority": (_index_by_priority, {200}),
+    "index_manual": (_index_manual, {200}),
+    "collaboration": (_collaboration, {200}),
+    "add_task": (_add_task, {302}),
+    "toggle_task": (_toggle_task, {204}),
+    # 404: the seeded task was soft-deleted
+    "move_task": (_move_task, {200, 404}),
+    "login": (_login, {302}),
+}
+
+
+class SQLCounter:
+    """Counts statements per thread, so concurrent requests don't mix their counts."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._local = threading.local()
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def timed_requests(ctx, request, counter, n):
+    samples = []
+    for _ in range(n):
+        counter.reset()
+        start = time.perf_counter()
+        response = request(ctx)
+        elapsed = time.perf_counter() - start
+        samples.append((elapsed, counter.count, response.status_code))
+    return samples
+
+
+def summarize(samples, wall, ok_statuses):
+    latencies = sorted(s[0] * 1000 for s in samples)
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if s[2] not in ok_statuses),
+        "statuses": statuses,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "throughput_rps": round(len(samples) / wall, 1),
+        "sql_per_request": round(statistics.fmean(s[1] for s in samples), 2),
+    }
+
+
+def bench_route(app, summary, counter, name, args):
+    request, ok_statuses = SCENARIOS[name]
+    rng = random.Random(f"{args.seed}:{name}")
+
+    ctx = Context(app, summary, rng)
+    timed_requests(ctx, request, counter, args.warmup)
+    start = time.perf_counter()
+    sequential = timed_requests(ctx, request, counter, args.requests)
+    sequential_wall = time.perf_counter() - start
+
+    contexts = [Context(app, summary, random.Random(f"{args.seed}:{name}:{i}")) for i in range(args.threads)]
+    per_thread = max(1, args.requests // args.threads)
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        start = time.perf_counter()
+        batches = list(pool.map(lambda c: timed_requests(c, request, counter, per_thread), contexts))
+        concurrent_wall = time.perf_counter() - start
+
+    return {
+        "sequential": summarize(sequential, sequential_wall, ok_statuses),
+        "concurrent": summarize([s for batch in batches for s in batch], concurrent_wall, ok_statuses),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    header = f"{'route':<20}{'mode':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'sql/req':>9}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for route, modes in results.items():
+        for mode, r in modes.items():
+            print(f"{route:<20}{mode:<12}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                  f"{r['throughput_rps']:>9.1f}{r['sql_per_request']:>9.2f}{r['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="an empty database (default: temporary SQLite file)")
+    parser.add_argument("--routes", default=",".join(SCENARIOS), help="comma separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route and mode")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--output", help="write JSON results here")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    routes = [r for r in args.routes.split(",") if r]
+    unknown = set(routes) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    config = config_from_args(args)
+
+    seed_start = time.perf_counter()
+    app, summary = create_seeded_app(database_url, config)
+    seed_seconds = time.perf_counter() - seed_start
+
+    from App import db
+    with app.app_context():
+        counter = SQLCounter(db.engine)
+        dialect = db.engine.dialect.name
+
+    results = {name: bench_route(app, summary, counter, name, args) for name in routes}
+    print_table(results)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dialect": dialect,
+            "seed_seconds": round(seed_seconds, 2),
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "threads": args.threads,
+            "dataset": {k: v for k, v in summary.items() if k != "access"},
+            "config": vars(config),
+        },
+        "routes": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
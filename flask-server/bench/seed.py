@@ -0,0 +1,158 @@
+"""Seed a database with a reproducible synthetic workload.
+
+Every user gets the same password (BENCH_PASSWORD), hashed once, so seeding
+stays fast no matter how many users there are. The same --seed always
+produces the same rows.
+
+    python bench/seed.py --database-url sqlite:////tmp/bench.db --users 200 --tasks-per-list 500
+"""
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import random
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+BENCH_PASSWORD = "bench-password"
+PRIORITIES = ("high", "medium", "low")
+# rows per executemany INSERT
+CHUNK = 5000
+
+
+@dataclass
+class SeedConfig:
+    users: int = 50
+    lists_per_user: int = 3
+    collaborators_per_list: int = 2
+    tasks_per_list: int = 200
+    deleted_ratio: float = 0.2
+    checked_ratio: float = 0.3
+    seed: int = 128
+
+
+def add_arguments(parser):
+    defaults = SeedConfig()
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+
+
+def config_from_args(args):
+    return SeedConfig(**{field: getattr(args, field) for field in asdict(SeedConfig())})
+
+
+def _insert(db, table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(db.insert(table), rows[start:start + CHUNK])
+
+
+def seed(config):
+    """Fill the current app's (empty, migrated) database. Returns a summary dict.
+
+    Needs an app context. The summary lists, per user, the lists they own or
+    share so the benchmark can pick requests that pass the access checks.
+    """
+    from App import db, List, ListCollaborator, Task, User, priority_rank, rebuild_list_stats
+    from hashing import _hash
+    from ranks import rank_sequence
+
+    rng = random.Random(config.seed)
+    password = _hash(BENCH_PASSWORD)
+    now = datetime(2025, 1, 1)
+
+    _insert(db, User.__table__, [
+        {"user_id": u, "name": f"user{u}", "email": f"user{u}@bench.local", "password": password}
+        for u in range(1, config.users + 1)
+    ])
+
+    lists = []
+    for u in range(1, config.users + 1):
+        for n in range(config.lists_per_user):
+            lists.append({"list_id": len(lists) + 1, "list_name": "My List" if n == 0 else f"List {n}",
+                          "owner_id": u, "version": 0})
+    _insert(db, List.__table__, lists)
+
+    collaborators = []
+    others = config.collaborators_per_list and config.users > 1
+    for lst in lists:
+        if not others:
+            break
+        candidates = [u for u in range(1, config.users + 1) if u != lst["owner_id"]]
+        for u in rng.sample(candidates, min(config.collaborators_per_list, len(candidates))):
+            collaborators.append({"list_id": lst["list_id"], "user_id": u})
+    _insert(db, ListCollaborator.__table__, collaborators)
+
+    tasks = []
+    task_id = 0
+    for lst in lists:
+        ranks = rank_sequence()
+        for _ in range(config.tasks_per_list):
+            task_id += 1
+            priority = rng.choice(PRIORITIES)
+            created_at = now - timedelta(minutes=rng.randrange(0, 60 * 24 * 365))
+            deleted = rng.random() < config.deleted_ratio
+            tasks.append({
+                "task_id": task_id,
+                "task_name": f"task {task_id}",
+                "isChecked": rng.random() < config.checked_ratio,
+                "priority": priority,
+                "priority_rank": priority_rank(priority),
+                "deadline": created_at + timedelta(hours=rng.randrange(1, 24 * 60)),
+                "created_at": created_at,
+                "list_id": lst["list_id"],
+                "is_deleted": deleted,
+                "deleted_at": created_at + timedelta(hours=rng.randrange(1, 24 * 30)) if deleted else None,
+                "rank": next(ranks),
+            })
+        if len(tasks) >= CHUNK:
+            _insert(db, Task.__table__, tasks)
+            tasks = []
+    _insert(db, Task.__table__, tasks)
+    db.session.commit()
+    # rows went in around the task helpers, so count them once
+    rebuild_list_stats()
+
+    access = {u: [] for u in range(1, config.users + 1)}
+    for lst in lists:
+        access[lst["owner_id"]].append(lst["list_id"])
+    for row in collaborators:
+        access[row["user_id"]].append(row["list_id"])
+    return {
+        "users": config.users,
+        "lists": len(lists),
+        "collaborators": len(collaborators),
+        "tasks": task_id,
+        "tasks_per_list": config.tasks_per_list,
+        "access": access,
+    }
+
+
+def create_seeded_app(database_url, config):
+    """Migrate a fresh database at database_url, seed it and return (app, summary)."""
+    from App import MIGRATIONS_DIR, create_app
+    from flask_migrate import upgrade
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": database_url})
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+        summary = seed(config)
+    return app, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="an empty database")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    _, summary = create_seeded_app(args.database_url, config_from_args(args))
+    summary.pop("access")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
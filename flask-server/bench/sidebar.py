@@ -0,0 +1,121 @@
+"""Sidebar benchmark: the list membership query and cache for users with hundreds of lists.
+
+Seeds --users users who each own --lists lists and collaborate on others'
+(--collaborators per list), so every sidebar holds several hundred lists.
+Then it times, for random users:
+
+- the query the sidebar used before the cache (outer join, OR and GROUP BY);
+- get_user_lists on a cache miss (the UNION of owned and shared lists);
+- get_user_lists on a cache hit;
+- the home page, once with the sidebar cache emptied before every request
+  and once with it warm.
+
+    python bench/sidebar.py --users 50 --lists 300
+    python bench/sidebar.py --database-url postgresql://... --lists 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from run import SQLCounter, percentile
+from seed import SeedConfig, create_seeded_app
+
+
+def join_query(user_id):
+    """The sidebar query before get_user_lists: one outer join, filtered with OR, grouped back to lists."""
+    from App import List, ListCollaborator, User, db
+
+    return (
+        db.session.query(List.list_id, List.list_name, User.name.label("owner_name"))
+        .join(User, List.owner_id == User.user_id)
+        .outerjoin(ListCollaborator, List.list_id == ListCollaborator.list_id)
+        .filter((List.owner_id == user_id) | (ListCollaborator.user_id == user_id))
+        .group_by(List.list_id, List.list_name, User.name)
+        .order_by(List.list_id.asc())
+        .all()
+    )
+
+
+def timed(n, counter, run, before=None):
+    """(latencies in ms, sorted; SQL statements per call) of n calls of run()."""
+    samples, statements = [], 0
+    for _ in range(n):
+        if before is not None:
+            before()
+        counter.reset()
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+        statements += counter.count
+    return sorted(samples), statements / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="an empty database (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--lists", type=int, default=300, help="lists owned per user")
+    parser.add_argument("--collaborators", type=int, default=2, help="collaborators per list")
+    parser.add_argument("--tasks-per-list", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=128)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    app, summary = create_seeded_app(database_url, SeedConfig(
+        users=args.users, lists_per_user=args.lists, collaborators_per_list=args.collaborators,
+        tasks_per_list=args.tasks_per_list, seed=args.seed))
+
+    from App import db, get_user_lists, sidebar_cache
+
+    rng = random.Random(args.seed)
+    sizes = sorted(len(lists) for lists in summary["access"].values())
+    print(f"{args.users} users with {sizes[0]} to {sizes[-1]} lists in their sidebar (median {sizes[len(sizes) // 2]})")
+    print(f"{'':<28}{'p50 ms':>9}{'p99 ms':>9}{'sql':>6}")
+
+    def report(name, result):
+        samples, statements = result
+        print(f"{name:<28}{percentile(samples, 50):>9.3f}{percentile(samples, 99):>9.3f}{statements:>6.1f}")
+
+    users = list(summary["access"])
+    with app.app_context():
+        counter = SQLCounter(db.engine)
+        # same rows either way
+        user_id = rng.choice(users)
+        assert [tuple(row) for row in join_query(user_id)] == get_user_lists(user_id)
+
+        def sidebar(query):
+            def run():
+                query(rng.choice(users))
+                db.session.remove()
+            return run
+
+        report("join + GROUP BY (before)", timed(args.requests, counter, sidebar(join_query)))
+        report("UNION (cache miss)", timed(args.requests, counter, sidebar(get_user_lists), sidebar_cache.clear))
+        for user_id in users:
+            get_user_lists(user_id)
+        report("cache hit", timed(args.requests, counter, sidebar(get_user_lists)))
+
+    clients = {}
+    for user_id in users:
+        client = clients[user_id] = app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+            session["name"] = f"user{user_id}"
+            session["email"] = f"user{user_id}@bench.local"
+
+    def home():
+        user_id = rng.choice(users)
+        response = clients[user_id].get("/", query_string={"list_id": summary["access"][user_id][0]})
+        assert response.status_code == 200, response.status_code
+
+    for _ in range(20):
+        home()
+    report("home page, sidebar uncached", timed(args.requests, counter, home, sidebar_cache.clear))
+    report("home page, sidebar cached", timed(args.requests, counter, home))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Startup benchmark: cold import, create_app() and first-request latency.
+
+Each run is a fresh interpreter so nothing is warm. Uses DATABASE_URL when
+set, otherwise a throwaway SQLite database migrated before the first run.
+
+    python bench/startup.py --runs 10
+    DATABASE_URL=postgresql://... python bench/startup.py --path /login
+
+Prints one JSON object with the median and min of each phase in milliseconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs inside the child interpreter; prints one JSON line of timings
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import App
+t1 = time.perf_counter()
+app = App.create_app()
+t2 = time.perf_counter()
+client = app.test_client()
+status = client.get(sys.argv[1]).status_code
+t3 = time.perf_counter()
+client.get(sys.argv[1])
+t4 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000,
+                  "first_request_ms": (t3 - t2) * 1000, "second_request_ms": (t4 - t3) * 1000,
+                  "status": status}))
+"""
+
+
+def run_child(path, env):
+    out = subprocess.run([sys.executable, "-c", CHILD, path], cwd=SERVER_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/login", help="URL of the first request")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PASSWORD_HASH_WORKERS="0")
+    if not env.get("DATABASE_URL"):
+        tmp = tempfile.mkdtemp()
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        # the first run migrates the empty database and is not counted
+        run_child(args.path, dict(env, DB_AUTO_UPGRADE="1"))
+
+    runs = [run_child(args.path, env) for _ in range(args.runs)]
+    phases = ("import_ms", "create_app_ms", "first_request_ms", "second_request_ms")
+    report = {
+        "runs": args.runs,
+        "path": args.path,
+        "status": runs[-1]["status"],
+        **{phase: {"median": round(statistics.median(r[phase] for r in runs), 2),
+                   "min": round(min(r[phase] for r in runs), 2)} for phase in phases},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Import/export round trip: rows per second and peak memory.
+
+Writes a synthetic file of --tasks rows, imports it into an empty list through
+/api/lists/<id>/import, streams it back out of /api/lists/<id>/export and
+checks that the row count survived. Runs against a temporary SQLite file
+unless --database-url points at an empty database.
+
+    python bench/transfer.py --tasks 1000000 --format csv
+"""
+from datetime import datetime, timedelta
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from seed import SeedConfig, create_seeded_app
+
+
+def max_rss_mb():
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_upload(path, fmt, tasks, seed):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        if fmt == "csv":
+            writer.writerow(("task_name", "priority", "deadline", "isChecked"))
+        for n in range(tasks):
+            row = (f"imported task {n}", rng.choice(("high", "medium", "low")),
+                   (start + timedelta(minutes=rng.randrange(60 * 24 * 365))).isoformat(), rng.randrange(2))
+            if fmt == "csv":
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(dict(zip(("task_name", "priority", "deadline", "isChecked"), row))) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="an empty database (default: temporary SQLite file)")
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--seed", type=int, default=128)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    app, _ = create_seeded_app(database_url, SeedConfig(users=1, lists_per_user=1, collaborators_per_list=0,
+                                                        tasks_per_list=0, seed=args.seed))
+    from App import TRANSFER_FORMATS
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["name"] = "user1"
+        session["email"] = "user1@bench.local"
+
+    upload = os.path.join(workdir, f"upload.{args.format}")
+    write_upload(upload, args.format, args.tasks, args.seed)
+    size_mb = os.path.getsize(upload) / 2**20
+    print(f"{args.tasks} tasks, {size_mb:.1f} MB {args.format}, rss {max_rss_mb():.0f} MB")
+
+    with open(upload, "rb") as f:
+        start = time.perf_counter()
+        response = client.post(f"/api/lists/1/import?format={args.format}", input_stream=f,
+                               content_type=TRANSFER_FORMATS[args.format], content_length=os.path.getsize(upload))
+        seconds = time.perf_counter() - start
+    result = response.get_json()
+    print(f"import  {seconds:8.2f} s  {result['imported'] / seconds:10.0f} rows/s  "
+          f"rejected {result['rejected']}  peak rss {max_rss_mb():.0f} MB")
+
+    start = time.perf_counter()
+    response = client.get(f"/api/lists/1/export?format={args.format}", buffered=False)
+    lines = sum(chunk.count(b"\n") for chunk in response.response)
+    response.close()
+    seconds = time.perf_counter() - start
+    rows = lines - (1 if args.format == "csv" else 0)
+    print(f"export  {seconds:8.2f} s  {rows / seconds:10.0f} rows/s  peak rss {max_rss_mb():.0f} MB")
+
+    if rows != result["imported"]:
+        print(f"exported {rows} rows, imported {result['imported']}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
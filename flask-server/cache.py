@@ -0,0 +1,100 @@
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe in-process cache with a per-entry TTL and LRU eviction.
+
+    Entries live in this worker only, so every gunicorn worker keeps its own
+    copy. Anything cached here must be safe to serve stale for up to `ttl`
+    seconds in the other workers after it is invalidated in this one.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires <= self.clock():
+                del self._data[key]
+                return default
+            # most recently used entries sit at the end
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SizedLRUCache:
+    """Thread-safe in-process LRU bounded by the memory its values take, not their count.
+
+    For values of very different sizes, such as rendered HTML: `maxbytes` is
+    compared with the sum of sys.getsizeof() of the values, and the least
+    recently used entries go first. A value bigger than `maxbytes` on its own
+    is not stored.
+    """
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.bytes = 0
+        self._data = OrderedDict()  # key -> (size, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        size = sys.getsizeof(value)
+        if size > self.maxbytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[0]
+            self._data[key] = (size, value)
+            self.bytes += size
+            while self.bytes > self.maxbytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,296 @@
+"""Per-list change events for the Server-Sent Events stream.
+
+Mutations queue events on the SQLAlchemy session with `queue_list_event`;
+they are only published once the transaction commits and are dropped on
+rollback. With Postgres the events travel through NOTIFY, so every gunicorn
+worker (each LISTENing on one dedicated connection) hands them to its own
+subscribers. The notification only names the tasks that changed; each
+listener reads them back in one query. Elsewhere, or with
+LIST_EVENTS_BROKER=local, they are handed to subscribers of the current
+process directly.
+
+Besides the per-list subscribers, a process can `watch` every event it
+receives, whatever the list; the reminder scheduler keeps itself up to date
+that way.
+"""
+from sqlalchemy import event as sa_event, text
+import json
+import logging
+import os
+import queue
+import select
+import threading
+
+
+logger = logging.getLogger("dooby.events")
+
+CHANNEL = "dooby_list_events"
+# events buffered per subscriber before the slowest clients start losing them
+SUBSCRIBER_QUEUE_SIZE = 256
+# NOTIFY payloads must stay under 8000 bytes; longer ones are split
+NOTIFY_PAYLOAD_LIMIT = 7000
+_PENDING = "pending_list_events"
+
+
+class Subscription:
+    def __init__(self, broker, list_id):
+        self.broker = broker
+        self.list_id = list_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within timeout seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process pub/sub: subscribers only see events published by this process."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._watchers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, list_id):
+        subscription = Subscription(self, list_id)
+        with self._lock:
+            self._subscribers.setdefault(list_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.list_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.list_id, None)
+
+    def watch(self, callback):
+        """Call callback(event) for every event this process receives, from whichever thread receives it."""
+        with self._lock:
+            self._watchers.append(callback)
+
+    def dispatch(self, event):
+        for callback in self._watchers:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("event watcher failed")
+        self.deliver(event)
+
+    def deliver(self, event):
+        """Hand event to this process' subscribers of its list only."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(event["list_id"], ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                pass  # a stalled client misses events rather than blocking writers
+
+    def before_commit(self, session, events):
+        pass
+
+    def after_commit(self, events):
+        for event in events:
+            self.dispatch(event)
+
+
+def _split_entry(entry):
+    # an entry too long on its own is split by its task ids
+    ids = entry.get("task_ids", ())
+    if len(ids) < 2 or len(json.dumps(entry)) <= NOTIFY_PAYLOAD_LIMIT:
+        return [entry]
+    half = len(ids) // 2
+    return _split_entry(dict(entry, task_ids=ids[:half])) + _split_entry(dict(entry, task_ids=ids[half:]))
+
+
+def compact_events(events):
+    """The events as NOTIFY payloads: task events shrink to their task ids.
+
+    Runs of events of the same type on the same list become one entry, so a
+    batch of 200 toggles is one short list of ids. Other events (collaborators,
+    imports) keep their data, which is a few ids and counts. Payloads are cut
+    at NOTIFY_PAYLOAD_LIMIT bytes.
+    """
+    entries = []
+    for event in events:
+        task_id = event["data"].get("task_id")
+        last = entries[-1] if entries else None
+        if task_id is None:
+            entries.append({"list_id": event["list_id"], "type": event["type"], "data": event["data"]})
+        elif last and "task_ids" in last and (last["list_id"], last["type"]) == (event["list_id"], event["type"]):
+            last["task_ids"].append(task_id)
+        else:
+            entries.append({"list_id": event["list_id"], "type": event["type"], "task_ids": [task_id]})
+
+    payloads, chunk = [], []
+    for entry in entries:
+        for piece in _split_entry(entry):
+            if chunk and len(json.dumps(chunk + [piece])) > NOTIFY_PAYLOAD_LIMIT:
+                payloads.append(json.dumps(chunk))
+                chunk = []
+            chunk.append(piece)
+    if chunk:
+        payloads.append(json.dumps(chunk))
+    return payloads
+
+
+class PostgresBroker(LocalBroker):
+    """Fan-out across processes with LISTEN/NOTIFY.
+
+    NOTIFY is sent inside the committing transaction, so Postgres delivers
+    it only if the commit succeeds. Every process, including the sender, gets
+    it back through its listener, reads the named tasks with
+    load_tasks(task_ids) -> {task_id: task payload} and dispatches the events
+    locally. Subscribers see the tasks as they are when the notification
+    arrives, which is at least as new as the change itself.
+    """
+
+    def __init__(self, engine, load_tasks):
+        super().__init__()
+        self.engine = engine
+        self.load_tasks = load_tasks
+        self._listener = None
+
+    def subscribe(self, list_id):
+        self._ensure_listener()
+        return super().subscribe(list_id)
+
+    def watch(self, callback):
+        self._ensure_listener()
+        super().watch(callback)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="list-events-listener", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        # a dedicated connection taken out of the pool for the life of the process
+        connection = self.engine.raw_connection()
+        connection.detach()
+        dbapi_connection = connection.dbapi_connection
+        dbapi_connection.autocommit = True
+        try:
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while True:
+                if select.select([dbapi_connection], [], [], 30) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                entries = []
+                while dbapi_connection.notifies:
+                    entries.extend(json.loads(dbapi_connection.notifies.pop(0).payload))
+                try:
+                    self._dispatch_entries(entries)
+                except Exception:
+                    logger.exception("dispatching %d notified events failed", len(entries))
+        finally:
+            dbapi_connection.close()
+
+    def _dispatch_entries(self, entries):
+        # one query for every task named by the notifications read together
+        task_ids = {task_id for entry in entries for task_id in entry.get("task_ids", ())}
+        tasks = self.load_tasks(task_ids) if task_ids else {}
+        for entry in entries:
+            if "task_ids" not in entry:
+                self.dispatch(entry)
+                continue
+            for task_id in entry["task_ids"]:
+                data = tasks.get(task_id)
+                if data is None:
+                    if entry["type"] != "task_deleted":
+                        continue  # gone since; its deletion has its own event
+                    data = {"task_id": task_id}
+                self.dispatch({"list_id": entry["list_id"], "type": entry["type"], "data": data})
+
+    def before_commit(self, session, events):
+        # one statement per commit, whatever the number of events
+        session.execute(text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+                        {"channel": CHANNEL, "payloads": compact_events(events)})
+
+    def after_commit(self, events):
+        pass  # delivered through LISTEN
+
+
+def queue_list_event(session, list_id, event_type, **data):
+    """Publish an event for list_id when the session's transaction commits."""
+    session.info.setdefault(_PENDING, []).append(
+        {"list_id": int(list_id), "type": event_type, "data": data}
+    )
+
+
+class ListEvents:
+    def __init__(self):
+        self.broker = None
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app, db, load_tasks):
+        """load_tasks(task_ids) -> {task_id: task payload}, for events that arrive by NOTIFY."""
+        self.app = app
+        self.db = db
+        self.load_tasks = load_tasks
+        if self._listening:
+            # the session listeners are global to db.session; one set serves every app
+            return
+        self._listening = True
+        session_factory = db.session
+
+        @sa_event.listens_for(session_factory, "before_commit")
+        def publish_pending(session):
+            events = session.info.get(_PENDING)
+            if events:
+                self.get_broker().before_commit(session, events)
+
+        @sa_event.listens_for(session_factory, "after_commit")
+        def deliver_pending(session):
+            events = session.info.pop(_PENDING, None)
+            if events:
+                self.get_broker().after_commit(events)
+
+        @sa_event.listens_for(session_factory, "after_rollback")
+        def drop_pending(session):
+            session.info.pop(_PENDING, None)
+
+    def get_broker(self):
+        # picked on first use, when the engine (and its dialect) exists
+        with self._lock:
+            if self.broker is None:
+                engine = self.db.engine
+                mode = os.getenv("LIST_EVENTS_BROKER", "auto").lower()
+                if mode != "local" and engine.dialect.name == "postgresql":
+                    self.broker = PostgresBroker(engine, self._load_tasks)
+                else:
+                    self.broker = LocalBroker()
+            return self.broker
+
+    def _load_tasks(self, task_ids):
+        # runs on the listener thread
+        with self.app.app_context():
+            try:
+                return self.load_tasks(task_ids)
+            finally:
+                self.db.session.remove()
+
+    def subscribe(self, list_id):
+        return self.get_broker().subscribe(list_id)
+
+    def watch(self, callback):
+        self.get_broker().watch(callback)
+
+    def deliver(self, event):
+        self.get_broker().deliver(event)
+
+
+list_events = ListEvents()
@@ -0,0 +1,112 @@
+"""Cache for rendered page fragments.
+
+The task rows on / and the list summaries on /collaboration are rendered
+once per version of what they show and reused after that. Their keys include
+the list versions, which every task and collaborator change bumps. A changed
+list therefore gets a new key and its old entry ages out; nothing is ever
+invalidated by hand. A fragment's key also covers its template source, so a
+deploy that changes the template never serves the old markup.
+
+By default each worker keeps up to FRAGMENT_CACHE_BYTES of fragments in
+memory, least recently used out first; 0 turns the cache off. With
+FRAGMENT_CACHE_URL=redis://... every worker shares one Redis instead (needs
+the redis package). Entries there expire after FRAGMENT_CACHE_TTL seconds and
+Redis' maxmemory policy bounds the total. A Redis that is down only turns
+hits into misses.
+"""
+import hashlib
+import logging
+import time
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+from cache import SizedLRUCache
+from metrics import FRAGMENT_BUILD_SECONDS, FRAGMENT_HITS, FRAGMENT_MISSES, FRAGMENT_SAVED_SECONDS
+
+logger = logging.getLogger("dooby.fragments")
+
+KEY_PREFIX = "dooby:fragment:"
+
+
+class RedisStore:
+    """Fragments shared by every worker through Redis."""
+
+    def __init__(self, url, ttl):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("FRAGMENT_CACHE_URL needs the redis package: pip install redis") from None
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.ttl = ttl
+        self._errors = (redis.RedisError,)
+
+    def get(self, key):
+        try:
+            value = self.client.get(key)
+        except self._errors as e:
+            logger.warning("fragment cache read failed: %s", e)
+            return None
+        return value.decode() if value is not None else None
+
+    def set(self, key, value):
+        try:
+            self.client.set(key, value.encode(), ex=self.ttl)
+        except self._errors as e:
+            logger.warning("fragment cache write failed: %s", e)
+
+
+class FragmentCache:
+    def __init__(self):
+        self.store = None
+        self._digests = {}  # template name -> digest of its source
+        self._misses = {}  # template name -> [build seconds, count]
+
+    def init_app(self, app):
+        if app.config["FRAGMENT_CACHE_URL"]:
+            self.store = RedisStore(app.config["FRAGMENT_CACHE_URL"], app.config["FRAGMENT_CACHE_TTL"])
+        elif app.config["FRAGMENT_CACHE_BYTES"] > 0:
+            self.store = SizedLRUCache(app.config["FRAGMENT_CACHE_BYTES"])
+        else:
+            self.store = None
+
+    def _digest(self, template):
+        digest = self._digests.get(template)
+        if digest is None:
+            env = current_app.jinja_env
+            source = env.loader.get_source(env, template)[0]
+            digest = self._digests[template] = hashlib.sha1(source.encode()).hexdigest()[:12]
+        return digest
+
+    def render(self, template, key, build):
+        """template rendered with the context that build() returns, cached under key.
+
+        key must cover everything the output depends on; build() only runs on
+        a miss, so the queries behind the fragment are skipped on a hit too.
+        """
+        name = template.removeprefix("_").removesuffix(".html")
+        store_key = None
+        if self.store is not None:
+            store_key = KEY_PREFIX + hashlib.sha1(repr((template, self._digest(template), key)).encode()).hexdigest()
+            html = self.store.get(store_key)
+            if html is not None:
+                FRAGMENT_HITS.inc(name)
+                total, count = self._misses.get(name, (0.0, 0))
+                if count:
+                    FRAGMENT_SAVED_SECONDS.inc(name, total / count)
+                return Markup(html)
+
+        start = time.perf_counter()
+        html = render_template(template, **build())
+        elapsed = time.perf_counter() - start
+        FRAGMENT_MISSES.inc(name)
+        FRAGMENT_BUILD_SECONDS.observe(name, elapsed)
+        stats = self._misses.setdefault(name, [0.0, 0])
+        stats[0] += elapsed
+        stats[1] += 1
+        if store_key is not None:
+            self.store.set(store_key, html)
+        return Markup(html)
+
+
+fragment_cache = FragmentCache()
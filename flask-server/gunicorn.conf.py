@@ -0,0 +1,46 @@
+"""gunicorn settings; the Procfile points here.
+
+SSE subscribers sit idle on open connections for minutes, so workers are
+gevent based: one worker process serves many streams as greenlets instead of
+pinning a thread each.
+"""
+import os
+
+
+# Load the app once in the master and fork workers from it: faster boots and
+# shared memory pages. Importing is side-effect free (see create_app), and the
+# engine is disposed after fork in case the master ever connected.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+if preload_app:
+    # the gevent worker patches after fork, too late for modules the master already imported
+    from gevent import monkey
+    monkey.patch_all()
+
+
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+# SSE streams send a keep-alive every 15s; idle keep-alive sockets need less
+keepalive = 5
+timeout = 30
+
+
+def post_fork(server, worker):
+    # psycopg2 waits for Postgres in C; this makes those waits yield to other greenlets
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+    app = server.app.callable if preload_app else None
+    if app is not None:
+        from App import db
+        with app.app_context():
+            for engine in db.engines.values():
+                # drop the master's pooled connections without closing the sockets it still owns
+                engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # open each pool's connections before the first request needs one, and keep
+    # transaction-mode pools alive in the background (see pooling.py)
+    from pooling import start_pool_maintenance
+    start_pool_maintenance(worker.wsgi)
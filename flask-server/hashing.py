@@ -0,0 +1,116 @@
+"""Password hashing off the request thread.
+
+Key derivation is CPU bound, so hashes and verifications run on a small
+process pool shared by all request threads of a worker. The number of jobs
+waiting for the pool is capped; past the cap callers get HashingBusy right
+away instead of piling up behind a login storm.
+
+Under gevent workers the jobs go to gevent's thread pool instead: argon2
+releases the GIL while hashing, and waiting on a real process pool from a
+greenlet would block the whole worker.
+
+New hashes are argon2id. Older werkzeug hashes still verify and are reported
+as needing a rehash so login can upgrade them.
+"""
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import check_password_hash
+import os
+import threading
+
+
+class HashingBusy(Exception):
+    """Too many password hashing jobs are already queued."""
+
+
+_hasher = PasswordHasher()
+
+
+def _hash(password):
+    return _hasher.hash(password)
+
+
+def _verify(stored, password):
+    """Return (matches, needs_rehash) for a stored argon2 or werkzeug hash."""
+    if stored.startswith("$argon2"):
+        try:
+            _hasher.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False, False
+        return True, _hasher.check_needs_rehash(stored)
+    matches = check_password_hash(stored, password)
+    # any legacy hash that matches gets upgraded to argon2
+    return matches, matches
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+class HashingService:
+    def __init__(self, workers, max_pending, timeout):
+        # workers=0 hashes inline, which is handy for the flask shell and scripts
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # created on first use so each gunicorn worker forks its own pool
+        with self._lock:
+            if self._executor is None:
+                if _gevent_patched():
+                    from gevent.threadpool import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    def _run(self, fn, *args):
+        if self.workers == 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_executor(executor)
+            raise
+        # the slot frees when the job finishes, even if this caller timed out
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy()
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise
+
+    def hash(self, password):
+        return self._run(_hash, password)
+
+    def verify(self, stored, password):
+        return self._run(_verify, stored, password)
+
+
+_workers = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+passwords = HashingService(
+    workers=_workers,
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(1, _workers) * 4))),
+    timeout=float(os.getenv("PASSWORD_HASH_TIMEOUT", "10")),
+)
@@ -0,0 +1,39 @@
+"""orjson-backed JSON for Flask.
+
+`jsonify`, `request.get_json` and the task API all go through `app.json`.
+orjson is several times faster than the stdlib encoder and writes bytes
+straight into the response. Without orjson installed Flask's default
+provider is used unchanged.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json without it
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # the default provider accepts int dict keys (list_id -> ...), so keep that working
+    _options = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # indent/sort_keys and friends are stdlib-only options
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        data = orjson.dumps(obj, default=self.default, option=self._options)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+
+def init_json(app):
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
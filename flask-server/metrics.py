@@ -0,0 +1,320 @@
+"""Per-request timing: SQL, templates and pool waits; connection pool health.
+
+Every request collects its query count, time spent in the database, time
+spent rendering templates and time spent waiting for a pooled connection.
+Those numbers go out in a `Server-Timing` header (visible in the browser's
+network tab) and into Prometheus histograms labeled by endpoint, served at
+/metrics. Histograms live in the worker process, so with several gunicorn
+workers each scrape reflects the worker that answered it.
+
+Each connection pool also reports its occupancy (checked out, idle,
+overflow), how long checkouts wait and how many connections it had to open or
+throw away, labeled by pool (primary, replica-0, ...).
+
+Cached page fragments (fragments.py) count their hits and misses, how long
+a miss takes to build and how much build time the hits skipped.
+
+Queries slower than SLOW_QUERY_MS milliseconds are logged with their
+endpoint; unset or 0 turns the log off.
+"""
+from flask import Response, g, has_app_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool, QueuePool
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger("dooby.sql")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+# slow-query log lines keep only the start of long statements
+SLOW_QUERY_MAX_CHARS = 1000
+# who may scrape /metrics when METRICS_TOKEN is unset
+LOOPBACK_ADDRESSES = ("127.0.0.1", "::1")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class RequestMetrics:
+    __slots__ = ("start", "queries", "db_seconds", "template_seconds", "pool_wait_seconds", "_render_starts")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self._render_starts = []
+
+
+def current_metrics():
+    """The RequestMetrics of the running request, or None outside of one."""
+    if not has_app_context():
+        return None
+    return g.get("request_metrics")
+
+
+# ================= PROMETHEUS =================
+
+class Histogram:
+    """Minimal labeled histogram in Prometheus text format."""
+
+    def __init__(self, name, help_text, buckets, label="endpoint"):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}  # label value -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            series = self._series.get(endpoint)
+            if series is None:
+                series = self._series[endpoint] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {endpoint: list(values) for endpoint, values in self._series.items()}
+        for endpoint, values in sorted(series.items()):
+            label = f'{self.label}="{endpoint}"'
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {values[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {values[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label="endpoint"):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, endpoint, amount=1):
+        with self._lock:
+            self._values[endpoint] = self._values.get(endpoint, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for endpoint, value in sorted(values.items()):
+            lines.append(f'{self.name}{{{self.label}="{endpoint}"}} {value}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram("dooby_request_duration_seconds", "Time to build the response.", LATENCY_BUCKETS)
+DB_QUERIES = Histogram("dooby_db_queries_per_request", "SQL statements per request.", COUNT_BUCKETS)
+DB_SECONDS = Histogram("dooby_db_duration_seconds", "Time spent in SQL per request.", LATENCY_BUCKETS)
+TEMPLATE_SECONDS = Histogram("dooby_template_render_seconds", "Template rendering time per request.", LATENCY_BUCKETS)
+POOL_WAIT_SECONDS = Histogram("dooby_pool_checkout_wait_seconds", "Time waiting for a pooled connection per request.",
+                              LATENCY_BUCKETS)
+SLOW_QUERIES = Counter("dooby_slow_queries_total", "Queries slower than SLOW_QUERY_MS.")
+
+
+class PoolGauges:
+    """Connections per state of each registered QueuePool, read from the pool at scrape time."""
+
+    name = "dooby_pool_connections"
+
+    def __init__(self):
+        self.engines = {}  # pool label -> engine
+
+    def render(self):
+        lines = [f"# HELP {self.name} Connections held by the pool, by state.", f"# TYPE {self.name} gauge"]
+        sizes = ["# HELP dooby_pool_size Connections the pool keeps open.", "# TYPE dooby_pool_size gauge"]
+        for pool_name, engine in sorted(self.engines.items()):
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue  # a NullPool holds nothing between checkouts
+            states = {"checked_out": pool.checkedout(), "idle": pool.checkedin(), "overflow": max(0, pool.overflow())}
+            for state, value in states.items():
+                lines.append(f'{self.name}{{pool="{pool_name}",state="{state}"}} {value}')
+            sizes.append(f'dooby_pool_size{{pool="{pool_name}"}} {pool.size()}')
+        return lines + sizes
+
+
+POOL_CONNECTIONS = PoolGauges()
+POOL_CHECKOUT_SECONDS = Histogram("dooby_pool_checkout_seconds", "Time to check out a connection, per pool.",
+                                  LATENCY_BUCKETS, label="pool")
+POOL_CONNECTS = Counter("dooby_pool_connects_total",
+                        "Database connections opened; past warm-up, each one is a reconnect.", label="pool")
+POOL_INVALIDATIONS = Counter("dooby_pool_invalidations_total", "Connections thrown away as broken.", label="pool")
+POOL_LIVENESS_FAILURES = Counter("dooby_pool_liveness_failures_total",
+                                 "Idle connections that failed a background ping.", label="pool")
+
+FRAGMENT_HITS = Counter("dooby_fragment_cache_hits_total", "Fragments served from the cache.", label="fragment")
+FRAGMENT_MISSES = Counter("dooby_fragment_cache_misses_total", "Fragments built and rendered.", label="fragment")
+FRAGMENT_BUILD_SECONDS = Histogram("dooby_fragment_build_seconds", "Queries plus rendering of a fragment on a miss.",
+                                   LATENCY_BUCKETS, label="fragment")
+FRAGMENT_SAVED_SECONDS = Counter("dooby_fragment_saved_seconds_total",
+                                 "Build time skipped by cache hits, at the mean time of a miss.", label="fragment")
+
+REGISTRY = [REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, TEMPLATE_SECONDS, POOL_WAIT_SECONDS, SLOW_QUERIES,
+            POOL_CONNECTIONS, POOL_CHECKOUT_SECONDS, POOL_CONNECTS, POOL_INVALIDATIONS, POOL_LIVENESS_FAILURES,
+            FRAGMENT_HITS, FRAGMENT_MISSES, FRAGMENT_BUILD_SECONDS, FRAGMENT_SAVED_SECONDS]
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _endpoint():
+    return request.endpoint or "unmatched"
+
+
+# ================= SQLALCHEMY HOOKS =================
+
+class _TimedCheckout:
+    # label in the per-pool metrics; set by register_pool
+    metrics_name = "primary"
+
+    # pools have no "before checkout" event, so time _do_get, where callers wait for a connection
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            POOL_CHECKOUT_SECONDS.observe(self.metrics_name, elapsed)
+            metrics = current_metrics()
+            if metrics is not None:
+                metrics.pool_wait_seconds += elapsed
+
+    def recreate(self):
+        # engine.dispose() replaces the pool; the event listeners carry over, the label has to as well
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.db_seconds += elapsed
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        endpoint = _endpoint() if metrics is not None else "-"
+        if metrics is not None:
+            SLOW_QUERIES.inc(endpoint)
+        logger.warning("slow query %.1f ms on %s: %s", elapsed * 1000, endpoint,
+                       " ".join(statement.split())[:SLOW_QUERY_MAX_CHARS])
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute; drop its start time
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+_engine_hooks_installed = False
+
+
+def _install_engine_hooks():
+    # class level: covers every engine, including ones created after this call
+    global _engine_hooks_installed
+    if _engine_hooks_installed:
+        return
+    _engine_hooks_installed = True
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+def register_pool(name, engine):
+    """Report engine's pool in the pool metrics under the label name."""
+    engine.pool.metrics_name = name
+    POOL_CONNECTIONS.engines[name] = engine
+    event.listen(engine, "connect", lambda dbapi_connection, record: POOL_CONNECTS.inc(name))
+    event.listen(engine, "invalidate", lambda dbapi_connection, record, exception: POOL_INVALIDATIONS.inc(name))
+
+
+# ================= FLASK HOOKS =================
+
+def _before_render(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics._render_starts.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None and metrics._render_starts:
+        metrics.template_seconds += time.perf_counter() - metrics._render_starts.pop()
+
+
+def server_timing(metrics, total):
+    return ", ".join([
+        f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"',
+        f"pool;dur={metrics.pool_wait_seconds * 1000:.1f}",
+        f"tpl;dur={metrics.template_seconds * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ])
+
+
+def init_metrics(app):
+    _install_engine_hooks()
+    template_rendered.connect(_rendered, app)
+    before_render_template.connect(_before_render, app)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics = RequestMetrics()
+
+    @app.after_request
+    def record_request_metrics(response):
+        metrics = g.pop("request_metrics", None)
+        if metrics is None:
+            return response
+        total = time.perf_counter() - metrics.start
+        endpoint = _endpoint()
+        REQUEST_SECONDS.observe(endpoint, total)
+        DB_QUERIES.observe(endpoint, metrics.queries)
+        DB_SECONDS.observe(endpoint, metrics.db_seconds)
+        TEMPLATE_SECONDS.observe(endpoint, metrics.template_seconds)
+        POOL_WAIT_SECONDS.observe(endpoint, metrics.pool_wait_seconds)
+        response.headers["Server-Timing"] = server_timing(metrics, total)
+        return response
+
+    token = os.getenv("METRICS_TOKEN")
+
+    @app.route("/metrics")
+    def metrics():
+        # never public: with a token, only scrapers that send it; without one, only this machine
+        if token:
+            if request.headers.get("Authorization") != f"Bearer {token}":
+                return Response(status=401)
+        elif request.remote_addr not in LOOPBACK_ADDRESSES:
+            return Response(status=403)
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
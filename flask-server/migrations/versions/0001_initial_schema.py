@@ -0,0 +1,69 @@
+"""initial schema
+
+Matches the tables previously created by db.create_all(). Databases that
+were created that way should be stamped with this revision before
+upgrading: `flask db stamp 0001_initial_schema`.
+
+Revision ID: 0001_initial_schema
+Revises: 
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_table(
+        'lists',
+        sa.Column('list_id', sa.Integer(), nullable=False),
+        sa.Column('list_name', sa.Text(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('list_id'),
+    )
+    op.create_table(
+        'list_collaborators',
+        sa.Column('list_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['list_id'], ['lists.list_id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('list_id', 'user_id'),
+    )
+    op.create_table(
+        'tasks',
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('task_name', sa.Text(), nullable=False),
+        sa.Column('isChecked', sa.Boolean(), nullable=True),
+        sa.Column('priority', sa.Text(), nullable=False),
+        sa.Column('deadline', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('list_id', sa.Integer(), nullable=True),
+        sa.Column('is_deleted', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['list_id'], ['lists.list_id']),
+        sa.PrimaryKeyConstraint('task_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('tasks')
+    op.drop_table('list_collaborators')
+    op.drop_table('lists')
+    op.drop_table('users')
@@ -0,0 +1,51 @@
+"""priority rank and list view indexes on tasks
+
+Adds tasks.priority_rank (1 = high, 2 = medium, 3 = low) so the priority
+sort is a plain column sort, plus partial composite indexes over live rows
+for each sort mode of get_tasks.
+
+Revision ID: 0002_task_list_indexes
+Revises: 0001_initial_schema
+Create Date: 2026-10-16 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_task_list_indexes'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+LIVE_TASKS_PG = sa.text('is_deleted = false')
+LIVE_TASKS_SQLITE = sa.text('is_deleted = 0')
+
+INDEXES = [
+    ('ix_tasks_list_created_at', ['list_id', 'created_at']),
+    ('ix_tasks_list_deadline', ['list_id', 'deadline']),
+    ('ix_tasks_list_priority_rank', ['list_id', 'priority_rank']),
+]
+
+
+def upgrade():
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.add_column(sa.Column('priority_rank', sa.SmallInteger(), nullable=False, server_default='3'))
+
+    op.execute(
+        "UPDATE tasks SET priority_rank = CASE priority "
+        "WHEN 'high' THEN 1 WHEN 'medium' THEN 2 ELSE 3 END"
+    )
+
+    for name, columns in INDEXES:
+        op.create_index(name, 'tasks', columns,
+                        postgresql_where=LIVE_TASKS_PG, sqlite_where=LIVE_TASKS_SQLITE)
+
+
+def downgrade():
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name='tasks')
+
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('priority_rank')
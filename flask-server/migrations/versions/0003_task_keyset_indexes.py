@@ -0,0 +1,43 @@
+"""add task_id to the list view indexes
+
+Keyset pagination orders by (sort column, task_id), so task_id is appended
+to each partial index to keep every page an ordered index range scan.
+
+Revision ID: 0003_task_keyset_indexes
+Revises: 0002_task_list_indexes
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_task_keyset_indexes'
+down_revision = '0002_task_list_indexes'
+branch_labels = None
+depends_on = None
+
+LIVE_TASKS_PG = sa.text('is_deleted = false')
+LIVE_TASKS_SQLITE = sa.text('is_deleted = 0')
+
+SORT_COLUMNS = {
+    'ix_tasks_list_created_at': 'created_at',
+    'ix_tasks_list_deadline': 'deadline',
+    'ix_tasks_list_priority_rank': 'priority_rank',
+}
+
+
+def _recreate(columns_for):
+    for name, column in SORT_COLUMNS.items():
+        op.drop_index(name, table_name='tasks')
+        op.create_index(name, 'tasks', columns_for(column),
+                        postgresql_where=LIVE_TASKS_PG, sqlite_where=LIVE_TASKS_SQLITE)
+
+
+def upgrade():
+    _recreate(lambda column: ['list_id', column, 'task_id'])
+
+
+def downgrade():
+    _recreate(lambda column: ['list_id', column])
@@ -0,0 +1,29 @@
+"""list version counter
+
+Every task or collaborator change bumps lists.version; the index and
+collaboration pages derive their ETags from it.
+
+Revision ID: 0004_list_version
+Revises: 0003_task_keyset_indexes
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_list_version'
+down_revision = '0003_task_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('lists') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('lists') as batch_op:
+        batch_op.drop_column('version')
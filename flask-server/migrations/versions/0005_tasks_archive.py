@@ -0,0 +1,67 @@
+"""deleted_at and tasks_archive
+
+Soft-deleted tasks get a deleted_at timestamp. `flask compact-tasks` moves
+the ones older than the undo window into tasks_archive, so tasks only holds
+live rows and recent deletions. Rows deleted before this migration count as
+deleted now.
+
+Revision ID: 0005_tasks_archive
+Revises: 0004_list_version
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_tasks_archive'
+down_revision = '0004_list_version'
+branch_labels = None
+depends_on = None
+
+DELETED_TASKS_PG = sa.text('is_deleted = true')
+DELETED_TASKS_SQLITE = sa.text('is_deleted = 1')
+
+
+def upgrade():
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    # the app stores naive UTC, so not the database's CURRENT_TIMESTAMP, which is in the server's time zone
+    op.get_bind().execute(sa.text("UPDATE tasks SET deleted_at = :now WHERE is_deleted").bindparams(
+        sa.bindparam('now', datetime.utcnow(), type_=sa.DateTime())))
+
+    # the compaction scan: only deleted rows, oldest first
+    op.create_index('ix_tasks_deleted_at', 'tasks', ['deleted_at'],
+                    postgresql_where=DELETED_TASKS_PG, sqlite_where=DELETED_TASKS_SQLITE)
+
+    op.create_table(
+        'tasks_archive',
+        sa.Column('task_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('task_name', sa.Text(), nullable=False),
+        sa.Column('isChecked', sa.Boolean(), nullable=True),
+        sa.Column('priority', sa.Text(), nullable=False),
+        sa.Column('priority_rank', sa.SmallInteger(), nullable=False, server_default='3'),
+        sa.Column('deadline', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('list_id', sa.Integer(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['list_id'], ['lists.list_id']),
+        sa.PrimaryKeyConstraint('task_id'),
+    )
+
+
+def downgrade():
+    # archived rows go back to tasks as deleted rows rather than being lost
+    op.execute(
+        'INSERT INTO tasks (task_id, task_name, "isChecked", priority, priority_rank, deadline, created_at, list_id, is_deleted) '
+        'SELECT task_id, task_name, "isChecked", priority, priority_rank, deadline, created_at, list_id, true '
+        'FROM tasks_archive'
+    )
+    op.drop_table('tasks_archive')
+    op.drop_index('ix_tasks_deleted_at', table_name='tasks')
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('deleted_at')
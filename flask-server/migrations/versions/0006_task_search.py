@@ -0,0 +1,68 @@
+"""full-text search over task names
+
+Postgres: a generated tsvector column with a GIN index over live rows.
+SQLite: an external-content FTS5 table kept in sync by triggers.
+Both use plain word tokens without stemming, so prefix search behaves the
+same on either database.
+
+Revision ID: 0006_task_search
+Revises: 0005_tasks_archive
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_task_search'
+down_revision = '0005_tasks_archive'
+branch_labels = None
+depends_on = None
+
+SQLITE_TRIGGERS = {
+    'tasks_fts_ai': """
+        CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts(rowid, task_name) VALUES (new.task_id, new.task_name);
+        END""",
+    'tasks_fts_ad': """
+        CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, task_name) VALUES ('delete', old.task_id, old.task_name);
+        END""",
+    'tasks_fts_au': """
+        CREATE TRIGGER tasks_fts_au AFTER UPDATE OF task_name ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, task_name) VALUES ('delete', old.task_id, old.task_name);
+            INSERT INTO tasks_fts(rowid, task_name) VALUES (new.task_id, new.task_name);
+        END""",
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE tasks ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(task_name, ''))) STORED"
+        )
+        op.execute(
+            "CREATE INDEX ix_tasks_search_vector ON tasks USING gin (search_vector) "
+            "WHERE is_deleted = false"
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE tasks_fts USING fts5("
+            "task_name, content='tasks', content_rowid='task_id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        for sql in SQLITE_TRIGGERS.values():
+            op.execute(sql)
+        op.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_tasks_search_vector")
+        op.execute("ALTER TABLE tasks DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        for name in SQLITE_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS tasks_fts")
@@ -0,0 +1,56 @@
+"""list_stats counters
+
+One row per list with its open, completed, deleted and overdue task counts,
+kept up to date by the task mutations. The rows are filled from tasks here;
+`flask reconcile-list-stats` can rebuild them the same way later.
+
+Revision ID: 0007_list_stats
+Revises: 0006_task_search
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_list_stats'
+down_revision = '0006_task_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'list_stats',
+        sa.Column('list_id', sa.Integer(), nullable=False),
+        sa.Column('open_tasks', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_tasks', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('deleted_tasks', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('overdue_tasks', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('overdue_as_of', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['list_id'], ['lists.list_id']),
+        sa.PrimaryKeyConstraint('list_id'),
+    )
+
+    # deadlines are stored as naive UTC (the app converts the browser's local time), so compare with UTC
+    # rather than the database's CURRENT_TIMESTAMP
+    op.get_bind().execute(sa.text(
+        'INSERT INTO list_stats (list_id, open_tasks, completed_tasks, deleted_tasks, overdue_tasks, overdue_as_of) '
+        'SELECT l.list_id, '
+        'COUNT(t.task_id) FILTER (WHERE t.is_deleted = :false AND COALESCE(t."isChecked", :false) = :false), '
+        'COUNT(t.task_id) FILTER (WHERE t.is_deleted = :false AND t."isChecked" = :true), '
+        'COUNT(t.task_id) FILTER (WHERE t.is_deleted = :true), '
+        'COUNT(t.task_id) FILTER (WHERE t.is_deleted = :false AND COALESCE(t."isChecked", :false) = :false AND t.deadline < :now), '
+        ':now '
+        'FROM lists l LEFT JOIN tasks t ON t.list_id = l.list_id '
+        'GROUP BY l.list_id'
+    ).bindparams(sa.bindparam('now', datetime.utcnow(), type_=sa.DateTime()),
+                 sa.bindparam('true', True, type_=sa.Boolean()),
+                 sa.bindparam('false', False, type_=sa.Boolean())))
+
+
+def downgrade():
+    op.drop_table('list_stats')
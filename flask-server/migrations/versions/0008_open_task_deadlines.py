@@ -0,0 +1,32 @@
+"""index upcoming deadlines of open tasks
+
+The reminder scheduler loads the next window of deadlines across all lists
+with a range scan on deadline. Only open tasks (not deleted, not done) are
+indexed, which is all it ever asks for.
+
+Revision ID: 0008_open_task_deadlines
+Revises: 0007_list_stats
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_open_task_deadlines'
+down_revision = '0007_list_stats'
+branch_labels = None
+depends_on = None
+
+OPEN_TASKS_PG = sa.text('is_deleted = false AND "isChecked" = false')
+OPEN_TASKS_SQLITE = sa.text('is_deleted = 0 AND "isChecked" = 0')
+
+
+def upgrade():
+    op.create_index('ix_tasks_open_deadline', 'tasks', ['deadline', 'task_id'],
+                    postgresql_where=OPEN_TASKS_PG, sqlite_where=OPEN_TASKS_SQLITE)
+
+
+def downgrade():
+    op.drop_index('ix_tasks_open_deadline', table_name='tasks')
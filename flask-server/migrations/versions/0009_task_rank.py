@@ -0,0 +1,71 @@
+"""manual task order
+
+tasks.rank holds a fractional rank (see ranks.py) for the manual sort, which
+a drag and drop changes one row at a time. Existing tasks get ranks in the
+order they were created, per list. Postgres compares ranks byte-wise
+(COLLATE "C"), like Python does.
+
+Revision ID: 0009_task_rank
+Revises: 0008_open_task_deadlines
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_task_rank'
+down_revision = '0008_open_task_deadlines'
+branch_labels = None
+depends_on = None
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+BATCH_SIZE = 5000
+
+
+def integer_rank(n):
+    """The n-th rank counting up from "a0", as ranks.rank_sequence() yields them."""
+    length = 1
+    while n >= len(DIGITS) ** length:
+        n -= len(DIGITS) ** length
+        length += 1
+    digits = ''
+    for _ in range(length):
+        n, digit = divmod(n, len(DIGITS))
+        digits = DIGITS[digit] + digits
+    return chr(ord('a') + length - 1) + digits
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.add_column('tasks', sa.Column('rank', sa.Text().with_variant(sa.Text(collation='C'), 'postgresql'),
+                                     nullable=True))
+
+    tasks = sa.table('tasks', sa.column('task_id', sa.Integer()), sa.column('rank', sa.Text()))
+    update = tasks.update().where(tasks.c.task_id == sa.bindparam('id')).values(rank=sa.bindparam('new_rank'))
+    rows = bind.execution_options(stream_results=True).execute(
+        sa.text('SELECT task_id, list_id FROM tasks ORDER BY list_id, created_at, task_id')
+    )
+    batch = []
+    list_id, position = None, 0
+    for task_id, row_list_id in rows:
+        if row_list_id != list_id:
+            list_id, position = row_list_id, 0
+        batch.append({'id': task_id, 'new_rank': integer_rank(position)})
+        position += 1
+        if len(batch) >= BATCH_SIZE:
+            bind.execute(update, batch)
+            batch = []
+    if batch:
+        bind.execute(update, batch)
+
+    if bind.dialect.name == 'postgresql':
+        # SQLite can only add NOT NULL by copying the table, which would drop the search triggers
+        op.alter_column('tasks', 'rank', nullable=False)
+    op.create_index('ix_tasks_list_rank', 'tasks', ['list_id', 'rank', 'task_id'])
+
+
+def downgrade():
+    op.drop_index('ix_tasks_list_rank', table_name='tasks')
+    op.drop_column('tasks', 'rank')
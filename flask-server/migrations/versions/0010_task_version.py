@@ -0,0 +1,33 @@
+"""task versions
+
+tasks.version counts the changes to a task. An edit carries the version it
+was made from and only applies while that is still current, so concurrent
+edits are detected without holding row locks (see update_task_fields).
+Archived tasks keep theirs, so an undo continues the count.
+
+Revision ID: 0010_task_version
+Revises: 0009_task_rank
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_task_version'
+down_revision = '0009_task_rank'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a constant default fills existing rows without rewriting them (and, on SQLite,
+    # without copying the table, which would drop the search triggers)
+    op.add_column('tasks', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('tasks_archive', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('tasks_archive', 'version')
+    op.drop_column('tasks', 'version')
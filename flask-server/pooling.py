@@ -0,0 +1,157 @@
+"""Connection pool modes, warm-up and background liveness checks.
+
+SQLALCHEMY_POOL_MODE picks how each worker holds its database connections:
+
+- queue (default): a small QueuePool that pings every connection it hands
+  out (pool_pre_ping), so a dropped connection costs one round trip per
+  checkout instead of a failed request.
+- null: a new connection per checkout (NullPool); what SQLALCHEMY_DISABLE_POOL
+  used to mean, and still does.
+- transaction: for a transaction pooler such as pgbouncer or Supavisor in
+  transaction mode. Keeps a QueuePool but drops the per-checkout ping; a
+  background thread pings idle connections every POOL_LIVENESS_SECONDS and
+  reconnects the dead ones, so requests never pay for the check. Server-side
+  prepared statements are turned off, since the pooler may run the next
+  transaction on a different backend that never saw them.
+
+With gunicorn, each worker opens its pool's connections right after it boots
+(see gunicorn.conf.py), before the first request has to wait for a handshake.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import QueuePool
+
+from metrics import POOL_LIVENESS_FAILURES, register_pool
+
+logger = logging.getLogger("dooby.pool")
+
+POOL_MODES = ("queue", "null", "transaction")
+# how often the transaction mode pings idle connections
+POOL_LIVENESS_SECONDS = float(os.getenv("POOL_LIVENESS_SECONDS", "30"))
+
+
+def pool_mode():
+    if os.getenv("SQLALCHEMY_DISABLE_POOL", "0").lower() in ("1", "true", "yes"):
+        return "null"
+    mode = os.getenv("SQLALCHEMY_POOL_MODE", "queue").lower()
+    if mode not in POOL_MODES:
+        raise RuntimeError(f"SQLALCHEMY_POOL_MODE must be one of {', '.join(POOL_MODES)}, not {mode!r}")
+    return mode
+
+
+def no_prepared_statements(url):
+    """connect_args that keep the driver from preparing statements on the server."""
+    # psycopg2 never prepares server side; psycopg 3 does once a statement has run five times
+    if url.startswith("postgresql+psycopg:"):
+        return {"prepare_threshold": None}
+    return {}
+
+
+def warm_pool(engine):
+    """Open the connections a QueuePool hasn't created yet, all at once. Returns how many."""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return 0
+    # overflow() starts at -pool_size and goes up by one per connection created
+    missing = max(0, -pool.overflow())
+    if not missing:
+        return 0
+    # a new pool runs its first connect alone (it initializes the dialect); connects
+    # started while it runs queue up behind it, so let it finish before the rest
+    connections = [pool.connect()]
+    futures = []
+    if missing > 1:
+        with ThreadPoolExecutor(max_workers=missing - 1) as executor:
+            futures = [executor.submit(pool.connect) for _ in range(missing - 1)]
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    connections.extend(f.result() for f in futures if f.exception() is None)
+    # return what did open before reporting a failure, or the pool stays short
+    for connection in connections:
+        connection.close()
+    if errors:
+        raise errors[0]
+    return missing
+
+
+def ping_idle(engine):
+    """Ping each connection idle in the engine's pool; reconnect the ones that fail. Returns how many failed."""
+    failed = 0
+    pool = engine.pool
+    # one at a time, so checkouts running meanwhile only ever miss a single connection;
+    # the pool hands idle connections out oldest first, so each is pinged once
+    for _ in range(pool.checkedin()):
+        if not pool.checkedin():
+            break  # taken by requests meanwhile: in use, so alive, and no new one should open for this
+        with engine.connect() as connection:
+            try:
+                connection.exec_driver_sql("SELECT 1")
+                continue
+            except DBAPIError as e:
+                failed += 1
+                # a disconnect already invalidated it; any other failure leaves it suspect too
+                if not e.connection_invalidated:
+                    connection.invalidate(e)
+                connection.rollback()
+            try:
+                connection.exec_driver_sql("SELECT 1")  # opens a new connection in its place
+            except DBAPIError:
+                pass  # still down; the next checkout tries again
+    return failed
+
+
+class PoolMaintenance:
+    """Per-worker thread: warms every pool, then keeps the unpinged ones alive."""
+
+    def __init__(self, engines, liveness_checks=False):
+        self.engines = engines  # name -> engine
+        # set for the transaction mode, whose pools don't ping on checkout
+        self.liveness_checks = liveness_checks
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="pool-maintenance", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for name, engine in self.engines.items():
+            start = time.perf_counter()
+            try:
+                opened = warm_pool(engine)
+            except DBAPIError as e:
+                logger.warning("warming pool %s failed: %s", name, e)
+                continue
+            if opened:
+                logger.info("pool %s: opened %d connections in %.0f ms", name, opened,
+                            (time.perf_counter() - start) * 1000)
+
+        unpinged = {name: engine for name, engine in self.engines.items()
+                    if self.liveness_checks and isinstance(engine.pool, QueuePool)}
+        while unpinged:
+            time.sleep(POOL_LIVENESS_SECONDS)
+            for name, engine in unpinged.items():
+                failed = ping_idle(engine)
+                if failed:
+                    POOL_LIVENESS_FAILURES.inc(name, failed)
+                    logger.warning("pool %s: reconnected %d dead idle connections", name, failed)
+
+
+def init_pools(app, db):
+    """Label each engine's pool in /metrics and set up its maintenance. Call after db.init_app()."""
+    with app.app_context():
+        engines = {name or "primary": engine for name, engine in db.engines.items()}
+    for name, engine in engines.items():
+        register_pool(name, engine)
+    app.extensions["pool_maintenance"] = PoolMaintenance(engines, liveness_checks=pool_mode() == "transaction")
+
+
+def start_pool_maintenance(app):
+    """Warm the pools and start liveness checks; call once per worker process, after fork."""
+    maintenance = app.extensions.get("pool_maintenance")
+    if maintenance is not None:
+        maintenance.start()
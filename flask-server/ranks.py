@@ -0,0 +1,205 @@
+"""Fractional ranks: the keys behind the manual task order.
+
+Each task carries a rank string, and the manual sort orders by it byte-wise
+(the column is COLLATE "C" on Postgres, so the database agrees with Python).
+There is always room for another rank between any two, so a drag and drop
+rewrites only the moved task's rank: rank_between(the rank above, the rank
+below).
+
+A rank is an integer part followed by an optional fraction, both in base 62
+digits. The integer part's first character encodes its length: "a0" to "az",
+then "b00" and so on, with "Z", "Y", ... going below "a0". Appending a task
+steps the integer part, so a list of a million appended tasks still has
+five-character ranks. Moves between two neighbours extend the fraction
+instead, by about one character per six moves into the same gap. Lists whose
+ranks grow past RANK_REBALANCE_LENGTH are renumbered in the background
+(RankRebalancer) or by `flask rebalance-ranks`.
+"""
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger("dooby.ranks")
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_ZERO = DIGITS[0]
+# the middle of the key space, where the first rank of a list goes
+INTEGER_ZERO = "a" + _ZERO
+# lowest integer part; ranks below it have no integer part to step down to
+SMALLEST_INTEGER = "A" + _ZERO * 26
+# a list is renumbered once one of its ranks is longer than this
+RANK_REBALANCE_LENGTH = int(os.getenv("RANK_REBALANCE_LENGTH", "24"))
+
+
+def _integer_length(head):
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"invalid rank head {head!r}")
+
+
+def _integer_part(rank):
+    length = _integer_length(rank[0])
+    if length > len(rank):
+        raise ValueError(f"invalid rank {rank!r}")
+    return rank[:length]
+
+
+def _split(rank):
+    integer = _integer_part(rank)
+    fraction = rank[len(integer):]
+    if rank == SMALLEST_INTEGER or fraction.endswith(_ZERO):
+        raise ValueError(f"invalid rank {rank!r}")
+    return integer, fraction
+
+
+def _increment(integer):
+    """The next integer part, or None past the largest one."""
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = _ZERO
+    # every digit carried: one more digit, and a head to say so
+    if head == "Z":
+        return INTEGER_ZERO
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(_ZERO)
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _decrement(integer):
+    """The previous integer part, or None below the smallest one."""
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _midpoint(low, high):
+    """A fraction strictly between low and high ("" and None are the open ends)."""
+    if high is not None:
+        # keep the common prefix, then split the first digit that differs
+        n = 0
+        while n < len(high) and (low[n] if n < len(low) else _ZERO) == high[n]:
+            n += 1
+        if n:
+            return high[:n] + _midpoint(low[n:], high[n:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else len(DIGITS)
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit + 1) // 2]
+    # adjacent digits: no room at this position
+    if high is not None and len(high) > 1:
+        return high[:1]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def rank_between(before=None, after=None):
+    """A rank that sorts after `before` and before `after`; None leaves that side open.
+
+    Raises ValueError unless before < after.
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"{before!r} does not sort before {after!r}")
+    if before is None and after is None:
+        return INTEGER_ZERO
+    if before is None:
+        integer, fraction = _split(after)
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint("", fraction)
+        if integer < after:
+            return integer
+        lower = _decrement(integer)
+        if lower is None:
+            raise ValueError("no rank below the smallest one")
+        return lower
+    if after is None:
+        integer, fraction = _split(before)
+        higher = _increment(integer)
+        return integer + _midpoint(fraction, None) if higher is None else higher
+    low_integer, low_fraction = _split(before)
+    high_integer, high_fraction = _split(after)
+    if low_integer == high_integer:
+        return low_integer + _midpoint(low_fraction, high_fraction)
+    higher = _increment(low_integer)
+    if higher is not None and higher < after:
+        return higher
+    return low_integer + _midpoint(low_fraction, None)
+
+
+def rank_sequence(after=None):
+    """Endless short, increasing ranks, all after `after`; for appending many tasks at once."""
+    rank = after
+    while True:
+        rank = rank_between(rank, None)
+        yield rank
+
+
+class RankRebalancer:
+    """Renumbers lists with overlong ranks on a background thread of each worker.
+
+    request() is cheap and returns at once, so a move that produced a long
+    rank never waits for the list to be rewritten.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app, db, rebalance):
+        self.app = app
+        self.db = db
+        self.rebalance = rebalance
+
+    def request(self, list_id):
+        with self._lock:
+            if list_id in self._queued:
+                return
+            self._queued.add(list_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="rank-rebalance", daemon=True)
+                self._thread.start()
+        self._queue.put(list_id)
+
+    def _run(self):
+        while True:
+            list_id = self._queue.get()
+            with self._lock:
+                self._queued.discard(list_id)
+            with self.app.app_context():
+                try:
+                    changed = self.rebalance(list_id)
+                    logger.info("list %s: renumbered %d ranks", list_id, changed)
+                except Exception:
+                    logger.exception("rebalancing list %s failed", list_id)
+                finally:
+                    self.db.session.remove()
+
+
+rank_rebalancer = RankRebalancer()
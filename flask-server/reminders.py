@@ -0,0 +1,249 @@
+"""Deadline reminders: "due soon" notifications on the live list stream.
+
+A task is due soon REMINDER_LEAD_SECONDS before its deadline. Each worker
+runs a ReminderScheduler that only holds the reminders of the next
+REMINDER_WINDOW_SECONDS, in a heap ordered by when they fire. It loads them
+with an index range scan on the open-task deadline index, one window slice at
+a time, and never scans the whole table.
+
+Task changes reach the scheduler as list events (see events.watch), so edits,
+deletes, toggles and undos move, drop or add reminders in place. Before a batch
+goes out, its tasks are checked against the database once more. This catches
+events a worker never saw, for example across a listener reconnect.
+
+Due reminders go out once per tick as one `tasks_due` event per list,
+delivered to the SSE subscribers in this worker. Each browser is connected to
+one worker, so every open page gets each reminder once. A worker starts its
+scheduler with its first subscriber. Reminders whose moment passed before that
+are not sent.
+
+The scheduler itself takes its clock and database access as arguments;
+FakeClock makes it deterministic for benchmarks and tests.
+"""
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import logging
+import os
+import threading
+
+logger = logging.getLogger("dooby.reminders")
+
+REMINDER_LEAD_SECONDS = int(os.getenv("REMINDER_LEAD_SECONDS", "900"))
+# how far ahead each worker keeps reminders in memory
+REMINDER_WINDOW_SECONDS = int(os.getenv("REMINDER_WINDOW_SECONDS", "3600"))
+# longest a worker sleeps between ticks, so clock jumps and missed wakeups heal
+REMINDER_MAX_SLEEP_SECONDS = float(os.getenv("REMINDER_MAX_SLEEP_SECONDS", "60"))
+# events whose data carries the task's state after the change
+_SCHEDULE_EVENTS = ("task_added", "task_edited", "task_toggled", "task_undone")
+
+
+class FakeClock:
+    """A clock that only moves when told to, for deterministic runs."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+        return self.now
+
+
+class Reminder:
+    __slots__ = ("fire_at", "task_id", "list_id", "task_name", "deadline", "cancelled")
+
+    def __init__(self, task_id, list_id, task_name, deadline, lead):
+        self.fire_at = deadline - lead
+        self.task_id = task_id
+        self.list_id = list_id
+        self.task_name = task_name
+        self.deadline = deadline
+        self.cancelled = False
+
+    def payload(self):
+        return {"task_id": self.task_id, "task_name": self.task_name, "deadline": self.deadline.isoformat()}
+
+
+class ReminderScheduler:
+    """The next window of reminders in a heap, kept current by task events.
+
+    load(start, end, list_id=None) returns (task_id, list_id, task_name,
+    deadline) rows of open tasks with start <= deadline < end. verify(reminders)
+    returns the task_ids among them that are still open with that deadline.
+    Thread-safe: events come in from request and listener threads.
+    """
+
+    def __init__(self, load, verify=None, clock=datetime.utcnow,
+                 lead=REMINDER_LEAD_SECONDS, window=REMINDER_WINDOW_SECONDS):
+        self.load = load
+        self.verify = verify
+        self.clock = clock
+        self.lead = timedelta(seconds=lead)
+        self.window = timedelta(seconds=window)
+        self._heap = []  # (fire_at, seq, Reminder); cancelled entries stay until they surface
+        self._pending = {}  # task_id -> its live Reminder
+        self._seq = itertools.count()
+        self._imported = set()  # lists with a bulk import to pick up
+        self._lock = threading.RLock()
+        self.fired_through = None  # reminders firing at or before this have gone out
+        self.loaded_until = None  # every reminder firing before this is in the heap
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        with self._lock:
+            now = self.loaded_until = self.clock()
+            # nothing has gone out yet, not even a reminder due right now
+            self.fired_through = now - timedelta(microseconds=1)
+            self._extend(now)
+
+    def _extend(self, now):
+        # load the slice of the window that came into view since the last tick
+        until = now + self.window
+        if until <= self.loaded_until:
+            return
+        for row in self.load(self.loaded_until + self.lead, until + self.lead):
+            self._push(*row)
+        self.loaded_until = until
+
+    def _push(self, task_id, list_id, task_name, deadline):
+        self.cancel(task_id)
+        reminder = Reminder(task_id, list_id, task_name, deadline, self.lead)
+        self._pending[task_id] = reminder
+        heapq.heappush(self._heap, (reminder.fire_at, next(self._seq), reminder))
+
+    def cancel(self, task_id):
+        with self._lock:
+            reminder = self._pending.pop(task_id, None)
+            if reminder is not None:
+                reminder.cancelled = True
+
+    def schedule(self, task_id, list_id, task_name, deadline, done=False):
+        """Task changed: drop its reminder and add the new one if it falls in the loaded window."""
+        with self._lock:
+            self.cancel(task_id)
+            if done or deadline is None or self.loaded_until is None:
+                return
+            fire_at = deadline - self.lead
+            # later than the window: the range scan picks it up when the window gets there
+            if self.fired_through < fire_at < self.loaded_until:
+                self._push(task_id, list_id, task_name, deadline)
+
+    def on_event(self, event):
+        """Keep the heap in step with a list event (events.watch callback)."""
+        kind, data = event["type"], event["data"]
+        if kind == "task_deleted":
+            self.cancel(data["task_id"])
+        elif kind in _SCHEDULE_EVENTS:
+            deadline = data.get("deadline")
+            self.schedule(data["task_id"], event["list_id"], data.get("task_name"),
+                          datetime.fromisoformat(deadline) if deadline else None, done=bool(data.get("isChecked")))
+        elif kind == "tasks_imported":
+            # events can arrive inside a commit, where no SQL may run: load on the next tick
+            with self._lock:
+                self._imported.add(event["list_id"])
+
+    def next_fire(self):
+        """When the earliest pending reminder fires (None if there is none)."""
+        with self._lock:
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def due(self, now=None):
+        """Pop every reminder due by now; returns {list_id: [Reminder, ...]} with verified tasks only."""
+        with self._lock:
+            now = now or self.clock()
+            while self._imported:
+                # the imported rows that land in the loaded window; later ones come with the range scan
+                for row in self.load(self.fired_through + self.lead, self.loaded_until + self.lead,
+                                     list_id=self._imported.pop()):
+                    self.schedule(*row)
+            fired = []
+            while self._heap and self._heap[0][0] <= now:
+                _, _, reminder = heapq.heappop(self._heap)
+                if not reminder.cancelled:
+                    del self._pending[reminder.task_id]
+                    fired.append(reminder)
+            self.fired_through = max(self.fired_through, now)
+            self._extend(now)
+        if fired and self.verify is not None:
+            still_open = self.verify(fired)
+            fired = [r for r in fired if r.task_id in still_open]
+        batches = {}
+        for reminder in fired:
+            batches.setdefault(reminder.list_id, []).append(reminder)
+        return batches
+
+
+class ReminderService:
+    """Runs a ReminderScheduler on a background thread of each worker."""
+
+    def __init__(self):
+        self.app = None
+        self.scheduler = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._watching = False
+
+    def init_app(self, app, db, load, verify):
+        self.app = app
+        self.db = db
+        self.load = load
+        self.verify = verify
+
+    def start(self):
+        """Start this worker's scheduler if it isn't running; cheap to call on every subscribe."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+                self._thread.start()
+
+    def _on_event(self, event):
+        if self.scheduler is not None:
+            self.scheduler.on_event(event)
+            # a reminder may now be due sooner than the thread planned to wake
+            self._wake.set()
+
+    def _run(self):
+        from events import list_events
+
+        with self.app.app_context():
+            # watch before the first scan, so a change committed while it runs isn't lost
+            self.scheduler = ReminderScheduler(self.load, self.verify)
+            if not self._watching:
+                list_events.watch(self._on_event)
+                self._watching = True
+            try:
+                self.scheduler.start()
+            finally:
+                self.db.session.remove()
+            while True:
+                try:
+                    for list_id, reminders in self.scheduler.due().items():
+                        list_events.deliver({"list_id": list_id, "type": "tasks_due",
+                                             "data": {"tasks": [r.payload() for r in reminders]}})
+                except Exception:
+                    logger.exception("reminder tick failed")
+                finally:
+                    # don't hold a pooled connection while asleep
+                    self.db.session.remove()
+                self._sleep()
+
+    def _sleep(self):
+        next_fire = self.scheduler.next_fire()
+        wait = REMINDER_MAX_SLEEP_SECONDS
+        if next_fire is not None:
+            wait = min(wait, max(0.0, (next_fire - self.scheduler.clock()).total_seconds()))
+        self._wake.wait(wait)
+        self._wake.clear()
+
+
+reminder_service = ReminderService()
@@ -0,0 +1,185 @@
+"""Read replicas for read-only views.
+
+DATABASE_REPLICA_URLS (comma separated) adds one engine per replica, as
+Flask-SQLAlchemy binds named replica-0, replica-1, ... Views decorated with
+@replica_reads send their plain SELECTs on GET/HEAD requests to a replica
+picked round robin. Writes, SELECT ... FOR UPDATE, raw text statements and
+anything after the request's first write still go to the primary.
+
+Read-your-writes: a request that wrote keeps that browser session on the
+primary for REPLICA_STICKY_SECONDS.
+
+A replica that hits a connection error, or lags more than
+REPLICA_MAX_LAG_SECONDS at its periodic check, is skipped for
+REPLICA_RETRY_SECONDS. If a view fails because its replica went away, it runs
+again on the primary. Reads are side-effect free, so that is safe.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import itertools
+import os
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+# how often each worker asks a replica how far behind it is
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "10"))
+
+# 0 when the replica has replayed everything it received; NULL on a primary
+PG_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_urls(value):
+    """Parse a comma separated DATABASE_REPLICA_URLS value."""
+    return [url.strip() for url in (value or "").split(",") if url.strip()]
+
+
+class Replica:
+    __slots__ = ("name", "engine", "down_until", "checked_at")
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.down_until = 0.0
+        self.checked_at = 0.0
+
+
+class ReplicaRouter:
+    def __init__(self, db, names):
+        self.db = db
+        self.names = names
+        self.replicas = None
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # engines only exist inside an app context, so build the list on first use
+        with self._lock:
+            if self.replicas is None:
+                replicas = [Replica(name, self.db.engines[name]) for name in self.names]
+                for replica in replicas:
+                    event.listen(replica.engine, "handle_error", self._on_error(replica))
+                self.replicas = replicas
+        return self.replicas
+
+    def _on_error(self, replica):
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                self.mark_down(replica)
+        return handle_error
+
+    def mark_down(self, replica):
+        if replica.down_until < time.monotonic():
+            current_app.logger.warning("replica %s unavailable, reading from the primary for %.0f s",
+                                       replica.name, REPLICA_RETRY_SECONDS)
+        replica.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+
+    def _healthy(self, replica, now):
+        if replica.down_until > now:
+            return False
+        if now - replica.checked_at < REPLICA_CHECK_SECONDS:
+            return True
+        replica.checked_at = now
+        try:
+            with replica.engine.connect() as connection:
+                lag = connection.execute(PG_LAG_SQL).scalar() if connection.dialect.name == "postgresql" else 0
+        except DBAPIError:
+            # handle_error has marked it down
+            return False
+        if lag is not None and lag > REPLICA_MAX_LAG_SECONDS:
+            current_app.logger.warning("replica %s is %.1f s behind, skipping it", replica.name, lag)
+            replica.down_until = now + REPLICA_CHECK_SECONDS
+            return False
+        return True
+
+    def choose(self):
+        """The next healthy replica in turn, or None to use the primary."""
+        replicas = self.replicas if self.replicas is not None else self._load()
+        now = time.monotonic()
+        start = next(self._turn)
+        for i in range(len(replicas)):
+            replica = replicas[(start + i) % len(replicas)]
+            if self._healthy(replica, now):
+                return replica
+        return None
+
+
+class RoutingSession(Session):
+    """db.session that sends the plain reads of @replica_reads views to g.db_replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.db_wrote = True
+            elif isinstance(clause, Select) and clause._for_update_arg is None and not g.get("db_wrote"):
+                replica = g.get("db_replica")
+                if replica is not None:
+                    return replica.engine
+            # anything else (text, session.connection(), locking reads) stays on the primary
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, e.g. for results that get cached."""
+    replica = g.pop("db_replica", None) if has_app_context() else None
+    try:
+        yield
+    finally:
+        if replica is not None:
+            g.db_replica = replica
+
+
+def replica_reads(view):
+    """Let a read-only view's queries run on a replica on GET/HEAD requests."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        router = current_app.extensions.get("replicas")
+        if router is None or request.method not in ("GET", "HEAD") \
+                or session.get("primary_until", 0) > time.time():
+            return view(*args, **kwargs)
+        replica = router.choose()
+        if replica is None:
+            return view(*args, **kwargs)
+        g.db_replica = replica
+        try:
+            return view(*args, **kwargs)
+        except DBAPIError:
+            if replica.down_until <= time.monotonic():
+                raise
+            # the replica went away mid-request: answer from the primary instead
+            g.pop("db_replica", None)
+            router.db.session.rollback()
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def init_replicas(app, db, urls):
+    """Add a bind per replica URL and route @replica_reads views to them. Call before db.init_app()."""
+    if not urls:
+        return
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    names = []
+    for i, url in enumerate(urls):
+        names.append(f"replica-{i}")
+        binds[names[-1]] = {"url": url, **app.config["SQLALCHEMY_ENGINE_OPTIONS"]}
+    app.extensions["replicas"] = ReplicaRouter(db, names)
+
+    @app.after_request
+    def stick_to_primary(response):
+        # the writer reads its own writes: keep them on the primary for a while
+        if g.get("db_wrote"):
+            session["primary_until"] = time.time() + REPLICA_STICKY_SECONDS
+        return response
@@ -0,0 +1,56 @@
+"""Schema version check against the Alembic migrations.
+
+The app no longer creates tables at import. Instead the first request
+compares the database's alembic_version with the head revision in
+migrations/ and refuses to serve a schema that is behind (or ahead, after a
+rollback of the code). With DB_AUTO_UPGRADE=1 it runs the pending migrations
+instead, which is handy for local SQLite databases.
+"""
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask_migrate import upgrade
+import os
+import threading
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def head_revision(directory):
+    config = Config()
+    config.set_main_option("script_location", directory)
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def current_revision(engine):
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def init_schema_check(app, db, directory):
+    """Check the schema once per process, on the first request that reaches the app."""
+    auto_upgrade = os.getenv("DB_AUTO_UPGRADE", "0").lower() in ("1", "true", "yes")
+    lock = threading.Lock()
+    checked = False
+
+    @app.before_request
+    def check_schema():
+        nonlocal checked
+        if checked:
+            return
+        with lock:
+            if checked:
+                return
+            head = head_revision(directory)
+            current = current_revision(db.engine)
+            if current != head:
+                if not auto_upgrade:
+                    raise SchemaOutOfDate(
+                        f"database schema is at {current or 'no revision'}, code expects {head}; "
+                        "run `flask --app App db upgrade` or set DB_AUTO_UPGRADE=1"
+                    )
+                app.logger.info("Upgrading database schema from %s to %s", current, head)
+                upgrade(directory=directory)
+            checked = True
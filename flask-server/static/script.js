@@ -3,12 +3,10 @@ document.addEventListener("DOMContentLoaded", () => {
     const closeTaskPopup = document.getElementById('close-add-btn');
     const addTaskPopup = document.getElementById('add-task-popup');
 
-    const openEditPopup = document.querySelectorAll('.edit-btn');
     const closeEditPopup = document.getElementById('close-edit-btn');
     const editTaskPopup = document.getElementById('edit-task-popup');
     const editForm = document.getElementById("edit-task-form");
 
-    const deleteBtn = document.querySelectorAll(".delete-btn");
     const confirmPopup = document.getElementById('confirm-delete-popup');
     const confirmDelBtn = document.querySelectorAll('.confirm-delete-btn');
     const cancelDelBtn = document.querySelectorAll('.cancel-delete-btn');
@@ -51,43 +49,102 @@ document.addEventListener("DOMContentLoaded", () => {
     const taskInput = document.getElementById("edit-task");
     const priorityInput = document.getElementById("edit-priority");
     const deadlineInput = document.getElementById("edit-deadline");
+    const versionInput = document.getElementById("edit-version");
+    const baseInputs = {task_name: document.getElementById("edit-base-task"),
+                        priority: document.getElementById("edit-base-priority"),
+                        deadline: document.getElementById("edit-base-deadline")};
 
-    if (openEditPopup && taskInput && priorityInput && deadlineInput && editForm && editTaskPopup) {
-        openEditPopup.forEach(button => {
-            button.addEventListener("click", () => {
-                // retrieve details
-                const task_id = button.dataset.taskid;
-                const task_name = button.dataset.taskname;
-                const priority = button.dataset.priority;
-                const deadline = button.dataset.deadline;
-
-                // display details
-                taskInput.value = task_name;
-                priorityInput.value = priority;
-                deadlineInput.value = deadline;
-
-                editForm.action = `/update_task/${task_id}`;
-                editTaskPopup.classList.add("active");
-            });
+    // remember the version and values an edit starts from; the server merges other edits made since
+    function setEditBase(version, task_name, priority, deadline){
+        versionInput.value = version;
+        baseInputs.task_name.value = task_name;
+        baseInputs.priority.value = priority;
+        baseInputs.deadline.value = deadline;
+    }
+
+    // delegated, so rows added by live updates work too
+    const tasksList = document.querySelector(".tasks-list");
+
+    if (tasksList && taskInput && priorityInput && deadlineInput && editForm && editTaskPopup) {
+        tasksList.addEventListener("click", (e) => {
+            const button = e.target.closest(".edit-btn");
+            if (!button) return;
+
+            // retrieve details
+            const task_id = button.dataset.taskid;
+            const task_name = button.dataset.taskname;
+            const priority = button.dataset.priority;
+            const deadline = button.dataset.deadline;
+
+            // display details
+            taskInput.value = task_name;
+            priorityInput.value = priority;
+            deadlineInput.value = localInputValue(deadline);
+            setEditBase(button.dataset.version, task_name, priority, deadline);
+
+            editForm.action = `/update_task/${task_id}`;
+            editTaskPopup.classList.add("active");
         });
 
         closeEditPopup.addEventListener("click", () => editTaskPopup.classList.remove("active"));
+
+        editForm.addEventListener("submit", (e) => {
+            const task_id = editForm.action.split("/").pop();
+            setUtcOffset(editForm, deadlineInput.value);
+            const fields = {task_name: taskInput.value, priority: priorityInput.value,
+                            deadline: utcTimestamp(deadlineInput.value)};
+            if (versionInput.value !== "") {
+                fields.version = Number(versionInput.value);
+                fields.base = Object.fromEntries(Object.entries(baseInputs).map(([name, input]) => [name, input.value]));
+            }
+            submitInPlace(e, editForm, taskApiUrl(task_id), "PATCH", fields, task => {
+                const li = taskRow(task.task_id);
+                if (li) updateTaskRow(li, task);
+                editTaskPopup.classList.remove("active");
+            }, data => {
+                // someone changed the same fields: show theirs, keep ours in the form, and let a second save win
+                const li = taskRow(data.task.task_id);
+                if (li) updateTaskRow(li, data.task);
+                setEditBase(data.task.version, data.task.task_name, data.task.priority, data.task.deadline);
+                // no fields named when the task kept changing until the server gave up merging
+                const changed = data.conflicts && data.conflicts.length ? `the ${data.conflicts.join(", ")}` : "this task";
+                showToast(`Someone else changed ${changed} meanwhile. Save again to overwrite.`);
+            });
+        });
+    }
+
+    // === add task in place ===
+    const addForm = document.getElementById("add-task-form");
+    if (addForm && tasksList && addTaskPopup) {
+        addForm.addEventListener("submit", (e) => {
+            setUtcOffset(addForm, addForm.elements.deadline.value);
+            const fields = Object.fromEntries(new FormData(addForm));
+            fields.deadline = utcTimestamp(fields.deadline);
+            delete fields.utc_offset;
+            submitInPlace(e, addForm, taskApiUrl(), "POST", fields, task => {
+                if (tasksList.dataset.live === "true") insertTaskRow(tasksList, task);
+                addForm.reset();
+                addTaskPopup.classList.remove("active");
+                showToast("Task added successfully!");
+            });
+        });
     }
 
     // === delete confirmation ===
     let targetUrl = "";
-    if (deleteBtn && confirmPopup && confirmDelBtn && cancelDelBtn) {
-        deleteBtn.forEach(button => {
-            button.addEventListener("click", (e) => {
-                e.preventDefault();
-                targetUrl = `/delete_task/${button.dataset.taskid}`;
-                confirmPopup.classList.add("active");
-            });
+    if (tasksList && confirmPopup && confirmDelBtn && cancelDelBtn) {
+        tasksList.addEventListener("click", (e) => {
+            const button = e.target.closest(".delete-btn");
+            if (!button) return;
+            e.preventDefault();
+            targetUrl = `/delete_task/${button.dataset.taskid}`;
+            confirmPopup.classList.add("active");
         });
 
         confirmDelBtn.forEach(button => {
             button.addEventListener("click", () => {
-                window.location.href = targetUrl;
+                confirmPopup.classList.remove("active");
+                deleteTask(targetUrl);
             });
         });
 
@@ -97,12 +154,364 @@ document.addEventListener("DOMContentLoaded", () => {
     }
 });
 
+// === batched task changes ===
+// rapid checkbox clicks are coalesced and sent to /tasks/batch in one request
+const BATCH_DELAY_MS = 400;
+const pendingToggles = new Map();
+let batchTimer = null;
+
+function sendBatch(operations, keepalive = false){
+    return fetch("/tasks/batch", {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify(operations),
+        keepalive: keepalive
+    });
+}
+
+function flushToggles(keepalive = false){
+    clearTimeout(batchTimer);
+    batchTimer = null;
+    if (pendingToggles.size === 0) return;
+
+    const operations = [];
+    pendingToggles.forEach((isChecked, task_id) => {
+        operations.push({op: "toggle", task_id: Number(task_id), isChecked: isChecked});
+    });
+    pendingToggles.clear();
+    sendToggles(operations, keepalive);
+}
+
+// a batch is all or nothing: one task deleted by a collaborator fails the rest with a 404,
+// so those go again one by one and only the ones that still fail are undone on the page
+function sendToggles(operations, keepalive = false){
+    sendBatch(operations, keepalive).then(response => {
+        if (response.ok) return;
+        if (response.status === 404 && operations.length > 1) {
+            operations.forEach(operation => sendToggles([operation], keepalive));
+        } else if (response.status === 404) {
+            revertToggles(operations, "That task was deleted by someone else.");
+        } else {
+            revertToggles(operations, "Couldn't save your change. Please try again.");
+        }
+    }).catch(() => revertToggles(operations, "Couldn't save your change. Please try again."));
+}
+
+function revertToggles(operations, message){
+    operations.forEach(operation => {
+        // a newer click on the same task is still queued; that one decides
+        if (pendingToggles.has(String(operation.task_id))) return;
+        const li = taskRow(operation.task_id);
+        if (li) li.querySelector(".checkbox").checked = operation.isChecked !== 1;
+    });
+    showToast(message);
+}
+
 // === toggle task ===
 function toggleTask(task_id, checked){
-    const isChecked = checked ? 1 : 0;
-    fetch(`/toggle_task/${task_id}`, {
-        method: "POST",
-        headers: {"Content-Type": "application/x-www-form-urlencoded"},
-        body: `isChecked=${isChecked}`
+    // later clicks on the same task overwrite earlier ones
+    pendingToggles.set(task_id, checked ? 1 : 0);
+    clearTimeout(batchTimer);
+    batchTimer = setTimeout(flushToggles, BATCH_DELAY_MS);
+}
+
+// don't lose queued toggles when the user navigates away
+window.addEventListener("pagehide", () => flushToggles(true));
+
+// === clear completed tasks ===
+function clearCompleted(){
+    const checked = document.querySelectorAll(".tasks-list .checkbox:checked");
+    if (checked.length === 0) return;
+
+    flushToggles();
+    const operations = Array.from(checked, box => ({op: "delete", task_id: Number(box.dataset.taskid)}));
+    sendBatch(operations).then(() => window.location.reload());
+}
+
+// === live updates ===
+// changes made by collaborators arrive over /lists/<id>/events and are patched into the page
+function taskRow(task_id){
+    return document.querySelector(`.tasks-list li[data-taskid="${task_id}"]`);
+}
+
+// the server keeps every time in UTC; the page shows and edits them in the browser's time zone
+function parseServerTime(value){
+    // naive server timestamps are UTC; Date takes at most milliseconds
+    const iso = value.replace(" ", "T").replace(/(\.\d{3})\d+/, "$1");
+    return new Date(/(Z|[+-]\d\d:\d\d)$/.test(iso) ? iso : iso + "Z");
+}
+
+function formatTimestamp(value){
+    // "YYYY-MM-DD HH:MM:SS" in local time
+    if (!value) return "";
+    const time = parseServerTime(value);
+    if (isNaN(time)) return value;
+    const pad = n => String(n).padStart(2, "0");
+    return `${time.getFullYear()}-${pad(time.getMonth() + 1)}-${pad(time.getDate())} ` +
+           `${pad(time.getHours())}:${pad(time.getMinutes())}:${pad(time.getSeconds())}`;
+}
+
+function localInputValue(value){
+    // for <input type="datetime-local">
+    return formatTimestamp(value).replace(" ", "T");
+}
+
+function utcTimestamp(localValue){
+    // a datetime-local value (browser time) for the JSON API
+    const time = new Date(localValue);
+    return localValue && !isNaN(time) ? time.toISOString() : localValue;
+}
+
+function setUtcOffset(form, localValue){
+    // for the plain form post: the offset in effect on that date, so DST is right too
+    const time = new Date(localValue);
+    form.elements.utc_offset.value = localValue && !isNaN(time) ? -time.getTimezoneOffset() : "";
+}
+
+function localizeTimes(root){
+    root.querySelectorAll("time[datetime]").forEach(time => { time.textContent = formatTimestamp(time.dateTime); });
+}
+
+function renderTaskRow(task){
+    const li = document.createElement("li");
+    li.className = task.priority;
+    li.dataset.taskid = task.task_id;
+    li.innerHTML = `
+        <div class="task-item">
+            <div class="task-box-list">
+                <input type="checkbox" class="checkbox" onchange="toggleTask(this.dataset.taskid, this.checked)">
+                <p></p><br>
+            </div>
+            <span></span>
+        </div>
+        <div class="update-btns">
+            <button class="btn edit-btn">Edit</button>
+            <button class="btn delete-btn">Delete</button>
+        </div>`;
+    li.querySelector(".checkbox").dataset.taskid = task.task_id;
+    li.querySelector(".delete-btn").dataset.taskid = task.task_id;
+    li.querySelector(".edit-btn").dataset.taskid = task.task_id;
+    updateTaskRow(li, task);
+    return li;
+}
+
+function updateTaskRow(li, task){
+    const deadline = formatTimestamp(task.deadline);
+    if (task.rank !== undefined) li.dataset.rank = task.rank;
+    const box = li.querySelector(".checkbox");
+    // a click still waiting in the batch wins over what the server last saw
+    if (task.isChecked !== undefined && !pendingToggles.has(String(task.task_id))) {
+        box.checked = task.isChecked === 1;
+    }
+    if (task.task_name === undefined) return;
+
+    li.className = task.priority;
+    li.querySelector(".task-box-list p").textContent = " " + task.task_name;
+    const details = li.querySelector(".task-item > span");
+    // kept in UTC like the server sends it
+    if (task.created_at) details.dataset.created = task.created_at;
+    details.innerHTML = "";
+    details.append(`Priority: ${task.priority}`, document.createElement("br"),
+                   `Deadline: ${deadline}`, document.createElement("br"),
+                   `Created at: ${formatTimestamp(details.dataset.created || "")}`);
+    const edit = li.querySelector(".edit-btn");
+    edit.dataset.taskname = task.task_name;
+    edit.dataset.priority = task.priority;
+    edit.dataset.deadline = task.deadline;
+    if (task.version !== undefined) edit.dataset.version = task.version;
+}
+
+function rowNodes(li){
+    // each row is followed by <br><hr><br> separators
+    const nodes = [li];
+    let next = li.nextElementSibling;
+    while (next && next.tagName !== "LI") {
+        nodes.push(next);
+        next = next.nextElementSibling;
+    }
+    return nodes;
+}
+
+function removeTaskRow(li){
+    rowNodes(li).forEach(node => node.remove());
+}
+
+// in manual order a row goes above the first row with a higher rank; one that sorts
+// before this page's first row or after the last row of a page with more belongs elsewhere
+function placeTaskRow(list, nodes){
+    const rows = Array.from(list.querySelectorAll(":scope > li")).filter(other => other !== nodes[0]);
+    const next = rows.find(other => other.dataset.rank > nodes[0].dataset.rank);
+    const earlierPage = list.dataset.live !== "true" && rows.length > 0 && next === rows[0];
+    const laterPage = !next && list.dataset.more === "true";
+    if (earlierPage || laterPage) nodes.forEach(node => node.remove());
+    else if (next) next.before(...nodes);
+    else list.append(...nodes);
+}
+
+function insertTaskRow(list, task){
+    if (taskRow(task.task_id)) return;
+    // the empty-list message goes once there is something to show
+    list.querySelectorAll(":scope > p, :scope > br").forEach(node => node.remove());
+    const separator = [document.createElement("br"), document.createElement("hr"), document.createElement("br")];
+    separator[1].className = "horizontal";
+    const li = renderTaskRow(task);
+    if (list.dataset.sort === "manual") {
+        li.draggable = true;
+        placeTaskRow(list, [li, ...separator]);
+    } else {
+        list.prepend(li, ...separator);
+    }
+}
+
+function subscribeToList(list){
+    const source = new EventSource(`/lists/${list.dataset.listid}/events`);
+    const patch = (type, handler) => source.addEventListener(type, e => handler(JSON.parse(e.data)));
+
+    patch("task_toggled", task => { const li = taskRow(task.task_id); if (li) updateTaskRow(li, task); });
+    patch("task_edited", task => { const li = taskRow(task.task_id); if (li) updateTaskRow(li, task); });
+    patch("task_deleted", task => { const li = taskRow(task.task_id); if (li) removeTaskRow(li); });
+    // new rows only make sense on the first page; later pages pick them up on navigation
+    if (list.dataset.live === "true") {
+        patch("task_added", task => insertTaskRow(list, task));
+        patch("task_undone", task => insertTaskRow(list, task));
+        // a bulk import can be thousands of rows; load the first page again instead
+        patch("tasks_imported", () => window.location.reload());
+    }
+    if (list.dataset.sort === "manual") {
+        // a row dragged elsewhere; one moved in from another page shows up on navigation
+        patch("task_moved", task => {
+            const li = taskRow(task.task_id);
+            if (!li) return;
+            li.dataset.rank = task.rank;
+            placeTaskRow(list, rowNodes(li));
+        });
+        // the list was renumbered, so the ranks on this page are stale
+        patch("tasks_reranked", () => window.location.reload());
+    }
+    // deadline reminders arrive batched per list, one toast per batch
+    patch("tasks_due", batch => {
+        const names = batch.tasks.map(task => task.task_name);
+        showToast(names.length === 1 ? `Due soon: ${names[0]}`
+            : `${names.length} tasks due soon: ${names.slice(0, 3).join(", ")}${names.length > 3 ? ", ..." : ""}`);
     });
+    // this user was removed from the list; the server re-renders with their own lists
+    patch("access_revoked", () => { source.close(); window.location.reload(); });
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    localizeTimes(document);
+    const list = document.querySelector(".tasks-list[data-listid]");
+    if (list && list.dataset.listid && window.EventSource) subscribeToList(list);
+    if (list && list.dataset.listid && list.dataset.sort === "manual" && window.fetch) enableDragAndDrop(list);
+});
+
+// === manual order ===
+// rows follow the pointer while dragged; on drop the row is sent as "right after the row
+// above it" (or "right before the row below" at the top of the page), and the server
+// rewrites only that row's rank
+function enableDragAndDrop(list){
+    const rows = () => Array.from(list.querySelectorAll(":scope > li"));
+    let dragged = null;
+    let startIndex = -1;
+
+    list.addEventListener("dragstart", e => {
+        dragged = e.target.closest("li[draggable]");
+        if (!dragged) return;
+        startIndex = rows().indexOf(dragged);
+        e.dataTransfer.effectAllowed = "move";
+        dragged.classList.add("dragging");
+    });
+    list.addEventListener("dragover", e => {
+        const target = e.target.closest("li");
+        if (!dragged || !target || target === dragged) return;
+        e.preventDefault();
+        // above or below the hovered row, by which half of it the pointer is in
+        const box = target.getBoundingClientRect();
+        const nodes = rowNodes(dragged);
+        if (e.clientY > box.top + box.height / 2) rowNodes(target).pop().after(...nodes);
+        else target.before(...nodes);
+    });
+    list.addEventListener("drop", e => e.preventDefault());
+    list.addEventListener("dragend", () => {
+        if (!dragged) return;
+        const li = dragged;
+        dragged = null;
+        li.classList.remove("dragging");
+        const order = rows();
+        const index = order.indexOf(li);
+        if (index === startIndex || order.length < 2) return;
+        const body = index > 0 ? {after_id: Number(order[index - 1].dataset.taskid)}
+                               : {before_id: Number(order[1].dataset.taskid)};
+        callTaskApi(`${taskApiUrl(li.dataset.taskid)}/move`, "POST", body)
+            .then(task => { li.dataset.rank = task.rank; })
+            .catch(() => window.location.reload());
+    });
+}
+
+// === JSON task API ===
+// add, edit, delete and undo patch the page from the one task the API returns;
+// the HTML routes stay in place for browsers without JavaScript
+function taskApiUrl(task_id){
+    const list = document.querySelector(".tasks-list[data-listid]");
+    const base = `/api/lists/${list.dataset.listid}/tasks`;
+    return task_id === undefined ? base : `${base}/${task_id}`;
+}
+
+function callTaskApi(url, method, body){
+    const options = {method: method, headers: {"Content-Type": "application/json"}};
+    if (body !== undefined) options.body = JSON.stringify(body);
+    return fetch(url, options).then(response => {
+        if (response.ok) return response.json();
+        const error = new Error(response.status);
+        error.status = response.status;
+        // the body says why, e.g. the current task on a 409
+        return response.json().catch(() => ({})).then(data => { error.data = data; throw error; });
+    }).then(data => data.task);
+}
+
+function submitInPlace(e, form, url, method, fields, onTask, onConflict){
+    const list = document.querySelector(".tasks-list[data-listid]");
+    if (!list || !list.dataset.listid || !window.fetch) return;  // plain form post
+    e.preventDefault();
+    // on any other error the normal form post shows the server's message
+    callTaskApi(url, method, fields).then(onTask).catch(error => {
+        if (error.status === 409 && onConflict) onConflict(error.data);
+        else form.submit();
+    });
+}
+
+function showToast(message, action){
+    const popup = document.createElement("div");
+    popup.className = "popup";
+    const toast = document.createElement("div");
+    toast.className = action ? "toast undo active" : "toast active";
+    toast.append(message);
+    if (action) toast.append(action);
+    popup.append(toast);
+    document.body.append(popup);
+    setTimeout(() => popup.remove(), 5000);
+}
+
+function deleteTask(url){
+    const task_id = url.split("/").pop();
+    const list = document.querySelector(".tasks-list[data-listid]");
+    if (!list || !list.dataset.listid || !window.fetch) {
+        window.location.href = url;
+        return;
+    }
+    callTaskApi(taskApiUrl(task_id), "DELETE").then(task => {
+        const li = taskRow(task.task_id);
+        if (li) removeTaskRow(li);
+
+        const undo = document.createElement("button");
+        undo.className = "btn undo-btn";
+        undo.textContent = "Undo";
+        undo.addEventListener("click", () => {
+            undo.closest(".popup").remove();
+            callTaskApi(`${taskApiUrl(task.task_id)}/undo`, "POST")
+                .then(restored => insertTaskRow(list, restored))
+                .catch(() => { window.location.href = `/undo_task_delete/${task.task_id}`; });
+        });
+        showToast("Task deleted! ", undo);
+    }).catch(() => { window.location.href = url; });
 }
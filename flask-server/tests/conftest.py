@@ -0,0 +1,99 @@
+"""Shared fixtures: a migrated SQLite database per test and helpers to fill it."""
+from datetime import datetime, timedelta
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+# hash inline; no pool processes to start for each test
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+
+@pytest.fixture
+def app(tmp_path):
+    from App import MIGRATIONS_DIR, create_app, db, list_access_cache, sidebar_cache
+    from events import list_events
+    from flask_migrate import upgrade
+    from fragments import fragment_cache
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}", "TESTING": True})
+    # the caches live in the module, and every test's database reuses the same ids
+    for cache in (list_access_cache, sidebar_cache):
+        cache.clear()
+    # a fresh broker, so no test sees another's subscribers and watchers
+    list_events.broker = None
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+        if fragment_cache.store is not None:
+            fragment_cache.store.clear()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user(app):
+    from App import User, db
+
+    def make_user(name):
+        user = User(name=name, email=f"{name}@test.local", password="not a hash")
+        db.session.add(user)
+        db.session.commit()
+        return user.user_id
+    return make_user
+
+
+@pytest.fixture
+def make_list(app):
+    from App import List, ListCollaborator, db
+
+    def make_list(owner_id, name="My List", collaborators=()):
+        lst = List(list_name=name, owner_id=owner_id)
+        db.session.add(lst)
+        db.session.flush()
+        db.session.add_all(ListCollaborator(list_id=lst.list_id, user_id=user_id) for user_id in collaborators)
+        db.session.commit()
+        return lst.list_id
+    return make_list
+
+
+@pytest.fixture
+def add_tasks(app):
+    from App import add_task
+
+    def add_tasks(list_id, count, start=datetime(2030, 1, 1)):
+        return [add_task(f"task {n}", ("high", "medium", "low")[n % 3], start + timedelta(hours=n), list_id)["task_id"]
+                for n in range(count)]
+    return add_tasks
+
+
+@pytest.fixture
+def login(app):
+    def login(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+            session["name"] = f"user{user_id}"
+            session["email"] = f"user{user_id}@test.local"
+        return client
+    return login
+
+
+@pytest.fixture
+def count_queries(app):
+    """count_queries() -> a list that collects the SQL statements run from then on."""
+    from sqlalchemy import event
+    from App import db
+
+    statements = []
+    engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield lambda: statements.clear() or statements
+    event.remove(engine, "before_cursor_execute", record)
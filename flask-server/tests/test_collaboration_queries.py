@@ -0,0 +1,27 @@
+"""The collaboration page runs the same number of queries however many lists it shows."""
+
+
+def render_collaboration(login, count_queries, user_id):
+    client = login(user_id)
+    statements = count_queries()
+    response = client.get("/collaboration")
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_collaboration_queries_do_not_grow_with_lists(make_user, make_list, add_tasks, login, count_queries):
+    helpers = [make_user(f"helper{n}") for n in range(3)]
+    one = make_user("one")
+    many = make_user("many")
+    list_id = make_list(one, collaborators=helpers[:2])
+    add_tasks(list_id, 3)
+    for n in range(15):
+        list_id = make_list(many, f"List {n}", collaborators=helpers[n % 2:n % 2 + 2])
+        add_tasks(list_id, 3)
+    # a list shared with the user counts too
+    make_list(helpers[2], "Shared", collaborators=[many])
+
+    # the app's first request also checks the schema version, once
+    render_collaboration(login, count_queries, helpers[2])
+    single = render_collaboration(login, count_queries, one)
+    assert render_collaboration(login, count_queries, many) == single
@@ -0,0 +1,8 @@
+"""/metrics without METRICS_TOKEN answers only scrapes from this machine."""
+
+
+def test_metrics_is_loopback_only_without_a_token(app):
+    client = app.test_client()
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"}).status_code == 200
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "::1"}).status_code == 200
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.7"}).status_code == 403
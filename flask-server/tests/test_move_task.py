@@ -0,0 +1,30 @@
+"""move_task writes nothing, not even the list version, for a move it rejects."""
+
+
+def list_version(list_id):
+    from App import List, db
+
+    return db.session.scalar(db.select(List.version).where(List.list_id == list_id))
+
+
+def test_rejected_moves_leave_the_list_alone(make_user, make_list, add_tasks):
+    from App import delete_task, move_task
+
+    owner = make_user("owner")
+    stranger = make_user("stranger")
+    list_id = make_list(owner)
+    other_list = make_list(owner, "Other")
+    first, second, third = add_tasks(list_id, 3)
+    elsewhere, = add_tasks(other_list, 1)
+    delete_task(owner, third)
+    version = list_version(list_id)
+
+    assert move_task(stranger, list_id, first) is None
+    assert move_task(owner, list_id, first, anchor_id=elsewhere) is None
+    assert move_task(owner, list_id, elsewhere) is None
+    assert move_task(owner, list_id, third) is None
+    assert list_version(list_id) == version
+
+    row = move_task(owner, list_id, first, anchor_id=second)
+    assert row.task_id == first
+    assert list_version(list_id) == version + 1
@@ -0,0 +1,177 @@
+"""ReminderScheduler on a FakeClock: window loads, ticks, task changes and exactly-once delivery."""
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+from reminders import FakeClock, ReminderScheduler
+
+T0 = datetime(2030, 1, 1, 9, 0)
+LEAD = 15 * 60
+WINDOW = 3600
+
+
+class Tasks:
+    """An in-memory stand-in for the tasks table, with the scheduler's load and verify."""
+
+    def __init__(self):
+        self.rows = {}  # task_id -> [list_id, task_name, deadline, open]
+
+    def add(self, task_id, deadline, list_id=1):
+        self.rows[task_id] = [list_id, f"task {task_id}", deadline, True]
+
+    def load(self, start, end, list_id=None):
+        return sorted(((task_id, row[0], row[1], row[2]) for task_id, row in self.rows.items()
+                       if row[3] and start <= row[2] < end and list_id in (None, row[0])),
+                      key=lambda row: (row[3], row[0]))
+
+    def verify(self, reminders):
+        return {r.task_id for r in reminders
+                if r.task_id in self.rows and self.rows[r.task_id][3] and self.rows[r.task_id][2] == r.deadline}
+
+
+def event(kind, task_id, list_id=1, **data):
+    return {"list_id": list_id, "type": kind, "data": dict(data, task_id=task_id)}
+
+
+def run(scheduler, clock, minutes):
+    """Tick once a minute; {task_id: [times it was sent]}."""
+    sent = {}
+    for _ in range(minutes):
+        now = clock.advance(60)
+        for reminders in scheduler.due().values():
+            for reminder in reminders:
+                sent.setdefault(reminder.task_id, []).append(now)
+    return sent
+
+
+@pytest.fixture
+def tasks():
+    return Tasks()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(T0)
+
+
+@pytest.fixture
+def scheduler(tasks, clock):
+    return ReminderScheduler(tasks.load, tasks.verify, clock=clock, lead=LEAD, window=WINDOW)
+
+
+def test_start_holds_only_the_window(tasks, scheduler):
+    lead = timedelta(seconds=LEAD)
+    tasks.add(1, T0 + lead + timedelta(minutes=30))
+    tasks.add(2, T0 + lead + timedelta(hours=3))
+    tasks.add(3, T0 - timedelta(hours=1))  # already past
+    scheduler.start()
+    assert len(scheduler) == 1
+
+
+def test_each_reminder_goes_out_once_at_its_tick(tasks, clock, scheduler):
+    lead = timedelta(seconds=LEAD)
+    # the first falls due right at the start, the last long after the first window
+    offsets = [0, 1, 59, 61, 150, 600]
+    for task_id, minutes in enumerate(offsets, 1):
+        tasks.add(task_id, T0 + lead + timedelta(minutes=minutes, seconds=30))
+    scheduler.start()
+    sent = run(scheduler, clock, 12 * 60)
+    assert sent == {task_id: [T0 + timedelta(minutes=minutes + 1)] for task_id, minutes in enumerate(offsets, 1)}
+
+
+def test_task_changes_move_or_drop_reminders(tasks, clock, scheduler):
+    lead = timedelta(seconds=LEAD)
+    for task_id in range(1, 6):
+        tasks.add(task_id, T0 + lead + timedelta(minutes=10))
+    scheduler.start()
+
+    later = T0 + lead + timedelta(minutes=40)
+    tasks.rows[1][2] = later
+    scheduler.on_event(event("task_edited", 1, task_name="task 1", deadline=later.isoformat(), isChecked=0))
+    tasks.rows[2][3] = False
+    scheduler.on_event(event("task_deleted", 2))
+    tasks.rows[3][3] = False
+    scheduler.on_event(event("task_toggled", 3, task_name="task 3", deadline=tasks.rows[3][2].isoformat(), isChecked=1))
+    # a change the scheduler never heard of is caught when the batch is checked
+    tasks.rows[4][3] = False
+    # and a task due soon that appears within the window is picked up at once
+    tasks.add(6, T0 + lead + timedelta(minutes=20))
+    scheduler.on_event(event("task_undone", 6, task_name="task 6", deadline=tasks.rows[6][2].isoformat(), isChecked=0))
+
+    sent = run(scheduler, clock, 60)
+    assert sent == {1: [T0 + timedelta(minutes=40)], 5: [T0 + timedelta(minutes=10)], 6: [T0 + timedelta(minutes=20)]}
+
+
+def test_imported_tasks_are_loaded_on_the_next_tick(tasks, clock, scheduler):
+    lead = timedelta(seconds=LEAD)
+    scheduler.start()
+    tasks.add(1, T0 + lead + timedelta(minutes=5), list_id=7)
+    tasks.add(2, T0 + lead + timedelta(minutes=5), list_id=8)
+    scheduler.on_event({"list_id": 7, "type": "tasks_imported", "data": {"count": 1}})
+    # list 8 imported without telling this worker: its task is never sent
+    assert run(scheduler, clock, 30) == {1: [T0 + timedelta(minutes=5)]}
+
+
+def test_random_changes_through_the_app_are_reminded_exactly_once(app, make_user, make_list, add_tasks):
+    from App import Task, db, delete_task, edit_task, list_events, load_upcoming_deadlines, toggle_task, \
+        undo_task_delete, verify_reminders
+
+    rng = random.Random(7)
+    user_id = make_user("reminded")
+    list_id = make_list(user_id)
+    lead = timedelta(seconds=LEAD)
+    # due across six hours from a little before the clock starts
+    task_ids = add_tasks(list_id, 300, start=T0 + lead - timedelta(minutes=30))
+    for task_id in task_ids:
+        db.session.execute(db.update(Task).where(Task.task_id == task_id)
+                           .values(deadline=T0 + lead + timedelta(seconds=rng.randrange(-1800, 6 * 3600))))
+    db.session.commit()
+
+    clock = FakeClock(T0)
+    scheduler = ReminderScheduler(load_upcoming_deadlines, verify_reminders, clock=clock, lead=LEAD, window=WINDOW)
+    scheduler.start()
+    list_events.watch(scheduler.on_event)
+
+    fired_through = T0 - timedelta(microseconds=1)
+    for _ in range(6 * 60):
+        for _ in range(2):
+            task_id = rng.choice(task_ids)
+            action = rng.choice(("edit", "delete", "undo", "toggle"))
+            if action == "edit":
+                edit_task(user_id, task_id, "edited", "high", clock() + lead + timedelta(seconds=rng.randrange(1, 7200)))
+            elif action == "delete":
+                delete_task(user_id, task_id)
+            elif action == "undo":
+                undo_task_delete(user_id, task_id)
+            else:
+                toggle_task(user_id, task_id, rng.randrange(2))
+        now = clock.advance(60)
+        # exactly the tasks open now whose moment came since the last tick
+        expected = set(db.session.execute(
+            db.select(Task.task_id, Task.deadline)
+            .where(Task.deadline > fired_through + lead, Task.deadline <= now + lead,
+                   Task.is_deleted == db.false(), Task.isChecked == db.false())))
+        sent = [(r.task_id, r.deadline) for reminders in scheduler.due().values() for r in reminders]
+        assert sorted(sent) == sorted(expected)
+        fired_through = now
+        db.session.remove()
+
+
+def test_form_deadlines_are_stored_in_utc(app, make_user, make_list, login):
+    from App import Task, db
+
+    user_id = make_user("traveller")
+    list_id = make_list(user_id)
+    client = login(user_id)
+    # 18:00 in UTC+8 is 10:00 UTC, the clock reminders and overdue counts use
+    client.post("/add_task", data={"task_name": "call", "priority": "high", "deadline": "2030-01-01T18:00",
+                                   "utc_offset": "480", "list_id": list_id})
+    client.post(f"/api/lists/{list_id}/tasks",
+                json={"task_name": "call back", "priority": "low", "deadline": "2030-01-01T18:00:00+08:00"})
+    assert db.session.execute(db.select(Task.deadline).order_by(Task.task_id)).scalars().all() == \
+        [datetime(2030, 1, 1, 10, 0)] * 2
+    response = client.post("/add_task", data={"task_name": "x", "priority": "high", "deadline": "2030-01-01T18:00",
+                                              "utc_offset": "east", "list_id": list_id})
+    assert response.status_code == 302
+    assert db.session.scalar(db.select(db.func.count()).select_from(Task)) == 2
@@ -0,0 +1,13 @@
+"""Static files are cached for long only when they were found."""
+
+
+def test_missing_assets_are_not_cached(app):
+    client = app.test_client()
+    found = client.get("/static/script.js?v=1")
+    assert found.status_code == 200
+    assert "immutable" in found.headers["Cache-Control"]
+    found.close()
+    for url in ("/static/missing.js?v=1", "/static/dist/missing.0123456789ab.js"):
+        response = client.get(url)
+        assert response.status_code == 404
+        assert "immutable" not in response.headers["Cache-Control"]
@@ -0,0 +1,66 @@
+"""Every sort of the task list is served by its partial index."""
+import pytest
+from sqlalchemy import event
+
+EXPECTED_INDEXES = {
+    "created_at": "ix_tasks_list_created_at",
+    "deadline": "ix_tasks_list_deadline",
+    "priority": "ix_tasks_list_priority_rank",
+    "manual": "ix_tasks_list_rank",
+}
+
+
+def listing_plan(app, user_id, list_id, sort, order, cursor=None):
+    """The EXPLAIN output of the query get_tasks runs, with the parameters it ran with."""
+    from App import db, get_tasks
+
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        with app.test_request_context():
+            from flask import session
+            session["user_id"] = user_id
+            _, next_cursor = get_tasks(list_id, sort=sort, order=order, cursor=cursor)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    statement, parameters = next((s, p) for s, p in executed if "FROM tasks" in s and "ORDER BY" in s)
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql":
+        rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+    else:
+        rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return " ".join(str(value) for row in rows for value in row), next_cursor
+
+
+@pytest.fixture
+def lists(make_user, make_list, add_tasks):
+    from App import delete_task
+
+    user_id = make_user("indexed")
+    list_ids = [make_list(user_id, f"List {n}") for n in range(2)]
+    for list_id in list_ids:
+        task_ids = add_tasks(list_id, 120)
+        # deleted rows are what the partial indexes leave out
+        for task_id in task_ids[::4]:
+            delete_task(user_id, task_id)
+    return user_id, list_ids
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("sort", sorted(EXPECTED_INDEXES))
+def test_listing_uses_its_index(app, lists, sort, order):
+    user_id, list_ids = lists
+    plan, next_cursor = listing_plan(app, user_id, list_ids[1], sort, order)
+    assert EXPECTED_INDEXES[sort] in plan
+    # no sort step: rows come off the index in order
+    assert "TEMP B-TREE" not in plan and "Sort" not in plan
+
+    # a later page is a range scan of the same index
+    assert next_cursor is not None
+    plan, _ = listing_plan(app, user_id, list_ids[1], sort, order, next_cursor)
+    assert EXPECTED_INDEXES[sort] in plan